@@ -5,13 +5,16 @@ Private Fund Management System Database Configuration
 
 import os
 from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from contextlib import contextmanager
-from typing import Generator
+from typing import Dict, Generator, List
 import logging
 
 from .models import Base, TABLES_CREATION_ORDER
+from .services.data_version import data_versions
+from .services.search_index import search_index
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -85,6 +88,9 @@ class DatabaseManager:
                 echo=os.getenv("DB_ECHO", "false").lower() == "true"
             )
         
+        # 记录写入的表，供列表总数等缓存按数据版本失效
+        data_versions.install(self.engine)
+        
         # 创建会话工厂
         self.SessionLocal = sessionmaker(
             autocommit=False,
@@ -104,6 +110,19 @@ class DatabaseManager:
             Base.metadata.create_all(bind=self.engine)
             logger.info("数据库表创建成功")
             
+            # 已存在的表补齐模型中新增的列和索引
+            self.migrate_schema()
+            
+            # 报告仍缺失的索引
+            missing_indexes = self.check_indexes()
+            for table_name, index_names in missing_indexes.items():
+                logger.warning(f"表 {table_name} 缺少索引: {', '.join(index_names)}")
+            if not missing_indexes:
+                logger.info("索引检查通过")
+            
+            # 模糊查找使用的搜索索引
+            search_index.install(self.engine)
+            
             # 记录创建的表
             inspector = inspect(self.engine)
             table_names = inspector.get_table_names()
@@ -113,6 +132,57 @@ class DatabaseManager:
             logger.error(f"创建数据库表失败: {str(e)}")
             raise
     
+    def migrate_schema(self):
+        """
+        为已存在的表补齐模型中新增的列和索引
+        create_all 只创建缺失的表，不会修改已有表结构；新增列须可为空或带服务端默认值
+        """
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=self.engine.dialect)
+                table_name = self.engine.dialect.identifier_preparer.quote(table.name)
+                with self.engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_ddl}"))
+                logger.info(f"表 {table.name} 新增列: {column.name}")
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                try:
+                    index.create(bind=self.engine, checkfirst=True)
+                    logger.info(f"表 {table.name} 新增索引: {index.name}")
+                except Exception as e:
+                    # 建索引失败（如唯一索引存在重复数据）不影响启动，由索引检查报告
+                    logger.error(f"表 {table.name} 新增索引 {index.name} 失败: {str(e)}")
+    
+    def check_indexes(self) -> Dict[str, List[str]]:
+        """
+        检查模型声明的索引在数据库中是否存在
+        返回: {表名: [缺失的索引名]}，只包含有缺失的表
+        """
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        
+        missing: Dict[str, List[str]] = {}
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            absent = sorted(index.name for index in table.indexes if index.name not in existing_indexes)
+            if absent:
+                missing[table.name] = absent
+        return missing
+    
     def drop_tables(self):
         """删除所有数据表（谨慎使用）"""
         try:
@@ -212,8 +282,10 @@ def init_database():
 
 def get_database_status() -> dict:
     """获取数据库状态信息"""
+    connected = db_manager.test_connection()
     return {
-        "connection": db_manager.test_connection(),
+        "connection": connected,
         "info": db_manager.get_database_info(),
+        "missing_indexes": db_manager.check_indexes() if connected else None,
         "url": db_manager.database_url
     }
\ No newline at end of file
@@ -9,8 +9,14 @@ import os
 
 # 导入路由模块
 from .routes import nav, strategy, position, trade, dividend, transaction, project_holding, stage_performance
-from .database import init_database, get_database_status
+from .database import init_database, get_database_status, db_manager
 from .init_data import init_data_if_needed
+from .services.nav_service import NavService
+from .services.portfolio_summary import PortfolioSummaryService
+from .services.current_holdings import CurrentHoldingService
+from .services.transaction_direction import TransactionDirectionService
+from .services.transaction_fingerprint import TransactionFingerprintService
+from .services.product_resolution import ProductResolutionService
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -176,6 +182,43 @@ async def startup_event():
         # 初始化示例数据
         init_data_if_needed()
         logger.info("示例数据初始化完成")
+        
+        # 回填基金最新净值表，兼容绕过接口直接写入的历史净值
+        with db_manager.get_session() as db:
+            NavService(db).refresh_latest_nav()
+        logger.info("基金最新净值表同步完成")
+        
+        # 重算与持仓表不一致的客户持仓汇总（首次启动时全量回填）
+        with db_manager.get_session() as db:
+            rebuilt = PortfolioSummaryService(db).sync()
+        logger.info(f"客户持仓汇总同步完成，重算客户数: {rebuilt}")
+        
+        # 重算与持仓表最新一期存量快照不一致的当前持仓（首次启动时全量回填）
+        with db_manager.get_session() as db:
+            rebuilt = CurrentHoldingService(db).sync()
+        logger.info(f"当前持仓表同步完成，重算客户数: {rebuilt}")
+        
+        # 写入默认交易类型分类规则，回填交易方向为空的交易（首次启动时全量回填）
+        with db_manager.get_session() as db:
+            direction_service = TransactionDirectionService(db)
+            direction_service.ensure_default_rules()
+            backfilled = direction_service.reclassify(only_missing=True)
+        logger.info(f"交易方向回填完成，回填交易数: {backfilled}")
+        
+        # 回填交易内容指纹（首次启动时全量回填）
+        with db_manager.get_session() as db:
+            backfilled = TransactionFingerprintService(db).backfill()
+        logger.info(f"交易指纹回填完成，回填交易数: {backfilled}")
+        
+        # 补全产品基金映射，重新匹配未匹配的产品（首次启动时全量生成）
+        with db_manager.get_session() as db:
+            written = ProductResolutionService(db).sync()
+        logger.info(f"产品基金映射同步完成，写入映射数: {written}")
+        
+        # 重算与净值表不一致的衍生序列（首次启动时全量回填）
+        with db_manager.get_session() as db:
+            rebuilt = NavService(db).sync_nav_derived()
+        logger.info(f"净值衍生序列同步完成，重算基金数: {rebuilt}")
     except Exception as e:
         logger.error(f"数据库初始化失败: {str(e)}")
 
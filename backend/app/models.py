@@ -3,7 +3,7 @@
 Private Fund Management System Database Models
 """
 
-from sqlalchemy import Column, String, Integer, Date, Boolean, ForeignKey, UniqueConstraint, Numeric
+from sqlalchemy import Column, String, Integer, Date, Boolean, ForeignKey, UniqueConstraint, Numeric, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -27,6 +27,8 @@ class Fund(Base):
     nav_records = relationship("Nav", back_populates="fund", cascade="all, delete-orphan")
     positions = relationship("Position", back_populates="fund", cascade="all, delete-orphan")
     dividends = relationship("Dividend", back_populates="fund", cascade="all, delete-orphan")
+    latest_nav = relationship("FundLatestNav", back_populates="fund", cascade="all, delete-orphan", uselist=False)
+    nav_derived = relationship("NavDerived", back_populates="fund", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<Fund(code='{self.fund_code}', name='{self.fund_name}')>"
@@ -72,6 +74,7 @@ class Nav(Base):
     # 复合唯一约束：同一基金同一日期只能有一条净值记录
     __table_args__ = (
         UniqueConstraint('fund_code', 'nav_date', name='uk_fund_nav_date'),
+        Index('idx_nav_date_id', 'nav_date', 'id'),  # 净值列表按日期游标分页
     )
     
     def __repr__(self):
@@ -85,6 +88,48 @@ class Nav(Base):
         return unit_nav > 0 and accum_nav >= unit_nav
 
 
+class FundLatestNav(Base):
+    """
+    基金最新净值表 - 每只基金一行，由净值写入路径在同一事务内维护
+    """
+    __tablename__ = 'fund_latest_nav'
+
+    fund_code = Column(String(20), ForeignKey('fund.fund_code', ondelete='CASCADE'),
+                      primary_key=True, comment='关联基金代码')
+    nav_date = Column(Date, nullable=False, comment='最新净值日期')
+    unit_nav = Column(Numeric(16, 6), nullable=False, comment='最新单位净值')
+    accum_nav = Column(Numeric(16, 6), nullable=False, comment='最新累计净值')
+    
+    # 建立与基金表的关系
+    fund = relationship("Fund", back_populates="latest_nav")
+    
+    def __repr__(self):
+        return f"<FundLatestNav(fund_code='{self.fund_code}', date='{self.nav_date}', unit_nav={self.unit_nav})>"
+
+
+class NavDerived(Base):
+    """
+    净值衍生序列表 - 按累计净值预计算的日收益率、累计指数、历史高点和回撤
+    追加净值时增量计算，修改或删除历史净值时从最早变动日期起重算
+    """
+    __tablename__ = 'nav_derived'
+
+    fund_code = Column(String(20), ForeignKey('fund.fund_code', ondelete='CASCADE'),
+                      primary_key=True, comment='关联基金代码')
+    nav_date = Column(Date, primary_key=True, comment='净值日期')
+    accum_nav = Column(Numeric(16, 6), nullable=False, comment='累计净值')
+    daily_return = Column(Numeric(20, 10), nullable=False, comment='日收益率（相对上一净值日），首日为0')
+    cum_index = Column(Numeric(20, 10), nullable=False, comment='累计收益指数，首日为1')
+    running_peak = Column(Numeric(20, 10), nullable=False, comment='累计指数历史高点')
+    drawdown = Column(Numeric(20, 10), nullable=False, comment='回撤，cum_index / running_peak - 1')
+    
+    # 建立与基金表的关系
+    fund = relationship("Fund", back_populates="nav_derived")
+    
+    def __repr__(self):
+        return f"<NavDerived(fund_code='{self.fund_code}', date='{self.nav_date}', drawdown={self.drawdown})>"
+
+
 class Client(Base):
     """
     客户主表 - 存储客户基本信息
@@ -98,6 +143,8 @@ class Client(Base):
     # 建立与其他表的关系
     positions = relationship("Position", back_populates="client", cascade="all, delete-orphan")
     dividend_records = relationship("ClientDividend", back_populates="client", cascade="all, delete-orphan")
+    portfolio_summaries = relationship("PortfolioSummary", back_populates="client", cascade="all, delete-orphan")
+    current_holdings = relationship("CurrentHolding", back_populates="client", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<Client(group_id='{self.group_id}', name='{self.obscured_name}')>"
@@ -127,12 +174,69 @@ class Position(Base):
     # 复合唯一约束：同一客户+基金+存量时间唯一
     __table_args__ = (
         UniqueConstraint('group_id', 'fund_code', 'stock_date', name='uk_client_fund_date'),
+        Index('idx_position_stock_date', 'stock_date', 'group_id', 'id'),  # 持仓列表按存量时间游标分页
+        Index('idx_position_group_stock_date', 'group_id', 'stock_date'),  # 按客户定位截止日期前最近存量快照
     )
     
     def __repr__(self):
         return f"<Position(group_id='{self.group_id}', fund_code='{self.fund_code}', shares={self.shares})>"
 
 
+class CurrentHolding(Base):
+    """
+    当前持仓表 - 每个客户最新一期存量快照中的持仓，每个客户每只基金一行
+    由持仓写入路径在同一事务内维护，时点类汇总直接读取，不再扫描全部历史存量
+    """
+    __tablename__ = 'current_holding'
+
+    group_id = Column(String(20), ForeignKey('client.group_id', ondelete='CASCADE'),
+                     primary_key=True, comment='关联客户集团号')
+    fund_code = Column(String(20), ForeignKey('fund.fund_code', ondelete='CASCADE'),
+                      primary_key=True, comment='关联基金代码')
+    stock_date = Column(Date, nullable=False, comment='最新存量时间')
+    first_buy_date = Column(Date, comment='首次买入日期')
+    cost_with_fee = Column(Numeric(16, 2), comment='含费成本')
+    cost_without_fee = Column(Numeric(16, 2), comment='不含费金额')
+    shares = Column(Numeric(16, 2), comment='持仓份额')
+    
+    # 建立与客户表的关系
+    client = relationship("Client", back_populates="current_holdings")
+    
+    __table_args__ = (
+        Index('idx_current_holding_fund', 'fund_code', 'group_id'),  # 按基金汇总持有人
+    )
+    
+    def __repr__(self):
+        return f"<CurrentHolding(group_id='{self.group_id}', fund_code='{self.fund_code}', date='{self.stock_date}')>"
+
+
+class PortfolioSummary(Base):
+    """
+    客户持仓汇总表 - 每个客户每个存量时间一行，由持仓、最新净值、客户分红写入路径在同一事务内维护
+    new_fund_count 为首次出现在该存量时间的基金数，按客户累加即为客户持有过的基金数
+    """
+    __tablename__ = 'client_portfolio_summary'
+
+    group_id = Column(String(20), ForeignKey('client.group_id', ondelete='CASCADE'),
+                     primary_key=True, comment='关联客户集团号')
+    stock_date = Column(Date, primary_key=True, comment='存量时间')
+    position_count = Column(Integer, nullable=False, default=0, comment='持仓记录数')
+    fund_count = Column(Integer, nullable=False, default=0, comment='持有基金数')
+    new_fund_count = Column(Integer, nullable=False, default=0, comment='首次出现在该存量时间的基金数')
+    total_cost = Column(Numeric(20, 2), nullable=False, default=0, comment='含费成本合计')
+    total_cost_without_fee = Column(Numeric(20, 2), nullable=False, default=0, comment='不含费金额合计')
+    total_shares = Column(Numeric(20, 2), nullable=False, default=0, comment='持仓份额合计')
+    market_value = Column(Numeric(24, 8), nullable=False, default=0, comment='按最新单位净值计算的市值')
+    unrealized_pnl = Column(Numeric(24, 8), nullable=False, default=0, comment='浮动盈亏（市值 - 含费成本）')
+    total_dividends = Column(Numeric(20, 2), nullable=False, default=0, comment='所持基金的现金分红合计')
+    
+    # 建立与客户表的关系
+    client = relationship("Client", back_populates="portfolio_summaries")
+    
+    def __repr__(self):
+        return f"<PortfolioSummary(group_id='{self.group_id}', date='{self.stock_date}', market_value={self.market_value})>"
+
+
 # 工具函数：日期格式转换
 class Dividend(Base):
     """
@@ -154,6 +258,7 @@ class Dividend(Base):
     # 复合唯一约束：同一基金同一分红日期只能有一条记录
     __table_args__ = (
         UniqueConstraint('fund_code', 'dividend_date', name='uk_fund_dividend_date'),
+        Index('idx_dividend_date_id', 'dividend_date', 'id'),  # 分红列表按日期游标分页
     )
     
     def __repr__(self):
@@ -221,13 +326,22 @@ class Transaction(Base):
     transaction_fee = Column(Numeric(16, 2), default=0, comment='手续费')
     product_code = Column(String(30), comment='产品代码')
     product_name = Column(String(100), comment='产品名称')
+    direction = Column(String(20), comment='交易方向，入库时按交易类型规则分类：share_in/share_out/adjust_in/adjust_out/dividend/other')
+    fingerprint = Column(String(40), comment='内容指纹：集团号、交易类型、确认日期、金额、份额、产品的 SHA-1，用于上传判重')
     
     # 外键关系
     # 注意：这里不使用外键约束，因为交易数据可能包含系统中不存在的基金或客户
     # 这样设计更灵活，适合数据分析场景
     
-    # 为常见查询添加索引，提高查询性能
-    # 注意：SQLAlchemy会根据这些字段组合自动创建索引
+    # 为常见查询添加索引，已有数据库由 migrate_schema 补建，启动时检查并报告缺失的索引
+    __table_args__ = (
+        Index('idx_transaction_group_date', 'group_id', 'confirmed_date', 'id'),  # 客户交易记录按日期过滤、排序及游标分页
+        Index('idx_transaction_product_date', 'product_code', 'confirmed_date'),  # 产品交易按日期过滤
+        Index('idx_transaction_confirmed_date', 'confirmed_date'),  # 交易统计、客户列表按日期范围过滤
+        Index('idx_transaction_type', 'transaction_type', 'confirmed_date', 'confirmed_amount'),  # 按交易类型统计（覆盖日期、金额）、重新分类
+        Index('idx_transaction_group_direction', 'group_id', 'direction', 'confirmed_date'),  # 客户交易按方向汇总
+        Index('uk_transaction_fingerprint', 'fingerprint', unique=True),  # 上传按内容指纹判重
+    )
     
     def __repr__(self):
         return f"<Transaction(group_id='{self.group_id}', type='{self.transaction_type}', amount={self.confirmed_amount})>"
@@ -273,6 +387,45 @@ class Transaction(Base):
         return len(errors) == 0, errors
 
 
+class TransactionTypeRule(Base):
+    """
+    交易类型分类规则表 - 交易类型名称包含关键词即归入对应交易方向
+    按优先级升序匹配，取第一条命中的规则；均未命中时归入 other
+    """
+    __tablename__ = 'transaction_type_rule'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    keyword = Column(String(30), nullable=False, unique=True, comment='交易类型关键词')
+    direction = Column(String(20), nullable=False, comment='交易方向')
+    priority = Column(Integer, nullable=False, default=100, comment='优先级，数值小的先匹配')
+    created_at = Column(Date, default=func.current_date(), comment='创建时间')
+    
+    def __repr__(self):
+        return f"<TransactionTypeRule(keyword='{self.keyword}', direction='{self.direction}', priority={self.priority})>"
+
+
+class ProductFundMapping(Base):
+    """
+    产品基金映射表 - 交易中的产品代码、规范化产品名称对应的基金代码
+    由交易数据批量匹配生成，上传交易时补充新产品；fund_code 为空表示未匹配到基金
+    """
+    __tablename__ = 'product_fund_mapping'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key_type = Column(String(10), nullable=False, comment='映射键类型：code 产品代码 / name 规范化名称')
+    match_key = Column(String(200), nullable=False, comment='产品代码或规范化后的产品名称')
+    fund_code = Column(String(20), comment='匹配到的基金代码，未匹配时为空')
+    match_method = Column(String(20), comment='匹配方式：code / name / contains')
+    updated_at = Column(Date, default=func.current_date(), comment='最近匹配时间')
+    
+    __table_args__ = (
+        UniqueConstraint('key_type', 'match_key', name='uk_product_fund_mapping_key'),
+    )
+    
+    def __repr__(self):
+        return f"<ProductFundMapping(key_type='{self.key_type}', match_key='{self.match_key}', fund_code='{self.fund_code}')>"
+
+
 class ProjectHoldingAsset(Base):
     """
     项目持仓资产表 - 存储项目资产类别配置数据
@@ -474,10 +627,16 @@ TABLES_CREATION_ORDER = [
     Client,                 # 客户主表（无外键依赖）
     Strategy,               # 策略表（依赖Fund）
     Nav,                    # 净值表（依赖Fund）
+    FundLatestNav,          # 基金最新净值表（依赖Fund）
+    NavDerived,             # 净值衍生序列表（依赖Fund）
     Position,               # 持仓表（依赖Client和Fund）
+    CurrentHolding,         # 当前持仓表（依赖Client和Fund）
+    PortfolioSummary,       # 客户持仓汇总表（依赖Client）
     Dividend,               # 分红表（依赖Fund）
     ClientDividend,         # 客户分红表（依赖Client和Fund）
     Transaction,            # 交易表（无外键依赖，独立存储）
+    TransactionTypeRule,    # 交易类型分类规则表（无外键依赖）
+    ProductFundMapping,     # 产品基金映射表（无外键依赖）
     ProjectHoldingAsset,    # 项目持仓资产表（无外键依赖）
     ProjectHoldingIndustry, # 项目持仓行业表（无外键依赖）
 ]
\ No newline at end of file
@@ -12,7 +12,6 @@ from datetime import date
 from decimal import Decimal
 import logging
 import pandas as pd
-from io import BytesIO
 
 from ..database import get_db
 from ..schemas.dividend import (
@@ -21,6 +20,9 @@ from ..schemas.dividend import (
     DividendAnalysisResponse
 )
 from ..models import Dividend, Fund, DateConverter
+from ..services.excel_reader import ExcelChunkReader, spooled_upload
+from ..services.pagination import InvalidCursorError, count_cache, keyset_paginate
+from ..services.search_index import search_index
 
 logger = logging.getLogger(__name__)
 
@@ -77,11 +79,9 @@ async def upload_dividends(
                 total_results["errors"].append(f"文件 {file.filename} 不是Excel格式")
                 continue
             
-            # 读取文件内容
-            file_content = await file.read()
-            
-            # 处理单个文件
-            result = await process_dividend_excel(file_content, file.filename, override_existing, db)
+            # 上传文件落盘后分块读取处理
+            async with spooled_upload(file) as file_path:
+                result = await process_dividend_excel(file_path, file.filename, override_existing, db)
             
             # 累计统计
             total_results["success_count"] += result["success_count"]
@@ -112,7 +112,7 @@ async def upload_dividends(
         )
 
 
-async def process_dividend_excel(file_content: bytes, filename: str, override_existing: bool, db: Session) -> dict:
+async def process_dividend_excel(file_path: str, filename: str, override_existing: bool, db: Session) -> dict:
     """
     处理单个分红Excel文件
     """
@@ -121,138 +121,146 @@ async def process_dividend_excel(file_content: bytes, filename: str, override_ex
     updated_count = 0
     created_count = 0
     errors = []
+    # 当前未提交块开始前的计数与块行数，处理失败时回退到已提交的计数
+    chunk_start = None
+    chunk_rows = 0
     
     try:
-        # 读取Excel文件
-        df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-        
-        # 定义中英文字段映射
-        column_mapping = {
-            '基金代码': 'fund_code',
-            '产品代码': 'fund_code',
-            '分红日期': 'dividend_date',
-            '分红发放日': 'dividend_date',
-            '每份分红': 'dividend_per_share',
-            '分红金额': 'dividend_per_share',
-            '除息日': 'ex_dividend_date',
-            '登记日': 'record_date',
-            # 英文字段名（兼容性）
-            'fund_code': 'fund_code',
-            'dividend_date': 'dividend_date',
-            'dividend_per_share': 'dividend_per_share',
-            'ex_dividend_date': 'ex_dividend_date',
-            'record_date': 'record_date'
-        }
-        
-        # 转换列名
-        df_columns_mapped = {}
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str in column_mapping:
-                df_columns_mapped[col] = column_mapping[col_str]
-            else:
-                df_columns_mapped[col] = col_str
-        
-        df = df.rename(columns=df_columns_mapped)
-        
-        # 验证必要列
-        required_columns = ['fund_code', 'dividend_date', 'dividend_per_share']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
-            errors.append(error_msg)
-            return {
-                "success_count": 0,
-                "failed_count": len(df) if len(df) > 0 else 1,
-                "updated_count": 0,
-                "created_count": 0,
-                "errors": errors
+        # 分块读取Excel文件
+        with ExcelChunkReader(file_path) as reader:
+            # 定义中英文字段映射
+            column_mapping = {
+                '基金代码': 'fund_code',
+                '产品代码': 'fund_code',
+                '分红日期': 'dividend_date',
+                '分红发放日': 'dividend_date',
+                '每份分红': 'dividend_per_share',
+                '分红金额': 'dividend_per_share',
+                '除息日': 'ex_dividend_date',
+                '登记日': 'record_date',
+                # 英文字段名（兼容性）
+                'fund_code': 'fund_code',
+                'dividend_date': 'dividend_date',
+                'dividend_per_share': 'dividend_per_share',
+                'ex_dividend_date': 'ex_dividend_date',
+                'record_date': 'record_date'
             }
-        
-        # 处理每一行数据
-        for index, row in df.iterrows():
-            try:
-                # 获取基本字段
-                fund_code = str(row['fund_code']).strip()
-                
-                # 处理日期
-                dividend_date_str = str(row['dividend_date']).strip()
-                dividend_date = DateConverter.convert_date_string(dividend_date_str)
-                
-                # 处理分红金额
-                dividend_per_share = Decimal(str(row['dividend_per_share']))
-                
-                # 处理可选日期字段
-                ex_dividend_date = None
-                if 'ex_dividend_date' in row and pd.notna(row['ex_dividend_date']):
-                    ex_dividend_date_str = str(row['ex_dividend_date']).strip()
-                    ex_dividend_date = DateConverter.convert_date_string(ex_dividend_date_str)
-                
-                record_date = None
-                if 'record_date' in row and pd.notna(row['record_date']):
-                    record_date_str = str(row['record_date']).strip()
-                    record_date = DateConverter.convert_date_string(record_date_str)
-                
-                # 验证基金是否存在，如果不存在则自动创建
-                fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
-                if not fund:
-                    fund_name = f"基金_{fund_code}"  # 默认名称
-                    new_fund = Fund(
-                        fund_code=fund_code,
-                        fund_name=fund_name
-                    )
-                    db.add(new_fund)
-                    db.flush()
-                    fund = new_fund
-                    logger.info(f"自动创建基金: {fund_code} - {fund_name}")
-                
-                # 验证分红数据
-                is_valid, error_msg = Dividend.validate_dividend_data(dividend_per_share, dividend_date)
-                if not is_valid:
-                    errors.append(f"第{index+2}行: {error_msg}")
-                    failed_count += 1
-                    continue
-                
-                # 检查分红是否已存在
-                existing_dividend = db.query(Dividend).filter(
-                    and_(
-                        Dividend.fund_code == fund_code,
-                        Dividend.dividend_date == dividend_date
-                    )
-                ).first()
-                
-                if existing_dividend:
-                    if override_existing:
-                        # 更新分红
-                        existing_dividend.dividend_per_share = dividend_per_share
-                        existing_dividend.ex_dividend_date = ex_dividend_date
-                        existing_dividend.record_date = record_date
-                        updated_count += 1
-                    else:
-                        errors.append(f"第{index+2}行: 分红记录已存在 ({fund_code}, {dividend_date})")
-                        failed_count += 1
-                        continue
+            
+            # 转换列名
+            df_columns_mapped = {}
+            for col in reader.columns:
+                col_str = str(col).strip()
+                if col_str in column_mapping:
+                    df_columns_mapped[col] = column_mapping[col_str]
                 else:
-                    # 创建新分红
-                    new_dividend = Dividend(
-                        fund_code=fund_code,
-                        dividend_date=dividend_date,
-                        dividend_per_share=dividend_per_share,
-                        ex_dividend_date=ex_dividend_date,
-                        record_date=record_date
-                    )
-                    db.add(new_dividend)
-                    created_count += 1
+                    df_columns_mapped[col] = col_str
+            
+            # 验证必要列
+            required_columns = ['fund_code', 'dividend_date', 'dividend_per_share']
+            missing_columns = [col for col in required_columns if col not in df_columns_mapped.values()]
+            
+            if missing_columns:
+                error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
+                errors.append(error_msg)
+                row_count = sum(len(chunk) for chunk in reader)
+                return {
+                    "success_count": 0,
+                    "failed_count": row_count if row_count > 0 else 1,
+                    "updated_count": 0,
+                    "created_count": 0,
+                    "errors": errors
+                }
+            
+            # 逐块处理数据，每块提交一次
+            for df in reader:
+                df = df.rename(columns=df_columns_mapped)
+                chunk_start = (success_count, failed_count, updated_count, created_count)
+                chunk_rows = len(df)
                 
-                success_count += 1
+                # 处理每一行数据
+                for index, row in df.iterrows():
+                    try:
+                        # 获取基本字段
+                        fund_code = str(row['fund_code']).strip()
+                        
+                        # 处理日期
+                        dividend_date_str = str(row['dividend_date']).strip()
+                        dividend_date = DateConverter.convert_date_string(dividend_date_str)
+                        
+                        # 处理分红金额
+                        dividend_per_share = Decimal(str(row['dividend_per_share']))
+                        
+                        # 处理可选日期字段
+                        ex_dividend_date = None
+                        if 'ex_dividend_date' in row and pd.notna(row['ex_dividend_date']):
+                            ex_dividend_date_str = str(row['ex_dividend_date']).strip()
+                            ex_dividend_date = DateConverter.convert_date_string(ex_dividend_date_str)
+                        
+                        record_date = None
+                        if 'record_date' in row and pd.notna(row['record_date']):
+                            record_date_str = str(row['record_date']).strip()
+                            record_date = DateConverter.convert_date_string(record_date_str)
+                        
+                        # 验证基金是否存在，如果不存在则自动创建
+                        fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
+                        if not fund:
+                            fund_name = f"基金_{fund_code}"  # 默认名称
+                            new_fund = Fund(
+                                fund_code=fund_code,
+                                fund_name=fund_name
+                            )
+                            db.add(new_fund)
+                            db.flush()
+                            fund = new_fund
+                            logger.info(f"自动创建基金: {fund_code} - {fund_name}")
+                        
+                        # 验证分红数据
+                        is_valid, error_msg = Dividend.validate_dividend_data(dividend_per_share, dividend_date)
+                        if not is_valid:
+                            errors.append(f"第{index+2}行: {error_msg}")
+                            failed_count += 1
+                            continue
+                        
+                        # 检查分红是否已存在
+                        existing_dividend = db.query(Dividend).filter(
+                            and_(
+                                Dividend.fund_code == fund_code,
+                                Dividend.dividend_date == dividend_date
+                            )
+                        ).first()
+                        
+                        if existing_dividend:
+                            if override_existing:
+                                # 更新分红
+                                existing_dividend.dividend_per_share = dividend_per_share
+                                existing_dividend.ex_dividend_date = ex_dividend_date
+                                existing_dividend.record_date = record_date
+                                updated_count += 1
+                            else:
+                                errors.append(f"第{index+2}行: 分红记录已存在 ({fund_code}, {dividend_date})")
+                                failed_count += 1
+                                continue
+                        else:
+                            # 创建新分红
+                            new_dividend = Dividend(
+                                fund_code=fund_code,
+                                dividend_date=dividend_date,
+                                dividend_per_share=dividend_per_share,
+                                ex_dividend_date=ex_dividend_date,
+                                record_date=record_date
+                            )
+                            db.add(new_dividend)
+                            created_count += 1
+                        
+                        success_count += 1
+                        
+                    except Exception as e:
+                        errors.append(f"第{index+2}行: {str(e)}")
+                        failed_count += 1
                 
-            except Exception as e:
-                errors.append(f"第{index+2}行: {str(e)}")
-                failed_count += 1
-        
-        # 提交所有更改
-        db.commit()
+                # 提交本块更改
+                db.commit()
+                chunk_start = None
         
         return {
             "success_count": success_count,
@@ -263,13 +271,19 @@ async def process_dividend_excel(file_content: bytes, filename: str, override_ex
         }
         
     except Exception as e:
+        # 只回滚未提交的当前块，已提交块的结果保留
         db.rollback()
         errors.append(f"文件处理失败: {str(e)}")
+        if chunk_start is not None:
+            success_count, failed_count, updated_count, created_count = chunk_start
+            failed_count += chunk_rows
+        else:
+            failed_count += 1
         return {
-            "success_count": 0,
-            "failed_count": 1,
-            "updated_count": 0,
-            "created_count": 0,
+            "success_count": success_count,
+            "failed_count": failed_count,
+            "updated_count": updated_count,
+            "created_count": created_count,
             "errors": errors
         }
 
@@ -283,12 +297,13 @@ async def get_dividend_list(
     page_size: int = Query(20, ge=1, le=100, description="每页记录数"),
     sort_by: Optional[str] = Query("dividend_date", description="排序字段"),
     sort_order: Optional[str] = Query("desc", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空值，之后传上一页返回的next_cursor"),
     db: Session = Depends(get_db)
 ):
     """
     获取分红列表
     
-    支持按基金代码、日期范围筛选和分页
+    支持按基金代码、日期范围筛选和分页；传入 cursor 时使用游标分页
     """
     try:
         # 构建查询
@@ -296,7 +311,7 @@ async def get_dividend_list(
         
         # 应用筛选条件
         if fund_code:
-            query = query.filter(Dividend.fund_code.like(f"%{fund_code}%"))
+            query = query.filter(search_index.filter(Dividend.fund_code, 'fund', fund_code, ['fund_code']))
         
         if start_date:
             query = query.filter(Dividend.dividend_date >= start_date)
@@ -304,25 +319,37 @@ async def get_dividend_list(
         if end_date:
             query = query.filter(Dividend.dividend_date <= end_date)
         
-        # 获取总数
-        total = query.count()
+        # 获取总数（按筛选条件和数据版本缓存）
+        total = count_cache.get_or_count(
+            ('dividend_list', fund_code, start_date, end_date),
+            (Dividend.__tablename__, Fund.__tablename__),
+            query.count
+        )
         
-        # 应用排序
-        if sort_by == "dividend_date":
-            if sort_order == "desc":
-                query = query.order_by(desc(Dividend.dividend_date))
-            else:
-                query = query.order_by(Dividend.dividend_date)
-        elif sort_by == "dividend_per_share":
-            if sort_order == "desc":
-                query = query.order_by(desc(Dividend.dividend_per_share))
-            else:
-                query = query.order_by(Dividend.dividend_per_share)
+        if cursor is not None:
+            sort_column = Dividend.dividend_per_share if sort_by == "dividend_per_share" else Dividend.dividend_date
+            descending = sort_by not in ("dividend_date", "dividend_per_share") or sort_order == "desc"
+            dividends, next_cursor = keyset_paginate(
+                query, [(sort_column, descending), (Dividend.id, descending)], cursor, page_size
+            )
         else:
-            query = query.order_by(desc(Dividend.dividend_date))
-        
-        # 应用分页
-        dividends = query.offset((page - 1) * page_size).limit(page_size).all()
+            # 应用排序
+            if sort_by == "dividend_date":
+                if sort_order == "desc":
+                    query = query.order_by(desc(Dividend.dividend_date), desc(Dividend.id))
+                else:
+                    query = query.order_by(Dividend.dividend_date, Dividend.id)
+            elif sort_by == "dividend_per_share":
+                if sort_order == "desc":
+                    query = query.order_by(desc(Dividend.dividend_per_share), desc(Dividend.id))
+                else:
+                    query = query.order_by(Dividend.dividend_per_share, Dividend.id)
+            else:
+                query = query.order_by(desc(Dividend.dividend_date), desc(Dividend.id))
+            
+            # 应用分页
+            dividends = query.offset((page - 1) * page_size).limit(page_size).all()
+            next_cursor = None
         
         # 构建响应数据
         dividend_responses = []
@@ -342,9 +369,15 @@ async def get_dividend_list(
             total=total,
             page=page,
             page_size=page_size,
-            data=dividend_responses
+            data=dividend_responses,
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"获取分红列表失败: {str(e)}")
         raise HTTPException(
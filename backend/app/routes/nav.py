@@ -9,18 +9,26 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
 import logging
+import urllib.parse
 
-from ..database import get_db
+from ..database import get_db, db_manager
 from ..schemas.nav import (
     NavManualCreate, NavResponse, NavListResponse, NavUploadResponse,
     NavDeleteRequest, NavDeleteResponse, NavSearchParams
 )
 from ..schemas.common import APIResponse, ErrorResponse
 from ..services.nav_service import NavService
-from ..models import Nav, Fund
+from ..services.pagination import InvalidCursorError
+from ..services.search_index import search_index
+from ..services.excel_reader import spooled_upload
+from ..services.export_writer import iter_csv, iter_xlsx, CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE
+from ..models import Fund, FundLatestNav
 
 logger = logging.getLogger(__name__)
 
+# 导出表头，与导入的中文列名一致
+NAV_EXPORT_HEADER = ['基金代码', '产品名称', '净值日期', '单位净值', '累计净值']
+
 # 创建净值管理路由器
 router = APIRouter(
     prefix="/api/nav",
@@ -74,11 +82,9 @@ async def upload_nav_files(
                 total_results["errors"].append(f"文件 {file.filename} 不是Excel格式")
                 continue
             
-            # 读取文件内容
-            file_content = await file.read()
-            
-            # 处理单个文件
-            result = nav_service.process_excel_upload(file_content, file.filename)
+            # 上传文件落盘后分块读取处理
+            async with spooled_upload(file) as file_path:
+                result = nav_service.process_excel_upload(file_path, file.filename)
             
             # 累计统计
             total_results["success_count"] += result.success_count
@@ -162,6 +168,7 @@ async def get_nav_list(
     page_size: int = Query(50, ge=1, le=1000, description="每页记录数"),
     sort_by: Optional[str] = Query("nav_date", description="排序字段"),
     sort_order: Optional[str] = Query("desc", description="排序方向(asc/desc)"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空值，之后传上一页返回的next_cursor"),
     db: Session = Depends(get_db)
 ):
     """
@@ -172,10 +179,11 @@ async def get_nav_list(
     - **end_date**: 可选，结束日期筛选
     - **page**: 页码，从1开始
     - **page_size**: 每页记录数，最大1000
+    - **cursor**: 可选，传入时使用游标分页，忽略page，深分页性能稳定
     """
     try:
         nav_service = NavService(db)
-        nav_records, total = nav_service.get_nav_list(
+        nav_records, total, next_cursor = nav_service.get_nav_list(
             fund_code=fund_code,
             fund_name=fund_name,
             start_date=start_date,
@@ -183,7 +191,8 @@ async def get_nav_list(
             page=page,
             page_size=page_size,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor
         )
         
         # 转换为响应模型
@@ -197,9 +206,15 @@ async def get_nav_list(
             nav_records=nav_responses,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"获取净值列表失败: {str(e)}")
         raise HTTPException(
@@ -208,6 +223,47 @@ async def get_nav_list(
         )
 
 
+@router.get("/export", summary="导出净值数据")
+async def export_nav_data(
+    fund_code: Optional[str] = Query(None, description="基金代码筛选"),
+    fund_name: Optional[str] = Query(None, description="基金名称模糊筛选"),
+    start_date: Optional[date] = Query(None, description="开始日期"),
+    end_date: Optional[date] = Query(None, description="结束日期"),
+    sort_by: Optional[str] = Query("nav_date", description="排序字段"),
+    sort_order: Optional[str] = Query("desc", description="排序方向(asc/desc)"),
+    format: str = Query("xlsx", regex="^(csv|xlsx)$", description="导出格式(csv/xlsx)")
+):
+    """
+    按净值列表的筛选条件流式导出净值数据
+    
+    - **fund_code/fund_name/start_date/end_date**: 与净值列表相同的筛选条件
+    - **sort_by/sort_order**: 排序方式
+    - **format**: csv 或 xlsx，默认 xlsx；表头与导入模板一致，可直接重新导入
+    """
+    filters = dict(
+        fund_code=fund_code, fund_name=fund_name, start_date=start_date,
+        end_date=end_date, sort_by=sort_by, sort_order=sort_order
+    )
+    
+    def generate():
+        # 响应流式发送期间独立持有数据库会话，发送结束后关闭
+        with db_manager.get_session() as db:
+            rows = NavService(db).iter_nav_export_rows(**filters)
+            if format == "csv":
+                yield from iter_csv(NAV_EXPORT_HEADER, rows)
+            else:
+                yield from iter_xlsx(NAV_EXPORT_HEADER, rows, sheet_title='净值数据')
+    
+    filename = f"净值数据_{date.today().strftime('%Y%m%d')}.{format}"
+    encoded_filename = urllib.parse.quote(filename.encode('utf-8'))
+    
+    return StreamingResponse(
+        generate(),
+        media_type=CSV_MEDIA_TYPE if format == "csv" else XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
 @router.delete("/{nav_id}", response_model=APIResponse, summary="删除单个净值记录")
 async def delete_single_nav_record(
     nav_id: int,
@@ -357,6 +413,65 @@ async def get_nav_by_fund(
         )
 
 
+@router.get("/drawdown/{fund_code}", response_model=APIResponse, summary="获取收益与回撤序列")
+async def get_nav_drawdown(
+    fund_code: str,
+    start_date: Optional[date] = Query(None, description="开始日期"),
+    end_date: Optional[date] = Query(None, description="结束日期"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取基金预计算的日收益率、累计指数、历史高点和回撤序列（基于累计净值）
+    
+    - **fund_code**: 基金代码
+    - **start_date/end_date**: 可选，日期区间；回撤相对成立以来的历史高点
+    - **返回**: 衍生序列及最大回撤、当前回撤
+    """
+    try:
+        nav_service = NavService(db)
+        records = nav_service.get_nav_derived(fund_code, start_date, end_date)
+        
+        if not records:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"基金 {fund_code} 没有净值数据"
+            )
+        
+        worst = min(records, key=lambda r: r.drawdown)
+        
+        return APIResponse(
+            success=True,
+            message=f"获取基金 {fund_code} 回撤序列成功",
+            data={
+                "fund_code": fund_code,
+                "max_drawdown_pct": round(float(worst.drawdown) * 100, 2),
+                "max_drawdown_date": worst.nav_date.isoformat(),
+                "current_drawdown_pct": round(float(records[-1].drawdown) * 100, 2),
+                "records": [
+                    {
+                        "nav_date": r.nav_date.isoformat(),
+                        "accum_nav": float(r.accum_nav),
+                        "daily_return": float(r.daily_return),
+                        "cum_index": float(r.cum_index),
+                        "running_peak": float(r.running_peak),
+                        "drawdown": float(r.drawdown)
+                    }
+                    for r in records
+                ],
+                "count": len(records)
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取回撤序列失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取回撤序列失败: {str(e)}"
+        )
+
+
 @router.get("/statistics/{fund_code}", response_model=APIResponse, summary="获取净值统计")
 async def get_nav_statistics(
     fund_code: str,
@@ -397,27 +512,32 @@ async def get_nav_statistics(
 
 
 @router.get("/funds", response_model=APIResponse, summary="获取有净值数据的基金列表")
-async def get_funds_with_nav(db: Session = Depends(get_db)):
+async def get_funds_with_nav(
+    search: Optional[str] = Query(None, description="按基金代码或名称搜索"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="最多返回条数"),
+    db: Session = Depends(get_db)
+):
     """
     获取所有有净值数据的基金列表
-    用于前端基金选择器
+    用于前端基金选择器，输入联想时传入 search 由服务端检索
     """
     try:
-        # 查询有净值数据的基金
-        funds_with_nav = db.query(Fund).join(Nav).distinct().all()
+        # 查询有净值数据的基金（最新净值日期取自基金最新净值表）
+        query = db.query(Fund.fund_code, Fund.fund_name, FundLatestNav.nav_date)\
+                  .join(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)
+        if search:
+            query = query.filter(search_index.filter(Fund.fund_code, 'fund', search))
+        if limit:
+            query = query.order_by(Fund.fund_code).limit(limit)
+        funds_with_nav = query.all()
         
         fund_list = [
             {
-                "fund_code": fund.fund_code,
-                "fund_name": fund.fund_name,
-                "latest_nav_date": db.query(Nav.nav_date)
-                                    .filter(Nav.fund_code == fund.fund_code)
-                                    .order_by(Nav.nav_date.desc())
-                                    .first()[0].isoformat() if db.query(Nav)
-                                    .filter(Nav.fund_code == fund.fund_code)
-                                    .first() else None
+                "fund_code": fund_code,
+                "fund_name": fund_name,
+                "latest_nav_date": latest_nav_date.isoformat() if latest_nav_date else None
             }
-            for fund in funds_with_nav
+            for fund_code, fund_name, latest_nav_date in funds_with_nav
         ]
         
         return APIResponse(
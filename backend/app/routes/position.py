@@ -6,13 +6,12 @@ Position Analysis Routes
 from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, case, type_coerce
 from typing import List, Optional
 from datetime import date
 from decimal import Decimal
 import logging
 import pandas as pd
-from io import BytesIO
 from pydantic import BaseModel
 
 from ..database import get_db
@@ -20,12 +19,26 @@ from ..schemas.position import (
     PositionResponse, PositionListResponse, PositionSearchParams,
     ClientPositionSummary, FundPositionSummary, TopHoldersResponse,
     PositionConcentrationAnalysis, ClientPortfolioSummary, ClientListResponse,
-    PositionDetailResponse, EnhancedPositionResponse, StrategyDistribution
+    PositionDetailResponse, EnhancedPositionResponse, StrategyDistribution, FundConcentrationListResponse
 )
 from ..schemas.common import APIResponse, ErrorResponse
 from ..schemas.dividend import ClientDividendUploadResponse
 from ..services.position_service import PositionAnalysisService
-from ..models import Position, Client, Fund, Nav, DateConverter, ClientDividend, Strategy
+from ..services.portfolio_summary import PortfolioSummaryService
+from ..services.current_holdings import CurrentHoldingService, holdings_source
+from ..services.pagination import InvalidCursorError
+from ..services.search_index import search_index
+from ..services.nav_store import nav_store
+from ..services.nav_panel import build_nav_panel
+from ..services.exposure_engine import exposure_engine
+from ..services.time_machine import TimeMachineService, month_ends
+from ..services.stage_return import StageReturnCalculator, StageWindow, standard_windows
+from ..services.excel_reader import ExcelChunkReader, spooled_upload
+from ..services.bulk_ops import upsert_rows
+from ..models import (
+    Position, Client, Fund, Nav, FundLatestNav, DateConverter, ClientDividend, Strategy, PortfolioSummary,
+    CurrentHolding
+)
 
 logger = logging.getLogger(__name__)
 
@@ -87,11 +100,9 @@ async def upload_positions(
                 total_results["errors"].append(f"文件 {file.filename} 不是Excel格式")
                 continue
             
-            # 读取文件内容
-            file_content = await file.read()
-            
-            # 处理单个文件
-            result = await process_position_excel(file_content, file.filename, override_existing, db)
+            # 上传文件落盘后分块读取处理
+            async with spooled_upload(file) as file_path:
+                result = await process_position_excel(file_path, file.filename, override_existing, db)
             
             # 累计统计
             total_results["success_count"] += result["success_count"]
@@ -122,197 +133,257 @@ async def upload_positions(
         )
 
 
-async def process_position_excel(file_content: bytes, filename: str, override_existing: bool, db: Session) -> dict:
+def _parse_position_row(index, row: dict) -> dict:
+    """解析持仓上传的一行数据，日期等必要字段无法解析时抛出异常"""
+    # 获取基本字段
+    group_id = DateConverter.format_group_id(str(row['group_id']).strip())
+    fund_code = str(row['fund_code']).strip()
+    
+    # 处理日期
+    stock_date_str = str(row['stock_date']).strip()
+    stock_date = DateConverter.convert_date_string(stock_date_str)
+    
+    # 处理首次买入日期（可选字段）
+    first_buy_date = None
+    if 'first_buy_date' in row and pd.notna(row['first_buy_date']):
+        first_buy_date_str = str(row['first_buy_date']).strip()
+        first_buy_date = DateConverter.convert_date_string(first_buy_date_str)
+    
+    # 处理数值字段 - 改进解析逻辑
+    def parse_numeric_field(field_name, field_value):
+        """解析数值字段，支持多种格式"""
+        if pd.isna(field_value) or field_value is None:
+            return None
+        
+        try:
+            # 转为字符串并清理
+            value_str = str(field_value).replace(',', '').replace('¥', '').replace('$', '').strip()
+            
+            # 去除括号（负数）
+            if value_str.startswith('(') and value_str.endswith(')'):
+                value_str = '-' + value_str[1:-1]
+            
+            # 空值或零值处理
+            if not value_str or value_str in ['0', '0.0', '0.00', '-', 'N/A', 'n/a', '']:
+                return None
+            
+            # 转换为Decimal
+            return Decimal(value_str)
+        except (ValueError, TypeError, Decimal.InvalidOperation) as e:
+            logger.warning(f"第{index+2}行: {field_name}格式错误: {field_value} - {str(e)}")
+            return None
+    
+    # 客户信息（仅在自动创建客户时使用）
+    client_name = None
+    domestic_planner = None
+    if 'client_name' in row and pd.notna(row['client_name']):
+        client_name = str(row['client_name']).strip()
+    if 'domestic_planner' in row and pd.notna(row['domestic_planner']):
+        domestic_planner = str(row['domestic_planner']).strip()
+    
+    return {
+        'group_id': group_id,
+        'fund_code': fund_code,
+        'stock_date': stock_date,
+        'first_buy_date': first_buy_date,
+        'cost_with_fee': parse_numeric_field("含费成本", row.get('cost_with_fee')),
+        'cost_without_fee': parse_numeric_field("不含费金额", row.get('cost_without_fee')),
+        'shares': parse_numeric_field("持仓份额", row.get('shares')),
+        'client_name': client_name,
+        'domestic_planner': domestic_planner
+    }
+
+
+async def process_position_excel(file_path: str, filename: str, override_existing: bool, db: Session) -> dict:
     """
     处理单个持仓Excel文件
+    
+    已有基金、客户键一次加载，缺失的基金和客户按块批量补建；
+    持仓按存量时间预取已有键后逐块批量 upsert，行级错误照常记录
     """
     success_count = 0
     failed_count = 0
     updated_count = 0
     created_count = 0
     errors = []
+    # 当前未提交块开始前的计数与块行数，处理失败时回退到已提交的计数
+    chunk_start = None
+    chunk_rows = 0
     
     try:
-        # 读取Excel文件
-        df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-        
-        # 定义中英文字段映射
-        column_mapping = {
-            '集团号': 'group_id',
-            '产品code': 'fund_code',
-            '产品代码': 'fund_code',
-            '基金代码': 'fund_code',
-            '存量时间': 'stock_date',  # 存量时间作为主要日期字段
-            '首次买入日期': 'first_buy_date',  # 首次买入日期单独存储
-            '含费成本': 'cost_with_fee',
-            '¥持仓成本(含费)(二级)': 'cost_with_fee',
-            '不含费金额': 'cost_without_fee',
-            '¥投资金额(不含费)(二级)': 'cost_without_fee',  # 新增映射
-            '持仓份额': 'shares',
-            '持仓份额(二级)': 'shares',  # 新增映射
-            '客户姓名': 'client_name',
-            '客户姓名(遮蔽)': 'client_name',
-            '国内理财师': 'domestic_planner',
-            # 英文字段名（兼容性）
-            'group_id': 'group_id',
-            'fund_code': 'fund_code',
-            'stock_date': 'stock_date',
-            'cost_with_fee': 'cost_with_fee',
-            'cost_without_fee': 'cost_without_fee',
-            'shares': 'shares'
-        }
-        
-        # 转换列名
-        df_columns_mapped = {}
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str in column_mapping:
-                df_columns_mapped[col] = column_mapping[col_str]
-            else:
-                df_columns_mapped[col] = col_str
-        
-        df = df.rename(columns=df_columns_mapped)
-        
-        # 验证必要列
-        required_columns = ['group_id', 'fund_code', 'stock_date']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
-            errors.append(error_msg)
-            return {
-                "success_count": 0,
-                "failed_count": len(df) if len(df) > 0 else 1,
-                "updated_count": 0,
-                "created_count": 0,
-                "errors": errors
+        # 分块读取Excel文件
+        with ExcelChunkReader(file_path) as reader:
+            # 定义中英文字段映射
+            column_mapping = {
+                '集团号': 'group_id',
+                '产品code': 'fund_code',
+                '产品代码': 'fund_code',
+                '基金代码': 'fund_code',
+                '存量时间': 'stock_date',  # 存量时间作为主要日期字段
+                '首次买入日期': 'first_buy_date',  # 首次买入日期单独存储
+                '含费成本': 'cost_with_fee',
+                '¥持仓成本(含费)(二级)': 'cost_with_fee',
+                '不含费金额': 'cost_without_fee',
+                '¥投资金额(不含费)(二级)': 'cost_without_fee',  # 新增映射
+                '持仓份额': 'shares',
+                '持仓份额(二级)': 'shares',  # 新增映射
+                '客户姓名': 'client_name',
+                '客户姓名(遮蔽)': 'client_name',
+                '国内理财师': 'domestic_planner',
+                # 英文字段名（兼容性）
+                'group_id': 'group_id',
+                'fund_code': 'fund_code',
+                'stock_date': 'stock_date',
+                'cost_with_fee': 'cost_with_fee',
+                'cost_without_fee': 'cost_without_fee',
+                'shares': 'shares'
             }
-        
-        # 处理每一行数据
-        for index, row in df.iterrows():
-            try:
-                # 获取基本字段
-                group_id = DateConverter.format_group_id(str(row['group_id']).strip())
-                fund_code = str(row['fund_code']).strip()
-                
-                # 处理日期
-                stock_date_str = str(row['stock_date']).strip()
-                stock_date = DateConverter.convert_date_string(stock_date_str)
-                
-                # 处理首次买入日期（可选字段）
-                first_buy_date = None
-                if 'first_buy_date' in row and pd.notna(row['first_buy_date']):
-                    first_buy_date_str = str(row['first_buy_date']).strip()
-                    first_buy_date = DateConverter.convert_date_string(first_buy_date_str)
+            
+            # 转换列名
+            df_columns_mapped = {}
+            for col in reader.columns:
+                col_str = str(col).strip()
+                if col_str in column_mapping:
+                    df_columns_mapped[col] = column_mapping[col_str]
+                else:
+                    df_columns_mapped[col] = col_str
+            
+            # 验证必要列
+            required_columns = ['group_id', 'fund_code', 'stock_date']
+            missing_columns = [col for col in required_columns if col not in df_columns_mapped.values()]
+            
+            if missing_columns:
+                error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
+                errors.append(error_msg)
+                row_count = sum(len(chunk) for chunk in reader)
+                return {
+                    "success_count": 0,
+                    "failed_count": row_count if row_count > 0 else 1,
+                    "updated_count": 0,
+                    "created_count": 0,
+                    "errors": errors
+                }
+            
+            # 一次性加载已有基金和客户键；持仓键按文件中出现的存量时间分批加载
+            existing_funds = {code for (code,) in db.query(Fund.fund_code)}
+            existing_clients = {group_id for (group_id,) in db.query(Client.group_id)}
+            existing_positions = set()
+            loaded_stock_dates = set()
+            
+            # 逐块处理数据，每块批量写入并提交一次
+            for df in reader:
+                df = df.rename(columns=df_columns_mapped)
+                chunk_start = (success_count, failed_count, updated_count, created_count)
+                chunk_rows = len(df)
                 
-                # 处理数值字段 - 改进解析逻辑
-                def parse_numeric_field(field_name, field_value):
-                    """解析数值字段，支持多种格式"""
-                    if pd.isna(field_value) or field_value is None:
-                        return None
-                    
+                # 解析本块数据，解析失败的行记录行级错误（本块错误最后按行号排序输出）
+                parsed_rows = []
+                chunk_errors = []
+                for index, row in zip(df.index, df.to_dict('records')):
                     try:
-                        # 转为字符串并清理
-                        value_str = str(field_value).replace(',', '').replace('¥', '').replace('$', '').strip()
-                        
-                        # 去除括号（负数）
-                        if value_str.startswith('(') and value_str.endswith(')'):
-                            value_str = '-' + value_str[1:-1]
-                        
-                        # 空值或零值处理
-                        if not value_str or value_str in ['0', '0.0', '0.00', '-', 'N/A', 'n/a', '']:
-                            return None
-                        
-                        # 转换为Decimal
-                        return Decimal(value_str)
-                    except (ValueError, TypeError, Decimal.InvalidOperation) as e:
-                        logger.warning(f"第{index+2}行: {field_name}格式错误: {field_value} - {str(e)}")
-                        return None
+                        parsed_rows.append((index, _parse_position_row(index, row)))
+                    except Exception as e:
+                        error_msg = f"第{index+2}行: {str(e)}"
+                        chunk_errors.append((index, error_msg))
+                        logger.error(f"持仓数据处理错误: {error_msg}")
                 
-                cost_with_fee = parse_numeric_field("含费成本", row.get('cost_with_fee'))
-                cost_without_fee = parse_numeric_field("不含费金额", row.get('cost_without_fee'))
-                shares = parse_numeric_field("持仓份额", row.get('shares'))
-                
-                # 验证基金是否存在，如果不存在则自动创建
-                fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
-                if not fund:
-                    fund_name = f"基金_{fund_code}"  # 默认名称
-                    new_fund = Fund(
-                        fund_code=fund_code,
-                        fund_name=fund_name
-                    )
-                    db.add(new_fund)
-                    db.flush()
-                    fund = new_fund
-                    logger.info(f"自动创建基金: {fund_code} - {fund_name}")
+                if not parsed_rows:
+                    errors.extend(message for _, message in chunk_errors)
+                    failed_count += len(chunk_errors)
+                    chunk_start = None
+                    continue
                 
-                # 验证客户是否存在，如果不存在则自动创建
-                client = db.query(Client).filter(Client.group_id == group_id).first()
-                if not client:
-                    client_name = None
-                    domestic_planner = None
-                    
-                    if 'client_name' in row and pd.notna(row['client_name']):
-                        client_name = str(row['client_name']).strip()
-                    
-                    if 'domestic_planner' in row and pd.notna(row['domestic_planner']):
-                        domestic_planner = str(row['domestic_planner']).strip()
-                    
-                    new_client = Client(
-                        group_id=group_id,
-                        obscured_name=client_name,
-                        domestic_planner=domestic_planner
-                    )
-                    db.add(new_client)
-                    db.flush()
-                    client = new_client
-                    logger.info(f"自动创建客户: {group_id} - {client_name}")
+                # 批量补建缺失的基金和客户（客户信息取该集团号在文件中首次出现的行）
+                new_funds = {}
+                new_clients = {}
+                for index, item in parsed_rows:
+                    if item['fund_code'] not in existing_funds and item['fund_code'] not in new_funds:
+                        new_funds[item['fund_code']] = {
+                            'fund_code': item['fund_code'],
+                            'fund_name': f"基金_{item['fund_code']}"  # 默认名称
+                        }
+                    if item['group_id'] not in existing_clients and item['group_id'] not in new_clients:
+                        new_clients[item['group_id']] = {
+                            'group_id': item['group_id'],
+                            'obscured_name': item['client_name'],
+                            'domestic_planner': item['domestic_planner']
+                        }
                 
-                # 检查持仓是否已存在
-                existing_position = db.query(Position).filter(
-                    and_(
-                        Position.group_id == group_id,
-                        Position.fund_code == fund_code,
-                        Position.stock_date == stock_date
+                # 查询本块新出现的存量时间下已有的持仓键
+                new_dates = {item['stock_date'] for index, item in parsed_rows} - loaded_stock_dates
+                if new_dates:
+                    existing_positions.update(
+                        db.query(Position.group_id, Position.fund_code, Position.stock_date)
+                          .filter(Position.stock_date.in_(new_dates))
                     )
-                ).first()
+                    loaded_stock_dates.update(new_dates)
                 
-                if existing_position:
-                    if override_existing:
-                        # 更新持仓
-                        existing_position.first_buy_date = first_buy_date
-                        existing_position.cost_with_fee = cost_with_fee
-                        existing_position.cost_without_fee = cost_without_fee
-                        existing_position.shares = shares
-                        updated_count += 1
-                    else:
-                        errors.append(f"第{index+2}行: 持仓记录已存在 ({group_id}, {fund_code}, {stock_date})")
-                        failed_count += 1
+                # 逐行判定新增/更新；文件内重复的键按已存在处理，覆盖时以最后一行为准
+                position_rows = {}
+                chunk_keys = set()
+                accepted = []
+                for index, item in parsed_rows:
+                    key = (item['group_id'], item['fund_code'], item['stock_date'])
+                    exists = key in existing_positions or key in chunk_keys
+                    if exists and not override_existing:
+                        chunk_errors.append((index, f"第{index+2}行: 持仓记录已存在 ({key[0]}, {key[1]}, {key[2]})"))
                         continue
-                else:
-                    # 创建新持仓
-                    new_position = Position(
-                        group_id=group_id,
-                        fund_code=fund_code,
-                        stock_date=stock_date,
-                        first_buy_date=first_buy_date,
-                        cost_with_fee=cost_with_fee,
-                        cost_without_fee=cost_without_fee,
-                        shares=shares
+                    position_rows[key] = {
+                        'group_id': item['group_id'],
+                        'fund_code': item['fund_code'],
+                        'stock_date': item['stock_date'],
+                        'first_buy_date': item['first_buy_date'],
+                        'cost_with_fee': item['cost_with_fee'],
+                        'cost_without_fee': item['cost_without_fee'],
+                        'shares': item['shares']
+                    }
+                    chunk_keys.add(key)
+                    accepted.append((index, exists))
+                
+                try:
+                    if new_funds:
+                        upsert_rows(db, Fund, list(new_funds.values()), key_columns=['fund_code'])
+                    if new_clients:
+                        upsert_rows(db, Client, list(new_clients.values()), key_columns=['group_id'])
+                    upsert_rows(
+                        db, Position, list(position_rows.values()),
+                        key_columns=['group_id', 'fund_code', 'stock_date'],
+                        update_columns=['first_buy_date', 'cost_with_fee', 'cost_without_fee', 'shares']
                     )
-                    db.add(new_position)
-                    created_count += 1
+                    # 从本块最早的存量时间起重算涉及客户的持仓汇总，并重算其当前持仓
+                    summary_changes = {}
+                    for group_id, fund_code, stock_date in position_rows:
+                        if group_id not in summary_changes or stock_date < summary_changes[group_id]:
+                            summary_changes[group_id] = stock_date
+                    PortfolioSummaryService(db).refresh(summary_changes)
+                    CurrentHoldingService(db).refresh(summary_changes)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"持仓批量写入失败: {str(e)}")
+                    chunk_errors.extend((index, f"第{index+2}行: {str(e)}") for index, exists in accepted)
+                    accepted = None
                 
-                success_count += 1
+                chunk_errors.sort(key=lambda item: item[0])
+                errors.extend(message for _, message in chunk_errors)
+                failed_count += len(chunk_errors)
+                if accepted is None:
+                    chunk_start = None
+                    continue
                 
-            except Exception as e:
-                error_msg = f"第{index+2}行: {str(e)}"
-                errors.append(error_msg)
-                logger.error(f"持仓数据处理错误: {error_msg}")
-                failed_count += 1
-        
-        # 提交所有更改
-        db.commit()
+                if new_funds:
+                    logger.info(f"自动创建基金: {len(new_funds)}只")
+                if new_clients:
+                    logger.info(f"自动创建客户: {len(new_clients)}个")
+                existing_funds.update(new_funds)
+                existing_clients.update(new_clients)
+                existing_positions.update(chunk_keys)
+                
+                chunk_updated = sum(1 for index, exists in accepted if exists)
+                updated_count += chunk_updated
+                created_count += len(accepted) - chunk_updated
+                success_count += len(accepted)
+                chunk_start = None
         
         return {
             "success_count": success_count,
@@ -323,13 +394,19 @@ async def process_position_excel(file_content: bytes, filename: str, override_ex
         }
         
     except Exception as e:
+        # 只回滚未提交的当前块，已提交块的结果保留
         db.rollback()
         errors.append(f"文件处理失败: {str(e)}")
+        if chunk_start is not None:
+            success_count, failed_count, updated_count, created_count = chunk_start
+            failed_count += chunk_rows
+        else:
+            failed_count += 1
         return {
-            "success_count": 0,
-            "failed_count": 1,
-            "updated_count": 0,
-            "created_count": 0,
+            "success_count": success_count,
+            "failed_count": failed_count,
+            "updated_count": updated_count,
+            "created_count": created_count,
             "errors": errors
         }
 
@@ -340,87 +417,95 @@ async def get_client_list(
     page_size: int = Query(20, ge=1, le=100, description="每页记录数"),
     search: Optional[str] = Query(None, description="搜索客户集团号或姓名"),
     planner: Optional[str] = Query(None, description="理财师筛选"),
-    sort_by: Optional[str] = Query("total_market_value", description="排序字段"),
+    sort_by: Optional[str] = Query("total_market_value", description="排序字段：total_market_value/total_unrealized_pnl/unrealized_pnl_ratio/total_cost/fund_count/domestic_planner"),
     sort_order: Optional[str] = Query("desc", description="排序方向"),
     db: Session = Depends(get_db)
 ):
     """
     获取客户列表及其持仓汇总信息
     
-    返回包含客户基本信息、总市值、收益等汇总数据的列表
+    返回包含客户基本信息、总市值、收益等汇总数据的列表；
+    汇总数据读取客户持仓汇总表中每个客户最近一期存量时间的汇总行，可直接按市值、盈亏排序分页
     """
     try:
-        # 构建客户持仓汇总查询
+        total_cost = func.coalesce(PortfolioSummary.total_cost, 0)
+        market_value = func.coalesce(PortfolioSummary.market_value, 0)
+        unrealized_pnl = func.coalesce(PortfolioSummary.unrealized_pnl, 0)
+        pnl_ratio = case((total_cost > 0, unrealized_pnl * 100 / total_cost), else_=0)
+        fund_count = PortfolioSummary.fund_count
+        
+        # 每个客户只取最近一期存量时间的汇总行，与客户详情口径一致
+        latest = db.query(
+            PortfolioSummary.group_id, func.max(PortfolioSummary.stock_date).label('stock_date')
+        ).group_by(PortfolioSummary.group_id).subquery()
         query = db.query(
             Client.group_id,
             Client.obscured_name,
             Client.domestic_planner,
-            func.coalesce(func.sum(Position.cost_with_fee), 0).label('total_cost'),
-            func.count(func.distinct(Position.fund_code)).label('fund_count'),
-            func.count(Position.id).label('position_count'),
-            func.max(Position.stock_date).label('latest_update')
-        ).join(Position, Client.group_id == Position.group_id)\
-         .group_by(Client.group_id, Client.obscured_name, Client.domestic_planner)
+            total_cost.label('total_cost'),
+            fund_count.label('fund_count'),
+            PortfolioSummary.position_count.label('position_count'),
+            PortfolioSummary.stock_date.label('latest_update')
+        ).join(latest, Client.group_id == latest.c.group_id)\
+         .join(PortfolioSummary, and_(PortfolioSummary.group_id == latest.c.group_id,
+                                      PortfolioSummary.stock_date == latest.c.stock_date))
         
         # 应用筛选条件
         if search:
             query = query.filter(
-                or_(
-                    Client.group_id.like(f"%{search}%"),
-                    Client.obscured_name.like(f"%{search}%")
-                )
+                search_index.filter(Client.group_id, 'client', search, ['group_id', 'obscured_name'])
             )
         
         if planner:
-            query = query.filter(Client.domestic_planner.like(f"%{planner}%"))
+            query = query.filter(search_index.filter(Client.group_id, 'client', planner, ['domestic_planner']))
         
         # 获取总数
         total = query.count()
         
         # 应用排序
-        if sort_by == "total_cost":
-            if sort_order == "desc":
-                query = query.order_by(desc(func.coalesce(func.sum(Position.cost_with_fee), 0)))
-            else:
-                query = query.order_by(func.coalesce(func.sum(Position.cost_with_fee), 0))
-        elif sort_by == "fund_count":
-            if sort_order == "desc":
-                query = query.order_by(desc(func.count(func.distinct(Position.fund_code))))
-            else:
-                query = query.order_by(func.count(func.distinct(Position.fund_code)))
-        elif sort_by == "domestic_planner":
+        sort_columns = {
+            "total_market_value": market_value,
+            "total_unrealized_pnl": unrealized_pnl,
+            "unrealized_pnl_ratio": pnl_ratio,
+            "total_cost": total_cost,
+            "fund_count": fund_count,
+            "domestic_planner": Client.domestic_planner,
+        }
+        if sort_by in sort_columns:
+            sort_column = sort_columns[sort_by]
             if sort_order == "desc":
-                query = query.order_by(desc(Client.domestic_planner), Client.group_id)
+                query = query.order_by(desc(sort_column), Client.group_id)
             else:
-                query = query.order_by(Client.domestic_planner, Client.group_id)
+                query = query.order_by(sort_column, Client.group_id)
         else:
             query = query.order_by(Client.group_id)
         
         # 应用分页
         clients = query.offset((page - 1) * page_size).limit(page_size).all()
         
+        # 当页客户的当前持仓一次取出，按持仓逐笔精确计算市值和盈亏用于展示（不受数据库浮点汇总精度影响）
+        page_positions = {}
+        if clients:
+            rows = db.query(CurrentHolding.group_id, CurrentHolding.shares, CurrentHolding.cost_with_fee, FundLatestNav.unit_nav)\
+                     .outerjoin(FundLatestNav, CurrentHolding.fund_code == FundLatestNav.fund_code)\
+                     .filter(CurrentHolding.group_id.in_([client.group_id for client in clients])).all()
+            for row in rows:
+                page_positions.setdefault(row.group_id, []).append(row)
+        
         # 构建响应数据
         client_summaries = []
         for client in clients:
-            # 计算市值和收益（需要获取最新净值）
             total_market_value = Decimal('0')
             total_unrealized_pnl = Decimal('0')
             
-            # 获取该客户的所有持仓
-            positions = db.query(Position).filter(Position.group_id == client.group_id).all()
-            
-            for position in positions:
-                if position.shares:
-                    # 获取最新净值
-                    latest_nav = db.query(Nav).filter(Nav.fund_code == position.fund_code)\
-                                              .order_by(desc(Nav.nav_date)).first()
-                    
-                    if latest_nav:
-                        market_value = position.shares * latest_nav.unit_nav
-                        total_market_value += market_value
+            for _, shares, cost_with_fee, latest_unit_nav in page_positions.get(client.group_id, []):
+                if shares:
+                    if latest_unit_nav:
+                        position_value = shares * latest_unit_nav
+                        total_market_value += position_value
                         
-                        if position.cost_with_fee:
-                            total_unrealized_pnl += (market_value - position.cost_with_fee)
+                        if cost_with_fee:
+                            total_unrealized_pnl += (position_value - cost_with_fee)
             
             # 计算收益率
             unrealized_pnl_ratio = Decimal('0')
@@ -435,8 +520,8 @@ async def get_client_list(
                 total_market_value=total_market_value,
                 total_unrealized_pnl=total_unrealized_pnl,
                 unrealized_pnl_ratio=unrealized_pnl_ratio,
-                position_count=client.position_count or 0,
-                fund_count=client.fund_count or 0,
+                position_count=int(client.position_count or 0),
+                fund_count=int(client.fund_count or 0),
                 latest_update=client.latest_update
             )
             client_summaries.append(client_summary)
@@ -459,7 +544,7 @@ async def get_client_list(
 @router.get("/clients/{group_id}", response_model=PositionDetailResponse, summary="获取客户持仓详情")
 async def get_client_position_detail(
     group_id: str,
-    as_of_date: Optional[date] = Query(None, description="截止日期"),
+    as_of_date: Optional[date] = Query(None, description="截止日期：取该日及之前最近一期存量快照，按该日及之前的最近净值估值"),
     start_date: Optional[date] = Query(None, description="阶段收益开始日期"),
     end_date: Optional[date] = Query(None, description="阶段收益结束日期"),
     db: Session = Depends(get_db)
@@ -484,10 +569,12 @@ async def get_client_position_detail(
                            .outerjoin(Strategy, Fund.fund_code == Strategy.fund_code)\
                            .filter(Position.group_id == group_id)
         
+        # 指定截止日期时只取该日及之前最近一期存量快照
         if as_of_date:
-            positions_query = positions_query.filter(Position.stock_date <= as_of_date)
-        
-        position_data = positions_query.all()
+            snapshot_date = TimeMachineService(db).snapshot_date(group_id, as_of_date)
+            position_data = positions_query.filter(Position.stock_date == snapshot_date).all() if snapshot_date else []
+        else:
+            position_data = positions_query.all()
         
         # 构建增强持仓响应数据
         enhanced_positions = []
@@ -502,26 +589,65 @@ async def get_client_position_detail(
         major_strategy_stats = {}  # major_strategy -> market_value
         sub_strategy_stats = {}  # sub_strategy -> market_value
         
-        for position, fund, strategy in position_data:
+        # 预取：涉及基金的净值序列和按基金汇总的现金分红各一次查询，后续计算全部在内存中完成
+        fund_codes = list(dict.fromkeys(position.fund_code for position, fund, strategy in position_data))
+        nav_store.preload(db, fund_codes)
+        nav_by_fund = {code: nav_store.get(db, code) for code in fund_codes}
+        
+        dividends_by_fund = {}
+        if fund_codes:
+            dividends_by_fund = dict(
+                db.query(ClientDividend.fund_code, func.sum(ClientDividend.confirmed_amount))
+                  .filter(and_(
+                      ClientDividend.group_id == group_id,
+                      ClientDividend.transaction_type == '现金红利'
+                  ))
+                  .group_by(ClientDividend.fund_code)
+                  .all()
+            )
+        
+        # 阶段收益与今年以来收益：在客户持仓基金的净值面板上对所有持仓、所有区间一次计算
+        current_year = date.today().year
+        year_start = date(current_year, 1, 1)
+        latest_date = max((position.stock_date for position, fund, strategy in position_data), default=None)
+        if not latest_date:
+            latest_date = date.today()
+        
+        stage_windows = [StageWindow('ytd', year_start, latest_date)]
+        if start_date and end_date:
+            stage_windows.append(StageWindow('period', start_date, end_date))
+        
+        position_shares = [position.shares for position, fund, strategy in position_data]
+        position_buy_navs = [
+            position.cost_without_fee / position.shares
+            if position.cost_without_fee and position.shares and position.shares > 0 else None
+            for position, fund, strategy in position_data
+        ]
+        stage_result = StageReturnCalculator(build_nav_panel(db, fund_codes=fund_codes)).calculate(
+            [position.fund_code for position, fund, strategy in position_data],
+            position_shares,
+            [position.first_buy_date or position.stock_date for position, fund, strategy in position_data],
+            position_buy_navs,
+            stage_windows
+        )
+        ytd_returns = stage_result.exact_returns(stage_result.window_index('ytd'), position_shares, position_buy_navs)
+        if start_date and end_date:
+            period_returns = stage_result.exact_returns(
+                stage_result.window_index('period'), position_shares, position_buy_navs
+            )
+        else:
+            period_returns = [None] * len(position_data)
+        
+        for index, (position, fund, strategy) in enumerate(position_data):
             # 获取最新净值
-            nav_query = db.query(Nav).filter(Nav.fund_code == position.fund_code)
-            if as_of_date:
-                nav_query = nav_query.filter(Nav.nav_date <= as_of_date)
-            
-            latest_nav = nav_query.order_by(desc(Nav.nav_date)).first()
+            nav_series = nav_by_fund[position.fund_code]
+            latest_nav = nav_series.as_of(as_of_date) if as_of_date else nav_series.latest()
             
-            # 获取客户分红记录
-            dividend_amount = db.query(func.sum(ClientDividend.confirmed_amount))\
-                               .filter(and_(
-                                   ClientDividend.group_id == group_id,
-                                   ClientDividend.fund_code == position.fund_code,
-                                   ClientDividend.transaction_type == '现金红利'
-                               )).scalar() or Decimal('0')
+            # 客户现金分红累计
+            dividend_amount = dividends_by_fund.get(position.fund_code) or Decimal('0')
             
-            # 计算买入净值
-            buy_nav = None
-            if position.cost_without_fee and position.shares and position.shares > 0:
-                buy_nav = position.cost_without_fee / position.shares
+            # 买入净值
+            buy_nav = position_buy_navs[index]
             
             # 计算收益数据
             current_nav = latest_nav.unit_nav if latest_nav else None
@@ -545,34 +671,10 @@ async def get_client_position_detail(
             
             total_dividends += dividend_amount
             
-            # 计算阶段收益
-            period_return = None
-            if start_date and end_date and position.shares:
-                # 确定期初净值：如果买入时间在阶段内，使用买入净值；否则使用开始日净值
-                first_buy_date = position.first_buy_date or position.stock_date
-                
-                if first_buy_date and first_buy_date > start_date:
-                    # 买入时间在阶段中间，使用买入净值作为期初净值
-                    period_start_nav = buy_nav if buy_nav else None
-                else:
-                    # 买入时间在阶段开始前，获取开始日净值
-                    start_nav_query = db.query(Nav).filter(
-                        and_(Nav.fund_code == position.fund_code, Nav.nav_date >= start_date)
-                    ).order_by(Nav.nav_date)
-                    start_nav = start_nav_query.first()
-                    period_start_nav = start_nav.unit_nav if start_nav else None
-                
-                # 获取结束日净值：取≤结束日期的最近净值
-                end_nav_query = db.query(Nav).filter(
-                    and_(Nav.fund_code == position.fund_code, Nav.nav_date <= end_date)
-                ).order_by(desc(Nav.nav_date))
-                end_nav = end_nav_query.first()
-                period_end_nav = end_nav.unit_nav if end_nav else None
-                
-                if period_start_nav and period_end_nav:
-                    # 阶段收益 = (结束日净值 - 期初净值) × 持仓份额
-                    period_return = (period_end_nav - period_start_nav) * position.shares
-                    total_period_return += period_return  # 累加到总阶段收益
+            # 阶段收益 = (结束日净值 - 期初净值) × 持仓份额
+            period_return = period_returns[index]
+            if period_return is not None:
+                total_period_return += period_return  # 累加到总阶段收益
             
             # 策略信息
             major_strategy = strategy.main_strategy if strategy else "未分类"
@@ -647,52 +749,8 @@ async def get_client_position_detail(
         
         total_mv = float(total_market_value)
         
-        # 计算今年以来收益 - 使用与阶段收益完全相同的计算逻辑
-        ytd_return = Decimal('0')  # 初始化
-        current_year = date.today().year
-        year_start = date(current_year, 1, 1)
-        
-        # 获取今年的最新日期作为结束日期
-        latest_date = max((position.stock_date for position, fund, strategy in position_data), default=None)
-        if not latest_date:
-            latest_date = date.today()
-        
-        for position, fund, strategy in position_data:
-            if not position.shares:
-                continue
-            
-            # 复用阶段收益的计算逻辑，确保一致性
-            # 确定期初净值：如果买入时间在今年内，使用买入净值；否则使用1月1日净值
-            first_buy_date = position.first_buy_date or position.stock_date
-            
-            if first_buy_date and first_buy_date > year_start:
-                # 买入时间在今年中间，使用买入净值作为期初净值
-                if position.cost_without_fee and position.shares > 0:
-                    period_start_nav = position.cost_without_fee / position.shares
-                else:
-                    continue  # 无法计算买入净值，跳过
-            else:
-                # 买入时间在今年开始前，获取1月1日净值
-                start_nav_query = db.query(Nav).filter(
-                    and_(Nav.fund_code == position.fund_code, Nav.nav_date >= year_start)
-                ).order_by(Nav.nav_date)
-                start_nav = start_nav_query.first()
-                period_start_nav = start_nav.unit_nav if start_nav else None
-                
-                if not period_start_nav:
-                    continue  # 没有净值数据，跳过
-            
-            # 获取结束日净值：取≤最新日期的最近净值
-            end_nav_query = db.query(Nav).filter(
-                and_(Nav.fund_code == position.fund_code, Nav.nav_date <= latest_date)
-            ).order_by(desc(Nav.nav_date))
-            end_nav = end_nav_query.first()
-            period_end_nav = end_nav.unit_nav if end_nav else None
-            
-            if period_start_nav and period_end_nav:
-                # YTD收益 = (结束日净值 - 期初净值) × 持仓份额
-                position_ytd_return = (period_end_nav - period_start_nav) * position.shares
-                ytd_return += position_ytd_return
+        # 今年以来收益 - 与阶段收益使用相同的计算逻辑
+        ytd_return = sum((r for r in ytd_returns if r is not None), Decimal('0'))
         
         # 收益概览数据
         revenue_overview = {
@@ -761,6 +819,117 @@ async def get_client_position_detail(
         )
 
 
+@router.get("/clients/{group_id}/stage-returns", response_model=APIResponse, summary="客户多区间阶段收益")
+async def get_client_stage_returns(
+    group_id: str,
+    windows: str = Query("ytd,qtd,mtd", description="标准区间，逗号分隔：ytd/qtd/mtd，可为空"),
+    start_date: Optional[date] = Query(None, description="自定义区间开始日期"),
+    end_date: Optional[date] = Query(None, description="自定义区间结束日期"),
+    as_of_date: Optional[date] = Query(None, description="截止日期：取该日及之前最近一期存量快照，默认取最新持仓日期"),
+    db: Session = Depends(get_db)
+):
+    """
+    一次计算客户在多个区间的阶段收益
+    
+    - 标准区间以截止日期为终点：今年以来(ytd)、本季度以来(qtd)、本月以来(mtd)
+    - 同时传入 start_date 和 end_date 时追加自定义区间(custom)
+    - 计算口径与持仓详情页的阶段收益一致
+    """
+    try:
+        client = db.query(Client).filter(Client.group_id == group_id).first()
+        if not client:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"客户 {group_id} 不存在"
+            )
+        
+        positions_query = db.query(Position, Fund)\
+                           .join(Fund, Position.fund_code == Fund.fund_code)\
+                           .filter(Position.group_id == group_id)
+        # 指定截止日期时只取该日及之前最近一期存量快照
+        if as_of_date:
+            snapshot_date = TimeMachineService(db).snapshot_date(group_id, as_of_date)
+            position_data = positions_query.filter(Position.stock_date == snapshot_date).all() if snapshot_date else []
+        else:
+            position_data = positions_query.all()
+        
+        anchor = as_of_date or max((position.stock_date for position, fund in position_data), default=None) or date.today()
+        
+        requested = [name.strip().lower() for name in windows.split(',') if name.strip()]
+        available = {window.name: window for window in standard_windows(anchor)}
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的区间: {', '.join(unknown)}"
+            )
+        stage_windows = [available[name] for name in dict.fromkeys(requested)]
+        if start_date and end_date:
+            if start_date > end_date:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="开始日期必须早于结束日期"
+                )
+            stage_windows.append(StageWindow('custom', start_date, end_date))
+        
+        fund_codes = list(dict.fromkeys(position.fund_code for position, fund in position_data))
+        position_shares = [position.shares for position, fund in position_data]
+        position_buy_navs = [
+            position.cost_without_fee / position.shares
+            if position.cost_without_fee and position.shares and position.shares > 0 else None
+            for position, fund in position_data
+        ]
+        result = StageReturnCalculator(build_nav_panel(db, fund_codes=fund_codes)).calculate(
+            [position.fund_code for position, fund in position_data],
+            position_shares,
+            [position.first_buy_date or position.stock_date for position, fund in position_data],
+            position_buy_navs,
+            stage_windows
+        )
+        
+        total_cost = sum((position.cost_with_fee for position, fund in position_data if position.cost_with_fee), Decimal('0'))
+        window_data = []
+        for index, window in enumerate(result.windows):
+            returns = result.exact_returns(index, position_shares, position_buy_navs)
+            amount = sum((r for r in returns if r is not None), Decimal('0'))
+            window_data.append({
+                "name": window.name,
+                "start_date": window.start_date.isoformat(),
+                "end_date": window.end_date.isoformat(),
+                "amount": float(amount),
+                "rate": float(amount / total_cost * 100) if total_cost > 0 else 0.0,
+                "positions": [
+                    {
+                        "position_id": position.id,
+                        "fund_code": position.fund_code,
+                        "fund_name": fund.fund_name,
+                        "period_return": float(period_return) if period_return is not None else None
+                    }
+                    for (position, fund), period_return in zip(position_data, returns)
+                ]
+            })
+        
+        return APIResponse(
+            success=True,
+            message=f"客户 {group_id} 阶段收益计算完成",
+            data={
+                "group_id": group_id,
+                "as_of_date": anchor.isoformat(),
+                "total_cost": float(total_cost),
+                "windows": window_data
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"计算客户阶段收益失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"计算客户阶段收益失败: {str(e)}"
+        )
+
+
 @router.delete("/clients/{group_id}", summary="删除客户及其所有持仓")
 async def delete_client(
     group_id: str,
@@ -944,6 +1113,7 @@ async def get_position_list(
     domestic_planner: Optional[str] = Query(None, description="理财师筛选"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(50, ge=1, le=1000, description="每页记录数"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空值，之后传上一页返回的next_cursor"),
     db: Session = Depends(get_db)
 ):
     """
@@ -956,17 +1126,19 @@ async def get_position_list(
     - **domestic_planner**: 可选，按理财师筛选
     - **page**: 页码，从1开始
     - **page_size**: 每页记录数
+    - **cursor**: 可选，传入时使用游标分页，忽略page
     """
     try:
         position_service = PositionAnalysisService(db)
-        positions, total = position_service.get_position_list(
+        positions, total, next_cursor = position_service.get_position_list(
             group_id=group_id,
             fund_code=fund_code,
             start_date=start_date,
             end_date=end_date,
             domestic_planner=domestic_planner,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor
         )
         
         # 转换为响应模型
@@ -982,9 +1154,15 @@ async def get_position_list(
             positions=position_responses,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"获取持仓列表失败: {str(e)}")
         raise HTTPException(
@@ -996,17 +1174,19 @@ async def get_position_list(
 @router.get("/client/{group_id}", response_model=APIResponse, summary="客户持仓分析")
 async def analyze_client_positions(
     group_id: str,
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
     db: Session = Depends(get_db)
 ):
     """
-    分析指定客户的全部持仓情况
+    分析指定客户的当前持仓情况
     
     - **group_id**: 客户集团号
+    - **as_of_date**: 可选，截止日期
     - **返回**: 客户持仓汇总分析，包括收益率、市值等
     """
     try:
         position_service = PositionAnalysisService(db)
-        client_summary = position_service.analyze_client_positions(group_id)
+        client_summary = position_service.analyze_client_positions(group_id, as_of_date)
         
         return APIResponse(
             success=True,
@@ -1030,17 +1210,19 @@ async def analyze_client_positions(
 @router.get("/fund/{fund_code}", response_model=APIResponse, summary="基金持仓分析")
 async def analyze_fund_positions(
     fund_code: str,
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
     db: Session = Depends(get_db)
 ):
     """
-    分析指定基金的所有持仓情况
+    分析指定基金的当前持仓情况
     
     - **fund_code**: 基金代码
+    - **as_of_date**: 可选，截止日期
     - **返回**: 基金持仓汇总分析，包括客户分布、总市值等
     """
     try:
         position_service = PositionAnalysisService(db)
-        fund_summary = position_service.analyze_fund_positions(fund_code)
+        fund_summary = position_service.analyze_fund_positions(fund_code, as_of_date)
         
         return APIResponse(
             success=True,
@@ -1065,6 +1247,7 @@ async def analyze_fund_positions(
 async def get_fund_top_holders(
     fund_code: str,
     top_n: int = Query(10, ge=1, le=50, description="返回前N名，默认10"),
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
     db: Session = Depends(get_db)
 ):
     """
@@ -1072,11 +1255,12 @@ async def get_fund_top_holders(
     
     - **fund_code**: 基金代码
     - **top_n**: 返回前N名持有人，默认10名
+    - **as_of_date**: 可选，截止日期
     - **返回**: 持有人排名、份额、市值、占比等信息
     """
     try:
         position_service = PositionAnalysisService(db)
-        top_holders = position_service.get_fund_top_holders(fund_code, top_n)
+        top_holders = position_service.get_fund_top_holders(fund_code, top_n, as_of_date)
         
         return top_holders
         
@@ -1096,17 +1280,19 @@ async def get_fund_top_holders(
 @router.get("/fund/{fund_code}/concentration", response_model=PositionConcentrationAnalysis, summary="持仓集中度分析")
 async def analyze_position_concentration(
     fund_code: str,
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
     db: Session = Depends(get_db)
 ):
     """
     分析基金持仓集中度
     
     - **fund_code**: 基金代码
+    - **as_of_date**: 可选，截止日期
     - **返回**: 赫芬达尔指数、前N名集中度、持有人分布等指标
     """
     try:
         position_service = PositionAnalysisService(db)
-        concentration_analysis = position_service.analyze_position_concentration(fund_code)
+        concentration_analysis = position_service.analyze_position_concentration(fund_code, as_of_date)
         
         return concentration_analysis
         
@@ -1123,59 +1309,166 @@ async def analyze_position_concentration(
         )
 
 
+@router.get("/funds/concentration", response_model=FundConcentrationListResponse, summary="全量基金持仓集中度")
+async def analyze_all_fund_concentration(
+    top_n: int = Query(10, ge=0, le=50, description="每只基金返回的前N大持有人数量，0 表示不返回"),
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
+    db: Session = Depends(get_db)
+):
+    """
+    全量基金持仓集中度报告
+    
+    - **top_n**: 每只基金返回的前N大持有人数量
+    - **as_of_date**: 可选，截止日期
+    - **返回**: 各基金的赫芬达尔指数、前5/前10名集中度、持有人市值分档及前N大持有人，按赫芬达尔指数降序
+    """
+    try:
+        position_service = PositionAnalysisService(db)
+        results = position_service.analyze_all_fund_concentration(top_n, as_of_date)
+        
+        return FundConcentrationListResponse(total=len(results), data=results)
+        
+    except Exception as e:
+        logger.error(f"全量基金持仓集中度分析失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"全量基金持仓集中度分析失败: {str(e)}"
+        )
+
+
 @router.get("/summary/by-planner", response_model=APIResponse, summary="按理财师汇总持仓")
 async def get_positions_by_planner(
     domestic_planner: Optional[str] = Query(None, description="理财师名称筛选"),
+    as_of_date: Optional[date] = Query(None, description="截止日期：统计各客户该日及之前最近一期存量快照，按该日及之前的最近净值计算市值"),
+    client_page: int = Query(1, ge=1, description="各理财师客户列表的页码"),
+    client_page_size: int = Query(50, ge=1, le=500, description="各理财师客户列表的每页记录数"),
     db: Session = Depends(get_db)
 ):
     """
     按理财师汇总客户持仓情况
     
     - **domestic_planner**: 可选，指定理财师筛选
-    - **返回**: 理财师管理的客户及其持仓汇总
+    - **as_of_date**: 可选，不传时读取客户持仓汇总表（按最新净值）
+    - **client_page / client_page_size**: 各理财师名下客户按成本降序分页返回
+    - **返回**: 理财师管理的客户及其持仓汇总，含市值与浮动盈亏
     """
     try:
-        # 构建查询
-        query = db.query(Client)
+        if as_of_date:
+            # 与客户详情口径一致：每个客户只取截止日及之前最近一期存量快照
+            snapshots = db.query(
+                Position.group_id, func.max(Position.stock_date).label('stock_date')
+            ).filter(Position.stock_date <= as_of_date).group_by(Position.group_id).subquery()
+            
+            # 截止日及之前每只基金的最近净值
+            nav_dates = db.query(
+                Nav.fund_code, func.max(Nav.nav_date).label('nav_date')
+            ).filter(Nav.nav_date <= as_of_date).group_by(Nav.fund_code).subquery()
+            nav_as_of = db.query(Nav.fund_code, Nav.unit_nav).join(
+                nav_dates, and_(Nav.fund_code == nav_dates.c.fund_code, Nav.nav_date == nav_dates.c.nav_date)
+            ).subquery()
+            
+            # 与客户列表口径一致：份额或净值为空/零的持仓不计市值，成本为空/零的持仓不计盈亏
+            has_value = and_(Position.shares != 0, nav_as_of.c.unit_nav != 0)
+            query = db.query(
+                Client.group_id,
+                Client.obscured_name,
+                Client.domestic_planner,
+                func.coalesce(func.sum(Position.cost_with_fee), 0).label('total_cost'),
+                func.count(func.distinct(Position.fund_code)).label('fund_count'),
+                type_coerce(func.coalesce(func.sum(
+                    case((has_value, Position.shares * nav_as_of.c.unit_nav), else_=0)
+                ), 0), PortfolioSummary.market_value.type).label('market_value'),
+                type_coerce(func.coalesce(func.sum(
+                    case((and_(has_value, Position.cost_with_fee != 0),
+                          Position.shares * nav_as_of.c.unit_nav - Position.cost_with_fee), else_=0)
+                ), 0), PortfolioSummary.unrealized_pnl.type).label('unrealized_pnl'),
+                func.count(Position.group_id).label('position_count')
+            ).outerjoin(snapshots, Client.group_id == snapshots.c.group_id)\
+             .outerjoin(Position, and_(Position.group_id == snapshots.c.group_id,
+                                       Position.stock_date == snapshots.c.stock_date))\
+             .outerjoin(nav_as_of, Position.fund_code == nav_as_of.c.fund_code)
+        else:
+            # 每个客户只取最近一期存量时间的汇总行，与指定截止日的口径一致
+            latest = db.query(
+                PortfolioSummary.group_id, func.max(PortfolioSummary.stock_date).label('stock_date')
+            ).group_by(PortfolioSummary.group_id).subquery()
+            query = db.query(
+                Client.group_id,
+                Client.obscured_name,
+                Client.domestic_planner,
+                func.coalesce(func.sum(PortfolioSummary.total_cost), 0).label('total_cost'),
+                func.coalesce(func.sum(PortfolioSummary.fund_count), 0).label('fund_count'),
+                func.coalesce(func.sum(PortfolioSummary.market_value), 0).label('market_value'),
+                func.coalesce(func.sum(PortfolioSummary.unrealized_pnl), 0).label('unrealized_pnl'),
+                func.coalesce(func.sum(PortfolioSummary.position_count), 0).label('position_count')
+            ).outerjoin(latest, Client.group_id == latest.c.group_id)\
+             .outerjoin(PortfolioSummary, and_(PortfolioSummary.group_id == latest.c.group_id,
+                                               PortfolioSummary.stock_date == latest.c.stock_date))
+        
         if domestic_planner:
-            query = query.filter(Client.domestic_planner.like(f"%{domestic_planner}%"))
+            query = query.filter(
+                search_index.filter(Client.group_id, 'client', domestic_planner, ['domestic_planner'])
+            )
+        
+        # 一次分组查询得到所有客户的汇总，再按理财师归集；
+        # 没有持仓的客户不计入客户数和客户列表，但其理财师仍然列出
+        client_rows = query.group_by(Client.group_id, Client.obscured_name, Client.domestic_planner)\
+                           .order_by(desc('total_cost'), Client.group_id).all()
         
-        clients = query.all()
+        def pnl_ratio(pnl: float, cost: float) -> float:
+            return pnl / cost * 100 if cost > 0 else 0
         
         planner_summary = {}
-        for client in clients:
-            planner = client.domestic_planner or "未分配"
+        for row in client_rows:
+            planner = row.domestic_planner or "未分配"
             
             if planner not in planner_summary:
                 planner_summary[planner] = {
                     "planner_name": planner,
                     "client_count": 0,
                     "total_cost": 0,
+                    "total_market_value": 0,
+                    "total_unrealized_pnl": 0,
                     "clients": []
                 }
+            if not row.position_count:
+                continue
             
-            # 获取客户持仓统计
-            positions = db.query(Position).filter(Position.group_id == client.group_id).all()
+            client_total_cost = float(row.total_cost or 0)
+            client_market_value = float(row.market_value or 0)
+            client_unrealized_pnl = float(row.unrealized_pnl or 0)
             
-            if positions:
-                client_total_cost = sum([float(pos.cost_with_fee or 0) for pos in positions])
-                fund_count = len(set([pos.fund_code for pos in positions]))
-                
-                planner_summary[planner]["client_count"] += 1
-                planner_summary[planner]["total_cost"] += client_total_cost
-                planner_summary[planner]["clients"].append({
-                    "group_id": client.group_id,
-                    "client_name": client.obscured_name,
-                    "fund_count": fund_count,
-                    "total_cost": client_total_cost
-                })
+            summary = planner_summary[planner]
+            summary["client_count"] += 1
+            summary["total_cost"] += client_total_cost
+            summary["total_market_value"] += client_market_value
+            summary["total_unrealized_pnl"] += client_unrealized_pnl
+            summary["clients"].append({
+                "group_id": row.group_id,
+                "client_name": row.obscured_name,
+                "fund_count": int(row.fund_count or 0),
+                "total_cost": client_total_cost,
+                "total_market_value": client_market_value,
+                "total_unrealized_pnl": client_unrealized_pnl,
+                "unrealized_pnl_ratio": pnl_ratio(client_unrealized_pnl, client_total_cost)
+            })
+        
+        # 理财师按成本降序，名下客户分页返回
+        offset = (client_page - 1) * client_page_size
+        planners = sorted(planner_summary.values(), key=lambda item: (-item["total_cost"], item["planner_name"]))
+        for summary in planners:
+            summary["unrealized_pnl_ratio"] = pnl_ratio(summary["total_unrealized_pnl"], summary["total_cost"])
+            summary["clients"] = summary["clients"][offset:offset + client_page_size]
         
         return APIResponse(
             success=True,
             message="理财师持仓汇总完成",
             data={
-                "planner_summary": list(planner_summary.values()),
-                "total_planners": len(planner_summary)
+                "planner_summary": planners,
+                "total_planners": len(planners),
+                "as_of_date": as_of_date.isoformat() if as_of_date else None,
+                "client_page": client_page,
+                "client_page_size": client_page_size
             }
         )
         
@@ -1188,59 +1481,64 @@ async def get_positions_by_planner(
 
 
 @router.get("/statistics/overview", response_model=APIResponse, summary="持仓统计概览")
-async def get_position_statistics(db: Session = Depends(get_db)):
+async def get_position_statistics(
+    as_of_date: Optional[date] = Query(None, description="截止日期：每个客户取该日及之前最近一期存量快照，默认为当前持仓"),
+    db: Session = Depends(get_db)
+):
     """
-    获取持仓统计概览
+    获取持仓统计概览（按当前持仓统计，每个客户只计最近一期存量快照）
     
+    - **as_of_date**: 可选，截止日期
     - **返回**: 总体持仓统计、基金分布、客户分布等信息
     """
     try:
         from sqlalchemy import distinct
         
-        # 基础统计
-        total_positions = db.query(Position).count()
-        total_clients = db.query(distinct(Position.group_id)).count()
-        total_funds = db.query(distinct(Position.fund_code)).count()
+        holdings = holdings_source(as_of_date)
         
-        # 资金统计
-        total_cost_stats = db.query(
-            func.sum(Position.cost_with_fee).label('total_cost_with_fee'),
-            func.sum(Position.cost_without_fee).label('total_cost_without_fee'),
-            func.sum(Position.shares).label('total_shares')
-        ).first()
+        # 基础统计与资金统计
+        total_stats = db.query(
+            func.count().label('total_positions'),
+            func.count(distinct(holdings.c.group_id)).label('total_clients'),
+            func.count(distinct(holdings.c.fund_code)).label('total_funds'),
+            func.sum(holdings.c.cost_with_fee).label('total_cost_with_fee'),
+            func.sum(holdings.c.cost_without_fee).label('total_cost_without_fee'),
+            func.sum(holdings.c.shares).label('total_shares')
+        ).select_from(holdings).first()
         
         # 按基金统计
         fund_stats = db.query(
-            Position.fund_code,
+            holdings.c.fund_code,
             Fund.fund_name,
-            func.count(distinct(Position.group_id)).label('client_count'),
-            func.sum(Position.cost_with_fee).label('total_cost'),
-            func.sum(Position.shares).label('total_shares')
-        ).join(Fund).group_by(Position.fund_code, Fund.fund_name)\
-         .order_by(func.sum(Position.cost_with_fee).desc()).limit(10).all()
+            func.count(holdings.c.group_id).label('client_count'),
+            func.sum(holdings.c.cost_with_fee).label('total_cost'),
+            func.sum(holdings.c.shares).label('total_shares')
+        ).join(Fund, Fund.fund_code == holdings.c.fund_code)\
+         .group_by(holdings.c.fund_code, Fund.fund_name)\
+         .order_by(func.sum(holdings.c.cost_with_fee).desc()).limit(10).all()
         
         # 按客户统计
         client_stats = db.query(
-            Position.group_id,
+            holdings.c.group_id,
             Client.obscured_name,
             Client.domestic_planner,
-            func.count(distinct(Position.fund_code)).label('fund_count'),
-            func.sum(Position.cost_with_fee).label('total_cost')
-        ).join(Client).group_by(
-            Position.group_id, Client.obscured_name, Client.domestic_planner
-        ).order_by(func.sum(Position.cost_with_fee).desc()).limit(10).all()
+            func.count(holdings.c.fund_code).label('fund_count'),
+            func.sum(holdings.c.cost_with_fee).label('total_cost')
+        ).join(Client, Client.group_id == holdings.c.group_id).group_by(
+            holdings.c.group_id, Client.obscured_name, Client.domestic_planner
+        ).order_by(func.sum(holdings.c.cost_with_fee).desc()).limit(10).all()
         
         return APIResponse(
             success=True,
             message="持仓统计概览获取成功",
             data={
                 "overview": {
-                    "total_positions": total_positions,
-                    "total_clients": total_clients,
-                    "total_funds": total_funds,
-                    "total_cost_with_fee": float(total_cost_stats.total_cost_with_fee or 0),
-                    "total_cost_without_fee": float(total_cost_stats.total_cost_without_fee or 0),
-                    "total_shares": float(total_cost_stats.total_shares or 0)
+                    "total_positions": total_stats.total_positions,
+                    "total_clients": total_stats.total_clients,
+                    "total_funds": total_stats.total_funds,
+                    "total_cost_with_fee": float(total_stats.total_cost_with_fee or 0),
+                    "total_cost_without_fee": float(total_stats.total_cost_without_fee or 0),
+                    "total_shares": float(total_stats.total_shares or 0)
                 },
                 "top_funds": [
                     {
@@ -1310,11 +1608,9 @@ async def upload_client_dividends(
                 total_results["errors"].append(f"文件 {file.filename} 不是Excel格式")
                 continue
             
-            # 读取文件内容
-            file_content = await file.read()
-            
-            # 处理单个文件
-            result = await process_client_dividend_excel(file_content, file.filename, override_existing, db)
+            # 上传文件落盘后分块读取处理
+            async with spooled_upload(file) as file_path:
+                result = await process_client_dividend_excel(file_path, file.filename, override_existing, db)
             
             # 累计统计
             total_results["success_count"] += result["success_count"]
@@ -1341,7 +1637,7 @@ async def upload_client_dividends(
         )
 
 
-async def process_client_dividend_excel(file_content: bytes, filename: str, override_existing: bool, db: Session) -> dict:
+async def process_client_dividend_excel(file_path: str, filename: str, override_existing: bool, db: Session) -> dict:
     """
     处理单个客户分红Excel文件
     """
@@ -1350,194 +1646,205 @@ async def process_client_dividend_excel(file_content: bytes, filename: str, over
     updated_count = 0
     created_count = 0
     errors = []
+    # 当前未提交块开始前的计数与块行数，处理失败时回退到已提交的计数
+    chunk_start = None
+    chunk_rows = 0
     
     try:
-        # 读取Excel文件
-        df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-        
-        # 定义中英文字段映射
-        column_mapping = {
-            '集团号': 'group_id',
-            '产品代码': 'fund_code',
-            '基金代码': 'fund_code',
-            '产品名称': 'fund_name',
-            '基金名称': 'fund_name',
-            '交易类型': 'transaction_type',
-            '确认金额(原币)': 'confirmed_amount',
-            '确认金额': 'confirmed_amount',
-            '确认份额': 'confirmed_shares',
-            '确认日期': 'confirmed_date',
-            # 英文字段名（兼容性）
-            'group_id': 'group_id',
-            'fund_code': 'fund_code',
-            'fund_name': 'fund_name',
-            'transaction_type': 'transaction_type',
-            'confirmed_amount': 'confirmed_amount',
-            'confirmed_shares': 'confirmed_shares',
-            'confirmed_date': 'confirmed_date'
-        }
-        
-        # 转换列名
-        df_columns_mapped = {}
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str in column_mapping:
-                df_columns_mapped[col] = column_mapping[col_str]
-            else:
-                df_columns_mapped[col] = col_str
-        
-        df = df.rename(columns=df_columns_mapped)
-        
-        # 验证必要列
-        required_columns = ['group_id', 'fund_code', 'transaction_type', 'confirmed_date']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
-            errors.append(error_msg)
-            return {
-                "success_count": 0,
-                "failed_count": len(df) if len(df) > 0 else 1,
-                "updated_count": 0,
-                "created_count": 0,
-                "errors": errors
+        # 分块读取Excel文件
+        with ExcelChunkReader(file_path) as reader:
+            # 定义中英文字段映射
+            column_mapping = {
+                '集团号': 'group_id',
+                '产品代码': 'fund_code',
+                '基金代码': 'fund_code',
+                '产品名称': 'fund_name',
+                '基金名称': 'fund_name',
+                '交易类型': 'transaction_type',
+                '确认金额(原币)': 'confirmed_amount',
+                '确认金额': 'confirmed_amount',
+                '确认份额': 'confirmed_shares',
+                '确认日期': 'confirmed_date',
+                # 英文字段名（兼容性）
+                'group_id': 'group_id',
+                'fund_code': 'fund_code',
+                'fund_name': 'fund_name',
+                'transaction_type': 'transaction_type',
+                'confirmed_amount': 'confirmed_amount',
+                'confirmed_shares': 'confirmed_shares',
+                'confirmed_date': 'confirmed_date'
             }
-        
-        # 处理每一行数据
-        for index, row in df.iterrows():
-            try:
-                # 获取基本字段
-                group_id = DateConverter.format_group_id(str(row['group_id']).strip())
-                fund_code = str(row['fund_code']).strip()
-                transaction_type = str(row['transaction_type']).strip()
-                
-                # 处理日期
-                confirmed_date_str = str(row['confirmed_date']).strip()
-                confirmed_date = DateConverter.convert_date_string(confirmed_date_str)
+            
+            # 转换列名
+            df_columns_mapped = {}
+            for col in reader.columns:
+                col_str = str(col).strip()
+                if col_str in column_mapping:
+                    df_columns_mapped[col] = column_mapping[col_str]
+                else:
+                    df_columns_mapped[col] = col_str
+            
+            # 验证必要列
+            required_columns = ['group_id', 'fund_code', 'transaction_type', 'confirmed_date']
+            missing_columns = [col for col in required_columns if col not in df_columns_mapped.values()]
+            
+            if missing_columns:
+                error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
+                errors.append(error_msg)
+                row_count = sum(len(chunk) for chunk in reader)
+                return {
+                    "success_count": 0,
+                    "failed_count": row_count if row_count > 0 else 1,
+                    "updated_count": 0,
+                    "created_count": 0,
+                    "errors": errors
+                }
+            
+            # 逐块处理数据，每块提交一次
+            for df in reader:
+                df = df.rename(columns=df_columns_mapped)
+                chunk_start = (success_count, failed_count, updated_count, created_count)
+                chunk_rows = len(df)
+                chunk_clients = set()
                 
-                # 处理数值字段
-                def parse_numeric_field(field_name, field_value):
-                    """解析数值字段，支持多种格式"""
-                    if pd.isna(field_value) or field_value is None:
-                        return None
-                    
+                # 处理每一行数据
+                for index, row in df.iterrows():
                     try:
-                        # 转为字符串并清理
-                        value_str = str(field_value).replace(',', '').replace('¥', '').replace('$', '').strip()
+                        # 获取基本字段
+                        group_id = DateConverter.format_group_id(str(row['group_id']).strip())
+                        fund_code = str(row['fund_code']).strip()
+                        transaction_type = str(row['transaction_type']).strip()
                         
-                        # 去除括号（负数）
-                        if value_str.startswith('(') and value_str.endswith(')'):
-                            value_str = '-' + value_str[1:-1]
+                        # 处理日期
+                        confirmed_date_str = str(row['confirmed_date']).strip()
+                        confirmed_date = DateConverter.convert_date_string(confirmed_date_str)
                         
-                        # 空值或零值处理
-                        if not value_str or value_str in ['0', '0.0', '0.00', '-', 'N/A', 'n/a', '']:
-                            return None
+                        # 处理数值字段
+                        def parse_numeric_field(field_name, field_value):
+                            """解析数值字段，支持多种格式"""
+                            if pd.isna(field_value) or field_value is None:
+                                return None
+                            
+                            try:
+                                # 转为字符串并清理
+                                value_str = str(field_value).replace(',', '').replace('¥', '').replace('$', '').strip()
+                                
+                                # 去除括号（负数）
+                                if value_str.startswith('(') and value_str.endswith(')'):
+                                    value_str = '-' + value_str[1:-1]
+                                
+                                # 空值或零值处理
+                                if not value_str or value_str in ['0', '0.0', '0.00', '-', 'N/A', 'n/a', '']:
+                                    return None
+                                
+                                # 转换为Decimal
+                                return Decimal(value_str)
+                            except (ValueError, TypeError, Decimal.InvalidOperation) as e:
+                                logger.warning(f"第{index+2}行: {field_name}格式错误: {field_value} - {str(e)}")
+                                return None
                         
-                        # 转换为Decimal
-                        return Decimal(value_str)
-                    except (ValueError, TypeError, Decimal.InvalidOperation) as e:
-                        logger.warning(f"第{index+2}行: {field_name}格式错误: {field_value} - {str(e)}")
-                        return None
-                
-                confirmed_amount = parse_numeric_field("确认金额", row.get('confirmed_amount'))
-                confirmed_shares = parse_numeric_field("确认份额", row.get('confirmed_shares'))
-                
-                # 验证基金是否存在，如果不存在则自动创建
-                fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
-                if not fund:
-                    fund_name = row.get('fund_name', f"基金_{fund_code}")  # 使用Excel中的基金名称或默认名称
-                    new_fund = Fund(
-                        fund_code=fund_code,
-                        fund_name=fund_name
-                    )
-                    db.add(new_fund)
-                    db.flush()
-                    fund = new_fund
-                    logger.info(f"自动创建基金: {fund_code} - {fund_name}")
-                
-                # 验证客户是否存在
-                client = db.query(Client).filter(Client.group_id == group_id).first()
-                if not client:
-                    errors.append(f"第{index+2}行: 客户 {group_id} 不存在，请先上传客户持仓数据")
-                    failed_count += 1
-                    continue
-                
-                # 创建记录标识符用于批次内重复检查
-                record_key = (group_id, fund_code, str(confirmed_date), transaction_type)
-                
-                # 检查分红记录是否已存在（数据库中）
-                existing_dividend = db.query(ClientDividend).filter(
-                    and_(
-                        ClientDividend.group_id == group_id,
-                        ClientDividend.fund_code == fund_code,
-                        ClientDividend.confirmed_date == confirmed_date,
-                        ClientDividend.transaction_type == transaction_type
-                    )
-                ).first()
-                
-                if existing_dividend:
-                    if override_existing:
-                        # 更新分红记录
-                        existing_dividend.confirmed_amount = confirmed_amount
-                        existing_dividend.confirmed_shares = confirmed_shares
-                        updated_count += 1
-                        logger.info(f"更新分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
-                    else:
-                        errors.append(f"第{index+2}行: 分红记录已存在 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})，请勾选'覆盖已存在数据'选项")
-                        failed_count += 1
-                        continue
-                else:
-                    # 使用 merge 来处理可能的约束冲突
-                    try:
-                        new_dividend = ClientDividend(
-                            group_id=group_id,
-                            fund_code=fund_code,
-                            transaction_type=transaction_type,
-                            confirmed_amount=confirmed_amount,
-                            confirmed_shares=confirmed_shares,
-                            confirmed_date=confirmed_date
-                        )
-                        db.add(new_dividend)
-                        db.flush()  # 立即检查约束
-                        created_count += 1
-                        logger.info(f"创建分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
-                    except Exception as constraint_error:
-                        db.rollback()
-                        if "UNIQUE constraint failed" in str(constraint_error):
+                        confirmed_amount = parse_numeric_field("确认金额", row.get('confirmed_amount'))
+                        confirmed_shares = parse_numeric_field("确认份额", row.get('confirmed_shares'))
+                        
+                        # 验证基金是否存在，如果不存在则自动创建
+                        fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
+                        if not fund:
+                            fund_name = row.get('fund_name', f"基金_{fund_code}")  # 使用Excel中的基金名称或默认名称
+                            new_fund = Fund(
+                                fund_code=fund_code,
+                                fund_name=fund_name
+                            )
+                            db.add(new_fund)
+                            db.flush()
+                            fund = new_fund
+                            logger.info(f"自动创建基金: {fund_code} - {fund_name}")
+                        
+                        # 验证客户是否存在
+                        client = db.query(Client).filter(Client.group_id == group_id).first()
+                        if not client:
+                            errors.append(f"第{index+2}行: 客户 {group_id} 不存在，请先上传客户持仓数据")
+                            failed_count += 1
+                            continue
+                        
+                        # 创建记录标识符用于批次内重复检查
+                        record_key = (group_id, fund_code, str(confirmed_date), transaction_type)
+                        
+                        # 检查分红记录是否已存在（数据库中）
+                        existing_dividend = db.query(ClientDividend).filter(
+                            and_(
+                                ClientDividend.group_id == group_id,
+                                ClientDividend.fund_code == fund_code,
+                                ClientDividend.confirmed_date == confirmed_date,
+                                ClientDividend.transaction_type == transaction_type
+                            )
+                        ).first()
+                        
+                        if existing_dividend:
                             if override_existing:
-                                # 如果允许覆盖，重新查询并更新
-                                existing_dividend = db.query(ClientDividend).filter(
-                                    and_(
-                                        ClientDividend.group_id == group_id,
-                                        ClientDividend.fund_code == fund_code,
-                                        ClientDividend.confirmed_date == confirmed_date,
-                                        ClientDividend.transaction_type == transaction_type
-                                    )
-                                ).first()
-                                if existing_dividend:
-                                    existing_dividend.confirmed_amount = confirmed_amount
-                                    existing_dividend.confirmed_shares = confirmed_shares
-                                    updated_count += 1
-                                    logger.info(f"约束冲突后更新分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
-                                else:
-                                    errors.append(f"第{index+2}行: 约束冲突但找不到记录 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})")
-                                    failed_count += 1
-                                    continue
+                                # 更新分红记录
+                                existing_dividend.confirmed_amount = confirmed_amount
+                                existing_dividend.confirmed_shares = confirmed_shares
+                                updated_count += 1
+                                logger.info(f"更新分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
                             else:
-                                errors.append(f"第{index+2}行: 分红记录重复 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})，请勾选'覆盖已存在数据'选项")
+                                errors.append(f"第{index+2}行: 分红记录已存在 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})，请勾选'覆盖已存在数据'选项")
                                 failed_count += 1
                                 continue
                         else:
-                            raise constraint_error
-                
-                success_count += 1
+                            # 使用 merge 来处理可能的约束冲突
+                            try:
+                                new_dividend = ClientDividend(
+                                    group_id=group_id,
+                                    fund_code=fund_code,
+                                    transaction_type=transaction_type,
+                                    confirmed_amount=confirmed_amount,
+                                    confirmed_shares=confirmed_shares,
+                                    confirmed_date=confirmed_date
+                                )
+                                db.add(new_dividend)
+                                db.flush()  # 立即检查约束
+                                created_count += 1
+                                logger.info(f"创建分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
+                            except Exception as constraint_error:
+                                db.rollback()
+                                if "UNIQUE constraint failed" in str(constraint_error):
+                                    if override_existing:
+                                        # 如果允许覆盖，重新查询并更新
+                                        existing_dividend = db.query(ClientDividend).filter(
+                                            and_(
+                                                ClientDividend.group_id == group_id,
+                                                ClientDividend.fund_code == fund_code,
+                                                ClientDividend.confirmed_date == confirmed_date,
+                                                ClientDividend.transaction_type == transaction_type
+                                            )
+                                        ).first()
+                                        if existing_dividend:
+                                            existing_dividend.confirmed_amount = confirmed_amount
+                                            existing_dividend.confirmed_shares = confirmed_shares
+                                            updated_count += 1
+                                            logger.info(f"约束冲突后更新分红记录: {group_id}, {fund_code}, {confirmed_date}, {transaction_type}")
+                                        else:
+                                            errors.append(f"第{index+2}行: 约束冲突但找不到记录 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})")
+                                            failed_count += 1
+                                            continue
+                                    else:
+                                        errors.append(f"第{index+2}行: 分红记录重复 ({group_id}, {fund_code}, {confirmed_date}, {transaction_type})，请勾选'覆盖已存在数据'选项")
+                                        failed_count += 1
+                                        continue
+                                else:
+                                    raise constraint_error
+                        
+                        chunk_clients.add(group_id)
+                        success_count += 1
+                        
+                    except Exception as e:
+                        errors.append(f"第{index+2}行: {str(e)}")
+                        failed_count += 1
                 
-            except Exception as e:
-                errors.append(f"第{index+2}行: {str(e)}")
-                failed_count += 1
-        
-        # 提交所有更改
-        db.commit()
+                # 重算本块涉及客户的持仓汇总后提交本块更改
+                PortfolioSummaryService(db).refresh_clients(chunk_clients)
+                db.commit()
+                chunk_start = None
         
         return {
             "success_count": success_count,
@@ -1548,13 +1855,19 @@ async def process_client_dividend_excel(file_content: bytes, filename: str, over
         }
         
     except Exception as e:
+        # 只回滚未提交的当前块，已提交块的结果保留
         db.rollback()
         errors.append(f"文件处理失败: {str(e)}")
+        if chunk_start is not None:
+            success_count, failed_count, updated_count, created_count = chunk_start
+            failed_count += chunk_rows
+        else:
+            failed_count += 1
         return {
-            "success_count": 0,
-            "failed_count": 1,
-            "updated_count": 0,
-            "created_count": 0,
+            "success_count": success_count,
+            "failed_count": failed_count,
+            "updated_count": updated_count,
+            "created_count": created_count,
             "errors": errors
         }
 
@@ -1591,3 +1904,181 @@ async def analyze_client_underlying_positions(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"客户底层持仓分析失败: {str(e)}"
         )
+
+
+@router.get("/exposure/firm", response_model=APIResponse, summary="全公司底层穿透敞口")
+async def get_firm_exposure(db: Session = Depends(get_db)):
+    """
+    全公司客户持仓穿透后的资产类别和行业分布
+    
+    - **返回**: 底层资产、行业穿透市值及占比，口径与客户底层持仓分析一致
+    """
+    try:
+        return APIResponse(
+            success=True,
+            message="全公司底层穿透敞口计算完成",
+            data=exposure_engine.get(db).firm()
+        )
+        
+    except Exception as e:
+        logger.error(f"全公司底层穿透敞口计算失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"全公司底层穿透敞口计算失败: {str(e)}"
+        )
+
+
+@router.get("/exposure/planners", response_model=APIResponse, summary="按理财师底层穿透敞口")
+async def get_planner_exposures(
+    domestic_planner: Optional[str] = Query(None, description="理财师名称，精确匹配；不传返回所有理财师"),
+    db: Session = Depends(get_db)
+):
+    """
+    按理财师汇总名下客户持仓穿透后的资产类别和行业分布
+    
+    - **domestic_planner**: 可选，指定理财师（未分配理财师的客户归入"未分配"）
+    - **返回**: 各理财师的底层资产、行业穿透市值及占比，按穿透市值降序
+    """
+    try:
+        result = exposure_engine.get(db)
+        if domestic_planner:
+            planner_exposure = result.planner(domestic_planner)
+            planners = [dict(planner_exposure, planner_name=domestic_planner)] if planner_exposure else []
+        else:
+            planners = result.planners_summary()
+        
+        return APIResponse(
+            success=True,
+            message="理财师底层穿透敞口计算完成",
+            data={"planners": planners, "total_planners": len(planners)}
+        )
+        
+    except Exception as e:
+        logger.error(f"理财师底层穿透敞口计算失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"理财师底层穿透敞口计算失败: {str(e)}"
+        )
+
+
+@router.get("/exposure/clients/{group_id}", response_model=APIResponse, summary="客户底层穿透敞口")
+async def get_client_exposure(
+    group_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    单个客户持仓穿透后的资产类别和行业分布，与全公司、理财师汇总共用一次计算结果
+    
+    - **group_id**: 客户集团号
+    - **返回**: 底层资产、行业穿透市值及占比；客户没有可穿透的持仓时分布为空
+    """
+    try:
+        exposure = exposure_engine.get(db).client(group_id)
+        if exposure is None:
+            if not db.query(Client.group_id).filter(Client.group_id == group_id).first():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"客户 {group_id} 不存在"
+                )
+            exposure = {
+                "asset_distribution": {"data": [], "total_value": 0},
+                "industry_distribution": {"data": [], "total_value": 0}
+            }
+        
+        return APIResponse(
+            success=True,
+            message=f"客户 {group_id} 底层穿透敞口计算完成",
+            data=exposure
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"客户底层穿透敞口计算失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"客户底层穿透敞口计算失败: {str(e)}"
+        )
+
+
+@router.get("/time-machine/valuations", response_model=APIResponse, summary="持仓时点回溯估值")
+async def get_time_machine_valuations(
+    dates: Optional[str] = Query(None, description="截止日期列表，逗号分隔（YYYY-MM-DD）；不传时取月末序列"),
+    months: int = Query(36, ge=1, le=240, description="不传 dates 时取 end_date 及之前最近若干个月末"),
+    end_date: Optional[date] = Query(None, description="月末序列的结束日期，默认今天"),
+    group_ids: Optional[str] = Query(None, description="客户集团号，逗号分隔；不传时回溯全部客户"),
+    include_clients: bool = Query(False, description="是否返回逐客户估值明细"),
+    db: Session = Depends(get_db)
+):
+    """
+    批量回溯客户持仓在多个截止日期的估值
+    
+    - 每个客户取截止日期及之前最近一期存量快照，按截止日期及之前的最近单位净值估值
+    - 默认回溯全部客户最近 36 个月末，一次计算完成
+    - **返回**: 每个截止日期的汇总；include_clients 为 true 时附带逐客户明细
+    """
+    try:
+        if dates:
+            try:
+                as_of_dates = sorted({date.fromisoformat(item.strip()) for item in dates.split(',') if item.strip()})
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"截止日期格式错误: {dates}"
+                )
+        else:
+            as_of_dates = month_ends(end_date or date.today(), months)
+        
+        client_ids = [item.strip() for item in group_ids.split(',') if item.strip()] if group_ids else None
+        valuations = TimeMachineService(db).valuations(as_of_dates, client_ids)
+        
+        by_date = valuations.groupby('as_of_date').agg(
+            client_count=('group_id', 'size'),
+            position_count=('position_count', 'sum'),
+            total_cost=('total_cost', 'sum'),
+            market_value=('market_value', 'sum'),
+            unrealized_pnl=('unrealized_pnl', 'sum'),
+        ) if not valuations.empty else None
+        
+        totals = []
+        for as_of in as_of_dates:
+            row = by_date.loc[as_of] if by_date is not None and as_of in by_date.index else None
+            totals.append({
+                "as_of_date": as_of.isoformat(),
+                "client_count": int(row['client_count']) if row is not None else 0,
+                "position_count": int(row['position_count']) if row is not None else 0,
+                "total_cost": round(float(row['total_cost']), 2) if row is not None else 0.0,
+                "market_value": round(float(row['market_value']), 2) if row is not None else 0.0,
+                "unrealized_pnl": round(float(row['unrealized_pnl']), 2) if row is not None else 0.0,
+            })
+        
+        data = {"dates": [as_of.isoformat() for as_of in as_of_dates], "totals": totals}
+        if include_clients:
+            data["clients"] = [
+                {
+                    "as_of_date": row.as_of_date.isoformat(),
+                    "group_id": row.group_id,
+                    "snapshot_date": row.snapshot_date.isoformat(),
+                    "position_count": int(row.position_count),
+                    "total_cost": round(float(row.total_cost), 2),
+                    "total_shares": round(float(row.total_shares), 2),
+                    "market_value": round(float(row.market_value), 2),
+                    "unrealized_pnl": round(float(row.unrealized_pnl), 2),
+                }
+                for row in valuations.itertuples(index=False)
+            ]
+        
+        return APIResponse(
+            success=True,
+            message=f"持仓回溯估值完成，共 {len(as_of_dates)} 个截止日期",
+            data=data
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"持仓回溯估值失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"持仓回溯估值失败: {str(e)}"
+        )
@@ -5,7 +5,7 @@ Stage Performance Analysis Routes
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import and_
 from typing import List, Optional
 from datetime import date, timedelta
 from decimal import Decimal
@@ -13,8 +13,11 @@ import logging
 from pydantic import BaseModel
 
 from ..database import get_db
-from ..models import Fund, Nav, Strategy
+from ..models import Fund, FundLatestNav, Strategy
 from ..schemas.common import APIResponse
+from ..services.nav_store import nav_store, to_nav_decimal
+from ..services.nav_panel import nav_panel_cache
+from ..services.search_index import search_index
 
 logger = logging.getLogger(__name__)
 
@@ -70,32 +73,19 @@ async def get_weekly_performance(
         today = date.today()
         cutoff_date = today - timedelta(days=days_limit)
         
-        # 获取所有基金的最新净值记录
-        latest_nav_subquery = db.query(
-            Nav.fund_code,
-            func.max(Nav.nav_date).label('latest_date')
-        ).filter(
-            Nav.nav_date >= cutoff_date
-        ).group_by(Nav.fund_code).subquery()
-        
-        # 获取基金、策略和最新净值信息
+        # 获取基金、策略和最新净值信息（仅保留时效范围内有净值更新的基金）
         funds_query = db.query(
             Fund.fund_code,
             Fund.fund_name,
             Strategy.main_strategy,
             Strategy.sub_strategy,
-            Nav.nav_date.label('latest_nav_date'),
-            Nav.unit_nav.label('latest_nav')
-        ).join(
-            latest_nav_subquery,
-            and_(
-                Fund.fund_code == latest_nav_subquery.c.fund_code,
-            )
+            FundLatestNav.nav_date.label('latest_nav_date'),
+            FundLatestNav.unit_nav.label('latest_nav')
         ).join(
-            Nav,
+            FundLatestNav,
             and_(
-                Fund.fund_code == Nav.fund_code,
-                Nav.nav_date == latest_nav_subquery.c.latest_date
+                Fund.fund_code == FundLatestNav.fund_code,
+                FundLatestNav.nav_date >= cutoff_date
             )
         ).outerjoin(
             Strategy,
@@ -104,12 +94,7 @@ async def get_weekly_performance(
         
         # 应用筛选条件
         if search:
-            funds_query = funds_query.filter(
-                or_(
-                    Fund.fund_name.like(f"%{search}%"),
-                    Fund.fund_code.like(f"%{search}%")
-                )
-            )
+            funds_query = funds_query.filter(search_index.filter(Fund.fund_code, 'fund', search))
         
         if major_strategy:
             funds_query = funds_query.filter(Strategy.main_strategy == major_strategy)
@@ -125,6 +110,9 @@ async def get_weekly_performance(
         # 计算今年年初日期
         year_start = date(today.year, 1, 1)
         
+        # 一次性加载全部候选基金的净值序列
+        nav_store.preload(db, [fund.fund_code for fund in funds_data])
+        
         for fund in funds_data:
             fund_code = fund.fund_code
             latest_date = fund.latest_nav_date
@@ -133,18 +121,13 @@ async def get_weekly_performance(
             # 计算一周前的日期（工作日逻辑）
             target_date = latest_date - timedelta(days=7)
             
+            nav_series = nav_store.get(db, fund_code)
+            
             # 查找一周前最近的净值记录
-            previous_nav_record = db.query(Nav).filter(
-                and_(
-                    Nav.fund_code == fund_code,
-                    Nav.nav_date <= target_date
-                )
-            ).order_by(desc(Nav.nav_date)).first()
+            previous_nav_record = nav_series.as_of(target_date)
             
             # 查找基金的第一个净值记录（成立净值）
-            first_nav_record = db.query(Nav).filter(
-                Nav.fund_code == fund_code
-            ).order_by(Nav.nav_date).first()
+            first_nav_record = nav_series.first()
             
             # 判断是否为今年成立的基金
             is_founded_this_year = first_nav_record and first_nav_record.nav_date >= year_start
@@ -154,12 +137,7 @@ async def get_weekly_performance(
                 ytd_nav_record = first_nav_record
             else:
                 # 去年或更早成立的基金，查找上年最后一个交易日的净值记录
-                ytd_nav_record = db.query(Nav).filter(
-                    and_(
-                        Nav.fund_code == fund_code,
-                        Nav.nav_date < year_start
-                    )
-                ).order_by(desc(Nav.nav_date)).first()
+                ytd_nav_record = nav_series.before(year_start)
             
             # 计算一周涨跌幅
             weekly_return = None
@@ -288,17 +266,12 @@ async def get_period_performance(
                 detail="开始日期必须早于结束日期"
             )
         
-        # 获取所有基金在指定日期范围内的净值数据
-        funds_query = db.query(Fund).outerjoin(Strategy, Fund.fund_code == Strategy.fund_code)
+        # 获取基金及其策略
+        funds_query = db.query(Fund, Strategy).outerjoin(Strategy, Fund.fund_code == Strategy.fund_code)
         
         # 应用筛选条件
         if search:
-            funds_query = funds_query.filter(
-                or_(
-                    Fund.fund_name.like(f"%{search}%"),
-                    Fund.fund_code.like(f"%{search}%")
-                )
-            )
+            funds_query = funds_query.filter(search_index.filter(Fund.fund_code, 'fund', search))
         
         if major_strategy:
             funds_query = funds_query.filter(Strategy.main_strategy == major_strategy)
@@ -307,44 +280,36 @@ async def get_period_performance(
             funds_query = funds_query.filter(Strategy.sub_strategy == sub_strategy)
         
         funds = funds_query.all()
+        fund_codes = [fund.fund_code for fund, _ in funds]
+        
+        # 在共享净值面板上一次取出所有基金的期末/期初净值
+        panel = nav_panel_cache.get(db)
+        end_navs, end_dates, has_end = panel.as_of(end_date, fund_codes)
+        start_navs, start_dates, has_start = panel.first_on_or_after(start_date, fund_codes)
         
         performance_data = []
         
-        for fund in funds:
-            # 获取结束日期最近的净值
-            end_nav = db.query(Nav).filter(
-                and_(
-                    Nav.fund_code == fund.fund_code,
-                    Nav.nav_date <= end_date
-                )
-            ).order_by(desc(Nav.nav_date)).first()
+        for i, (fund, strategy) in enumerate(funds):
+            if not (has_end[i] and has_start[i] and start_navs[i]):
+                continue
             
-            # 获取开始日期最近的净值
-            start_nav = db.query(Nav).filter(
-                and_(
-                    Nav.fund_code == fund.fund_code,
-                    Nav.nav_date >= start_date
-                )
-            ).order_by(Nav.nav_date).first()
+            start_nav = to_nav_decimal(start_navs[i])
+            end_nav = to_nav_decimal(end_navs[i])
+            period_return = float((end_nav - start_nav) / start_nav * 100)
             
-            if end_nav and start_nav and start_nav.unit_nav:
-                period_return = float((end_nav.unit_nav - start_nav.unit_nav) / start_nav.unit_nav * 100)
-                
-                strategy = fund.strategies[0] if fund.strategies else None
-                
-                performance_item = {
-                    "fund_code": fund.fund_code,
-                    "fund_name": fund.fund_name,
-                    "major_strategy": strategy.main_strategy if strategy else None,
-                    "sub_strategy": strategy.sub_strategy if strategy else None,
-                    "start_nav_date": start_nav.nav_date,
-                    "start_nav": start_nav.unit_nav,
-                    "end_nav_date": end_nav.nav_date,
-                    "end_nav": end_nav.unit_nav,
-                    "period_return": period_return
-                }
-                
-                performance_data.append(performance_item)
+            performance_item = {
+                "fund_code": fund.fund_code,
+                "fund_name": fund.fund_name,
+                "major_strategy": strategy.main_strategy if strategy else None,
+                "sub_strategy": strategy.sub_strategy if strategy else None,
+                "start_nav_date": start_dates[i].astype(object),
+                "start_nav": start_nav,
+                "end_nav_date": end_dates[i].astype(object),
+                "end_nav": end_nav,
+                "period_return": period_return
+            }
+            
+            performance_data.append(performance_item)
         
         return APIResponse(
             success=True,
@@ -6,11 +6,10 @@ Strategy Management Routes
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import func
 from typing import List, Optional
 import logging
 import pandas as pd
-from io import BytesIO
 
 from ..database import get_db
 from ..schemas.strategy import (
@@ -18,6 +17,9 @@ from ..schemas.strategy import (
     StrategyCreateResponse, StrategyErrorResponse, MainStrategyEnum
 )
 from ..models import Strategy, Fund
+from ..services.excel_reader import ExcelChunkReader, spooled_upload
+from ..services.pagination import InvalidCursorError, count_cache, keyset_paginate
+from ..services.search_index import search_index
 
 logger = logging.getLogger(__name__)
 
@@ -72,11 +74,9 @@ async def upload_strategies(
                 total_results["errors"].append(f"文件 {file.filename} 不是Excel格式")
                 continue
             
-            # 读取文件内容
-            file_content = await file.read()
-            
-            # 处理单个文件
-            result = await process_strategy_excel(file_content, file.filename, db)
+            # 上传文件落盘后分块读取处理
+            async with spooled_upload(file) as file_path:
+                result = await process_strategy_excel(file_path, file.filename, db)
             
             # 累计统计
             total_results["success_count"] += result["success_count"]
@@ -107,7 +107,7 @@ async def upload_strategies(
         )
 
 
-async def process_strategy_excel(file_content: bytes, filename: str, db: Session) -> dict:
+async def process_strategy_excel(file_path: str, filename: str, db: Session) -> dict:
     """
     处理单个策略Excel文件
     """
@@ -116,144 +116,152 @@ async def process_strategy_excel(file_content: bytes, filename: str, db: Session
     updated_count = 0
     created_count = 0
     errors = []
+    # 当前未提交块开始前的计数与块行数，处理失败时回退到已提交的计数
+    chunk_start = None
+    chunk_rows = 0
     
     try:
-        # 读取Excel文件
-        df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-        
-        # 定义中英文字段映射（修复重复映射问题）
-        column_mapping = {
-            # 中文字段名映射 - 优先使用产品代码作为基金代码
-            '产品代码': 'fund_code',
-            '基金代码': 'fund_code', 
-            '项目名称': 'project_name',  # 改为项目名称，避免冲突
-            '产品名称': 'fund_name', 
-            '大类策略': 'main_strategy',
-            '细分策略': 'sub_strategy',
-            '是否QD': 'is_qd',
-            # 英文字段名（兼容性）
-            'fund_code': 'fund_code',
-            'main_strategy': 'main_strategy',
-            'sub_strategy': 'sub_strategy',
-            'is_qd': 'is_qd'
-        }
-        
-        # 转换列名
-        df_columns_mapped = {}
-        for col in df.columns:
-            col_str = str(col).strip()
-            if col_str in column_mapping:
-                df_columns_mapped[col] = column_mapping[col_str]
-            else:
-                df_columns_mapped[col] = col_str
-        
-        df = df.rename(columns=df_columns_mapped)
-        
-        # 验证必要列
-        required_columns = ['fund_code', 'main_strategy', 'sub_strategy']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
-            errors.append(error_msg)
-            return {
-                "success_count": 0,
-                "failed_count": len(df) if len(df) > 0 else 1,
-                "updated_count": 0,
-                "created_count": 0,
-                "errors": errors
+        # 分块读取Excel文件
+        with ExcelChunkReader(file_path) as reader:
+            # 定义中英文字段映射（修复重复映射问题）
+            column_mapping = {
+                # 中文字段名映射 - 优先使用产品代码作为基金代码
+                '产品代码': 'fund_code',
+                '基金代码': 'fund_code', 
+                '项目名称': 'project_name',  # 改为项目名称，避免冲突
+                '产品名称': 'fund_name', 
+                '大类策略': 'main_strategy',
+                '细分策略': 'sub_strategy',
+                '是否QD': 'is_qd',
+                # 英文字段名（兼容性）
+                'fund_code': 'fund_code',
+                'main_strategy': 'main_strategy',
+                'sub_strategy': 'sub_strategy',
+                'is_qd': 'is_qd'
             }
-        
-        # 处理每一行数据
-        for index, row in df.iterrows():
-            try:
-                # 智能获取基金代码 - 优先从产品代码获取，如果没有则从项目名称获取
-                fund_code = None
-                if 'fund_code' in row and pd.notna(row['fund_code']):
-                    fund_code = str(row['fund_code']).strip()
-                elif 'project_name' in row and pd.notna(row['project_name']):
-                    # 如果产品代码为空，尝试从项目名称中提取代码
-                    project_name = str(row['project_name']).strip()
-                    fund_code = project_name  # 暂时使用项目名称，后续可能需要进一步解析
-                
-                if not fund_code:
-                    errors.append(f"第{index+2}行: 无法获取基金代码")
-                    failed_count += 1
-                    continue
-                
-                main_strategy = str(row['main_strategy']).strip()
-                sub_strategy = str(row['sub_strategy']).strip()
-                
-                # 处理项目名称字段
-                project_name = None
-                if 'project_name' in row and pd.notna(row['project_name']):
-                    project_name = str(row['project_name']).strip()
-                    if project_name and project_name.lower() not in ['nan', 'none', '']:
-                        pass  # 保留有效的项目名称
-                    else:
-                        project_name = None
-                
-                # 处理是否QD字段
-                is_qd = False
-                if 'is_qd' in row and pd.notna(row['is_qd']):
-                    qd_value = str(row['is_qd']).strip().lower()
-                    is_qd = qd_value in ['true', '1', 'yes', '是', 'qd']
-                
-                # 验证基金是否存在，如果不存在则自动创建
-                fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
-                if not fund:
-                    # 自动创建基金记录
-                    fund_name = None
-                    if 'fund_name' in row and pd.notna(row['fund_name']):
-                        fund_name = str(row['fund_name']).strip()
-                    else:
-                        fund_name = f"基金_{fund_code}"  # 默认名称
-                    
-                    new_fund = Fund(
-                        fund_code=fund_code,
-                        fund_name=fund_name
-                    )
-                    db.add(new_fund)
-                    db.flush()  # 立即刷新，获取新创建的基金对象
-                    fund = new_fund
-                    logger.info(f"自动创建基金: {fund_code} - {fund_name}")
-                
-                # 大类策略基本验证（允许任意值，只检查非空）
-                if not main_strategy or main_strategy.lower() in ['nan', 'none', '']:
-                    errors.append(f"第{index+2}行: 大类策略不能为空")
-                    failed_count += 1
-                    continue
-                
-                # 检查策略是否已存在
-                existing_strategy = db.query(Strategy).filter(Strategy.fund_code == fund_code).first()
-                
-                if existing_strategy:
-                    # 更新策略
-                    existing_strategy.main_strategy = main_strategy
-                    existing_strategy.sub_strategy = sub_strategy
-                    existing_strategy.project_name = project_name
-                    existing_strategy.is_qd = is_qd
-                    updated_count += 1
+            
+            # 转换列名
+            df_columns_mapped = {}
+            for col in reader.columns:
+                col_str = str(col).strip()
+                if col_str in column_mapping:
+                    df_columns_mapped[col] = column_mapping[col_str]
                 else:
-                    # 创建新策略
-                    new_strategy = Strategy(
-                        fund_code=fund_code,
-                        project_name=project_name,
-                        main_strategy=main_strategy,
-                        sub_strategy=sub_strategy,
-                        is_qd=is_qd
-                    )
-                    db.add(new_strategy)
-                    created_count += 1
+                    df_columns_mapped[col] = col_str
+            
+            # 验证必要列
+            required_columns = ['fund_code', 'main_strategy', 'sub_strategy']
+            missing_columns = [col for col in required_columns if col not in df_columns_mapped.values()]
+            
+            if missing_columns:
+                error_msg = f"Excel文件缺少必要列: {', '.join(missing_columns)}"
+                errors.append(error_msg)
+                row_count = sum(len(chunk) for chunk in reader)
+                return {
+                    "success_count": 0,
+                    "failed_count": row_count if row_count > 0 else 1,
+                    "updated_count": 0,
+                    "created_count": 0,
+                    "errors": errors
+                }
+            
+            # 逐块处理数据，每块提交一次
+            for df in reader:
+                df = df.rename(columns=df_columns_mapped)
+                chunk_start = (success_count, failed_count, updated_count, created_count)
+                chunk_rows = len(df)
                 
-                success_count += 1
+                # 处理每一行数据
+                for index, row in df.iterrows():
+                    try:
+                        # 智能获取基金代码 - 优先从产品代码获取，如果没有则从项目名称获取
+                        fund_code = None
+                        if 'fund_code' in row and pd.notna(row['fund_code']):
+                            fund_code = str(row['fund_code']).strip()
+                        elif 'project_name' in row and pd.notna(row['project_name']):
+                            # 如果产品代码为空，尝试从项目名称中提取代码
+                            project_name = str(row['project_name']).strip()
+                            fund_code = project_name  # 暂时使用项目名称，后续可能需要进一步解析
+                        
+                        if not fund_code:
+                            errors.append(f"第{index+2}行: 无法获取基金代码")
+                            failed_count += 1
+                            continue
+                        
+                        main_strategy = str(row['main_strategy']).strip()
+                        sub_strategy = str(row['sub_strategy']).strip()
+                        
+                        # 处理项目名称字段
+                        project_name = None
+                        if 'project_name' in row and pd.notna(row['project_name']):
+                            project_name = str(row['project_name']).strip()
+                            if project_name and project_name.lower() not in ['nan', 'none', '']:
+                                pass  # 保留有效的项目名称
+                            else:
+                                project_name = None
+                        
+                        # 处理是否QD字段
+                        is_qd = False
+                        if 'is_qd' in row and pd.notna(row['is_qd']):
+                            qd_value = str(row['is_qd']).strip().lower()
+                            is_qd = qd_value in ['true', '1', 'yes', '是', 'qd']
+                        
+                        # 验证基金是否存在，如果不存在则自动创建
+                        fund = db.query(Fund).filter(Fund.fund_code == fund_code).first()
+                        if not fund:
+                            # 自动创建基金记录
+                            fund_name = None
+                            if 'fund_name' in row and pd.notna(row['fund_name']):
+                                fund_name = str(row['fund_name']).strip()
+                            else:
+                                fund_name = f"基金_{fund_code}"  # 默认名称
+                            
+                            new_fund = Fund(
+                                fund_code=fund_code,
+                                fund_name=fund_name
+                            )
+                            db.add(new_fund)
+                            db.flush()  # 立即刷新，获取新创建的基金对象
+                            fund = new_fund
+                            logger.info(f"自动创建基金: {fund_code} - {fund_name}")
+                        
+                        # 大类策略基本验证（允许任意值，只检查非空）
+                        if not main_strategy or main_strategy.lower() in ['nan', 'none', '']:
+                            errors.append(f"第{index+2}行: 大类策略不能为空")
+                            failed_count += 1
+                            continue
+                        
+                        # 检查策略是否已存在
+                        existing_strategy = db.query(Strategy).filter(Strategy.fund_code == fund_code).first()
+                        
+                        if existing_strategy:
+                            # 更新策略
+                            existing_strategy.main_strategy = main_strategy
+                            existing_strategy.sub_strategy = sub_strategy
+                            existing_strategy.project_name = project_name
+                            existing_strategy.is_qd = is_qd
+                            updated_count += 1
+                        else:
+                            # 创建新策略
+                            new_strategy = Strategy(
+                                fund_code=fund_code,
+                                project_name=project_name,
+                                main_strategy=main_strategy,
+                                sub_strategy=sub_strategy,
+                                is_qd=is_qd
+                            )
+                            db.add(new_strategy)
+                            created_count += 1
+                        
+                        success_count += 1
+                        
+                    except Exception as e:
+                        errors.append(f"第{index+2}行: {str(e)}")
+                        failed_count += 1
                 
-            except Exception as e:
-                errors.append(f"第{index+2}行: {str(e)}")
-                failed_count += 1
-        
-        # 提交所有更改
-        db.commit()
+                # 提交本块更改
+                db.commit()
+                chunk_start = None
         
         return {
             "success_count": success_count,
@@ -264,13 +272,19 @@ async def process_strategy_excel(file_content: bytes, filename: str, db: Session
         }
         
     except Exception as e:
+        # 只回滚未提交的当前块，已提交块的结果保留
         db.rollback()
         errors.append(f"文件处理失败: {str(e)}")
+        if chunk_start is not None:
+            success_count, failed_count, updated_count, created_count = chunk_start
+            failed_count += chunk_rows
+        else:
+            failed_count += 1
         return {
-            "success_count": 0,
-            "failed_count": 1,
-            "updated_count": 0,
-            "created_count": 0,
+            "success_count": success_count,
+            "failed_count": failed_count,
+            "updated_count": updated_count,
+            "created_count": created_count,
             "errors": errors
         }
 
@@ -571,6 +585,7 @@ async def get_strategy_list(
     status: Optional[str] = Query(None, description="状态筛选"),
     sort_by: Optional[str] = Query("created_at", description="排序字段"),
     sort_order: Optional[str] = Query("desc", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空值，之后传上一页返回的next_cursor"),
     db: Session = Depends(get_db)
 ):
     """
@@ -579,6 +594,7 @@ async def get_strategy_list(
     **分页支持：**
     - 默认每页20条，可自定义
     - 支持按基金代码/大类策略筛选
+    - 传入 cursor 时使用游标分页（按基金代码），忽略 page
     
     **返回格式：**
     - { "total": 100, "page": 1, "page_size": 20, "data": [...] }
@@ -595,29 +611,35 @@ async def get_strategy_list(
         # 应用筛选条件
         if actual_fund_code:
             # search参数支持同时搜索基金代码和基金名称
-            query = query.filter(
-                or_(
-                    Strategy.fund_code.like(f"%{actual_fund_code}%"),
-                    Fund.fund_name.like(f"%{actual_fund_code}%")
-                )
-            )
+            query = query.filter(search_index.filter(Strategy.fund_code, 'fund', actual_fund_code))
         if fund_name:
-            query = query.filter(Fund.fund_name.like(f"%{fund_name}%"))
+            query = query.filter(search_index.filter(Strategy.fund_code, 'fund', fund_name, ['fund_name']))
         if actual_main_strategy:
             query = query.filter(Strategy.main_strategy == actual_main_strategy)
         if subStrategy:
             query = query.filter(Strategy.sub_strategy.like(f"%{subStrategy}%"))
         
-        # 获取总数
-        total = query.count()
-        
-        # 应用排序（简单处理，只支持默认排序）
-        query = query.order_by(Strategy.fund_code)
+        # 获取总数（按筛选条件和数据版本缓存）
+        total = count_cache.get_or_count(
+            ('strategy_list', actual_fund_code, fund_name, actual_main_strategy, subStrategy),
+            (Strategy.__tablename__, Fund.__tablename__),
+            query.count
+        )
         
-        # 应用分页
-        strategies = query.offset((page - 1) * actual_page_size)\
-                          .limit(actual_page_size)\
-                          .all()
+        if cursor is not None:
+            # 基金代码在策略表中唯一，可直接作为游标排序键
+            strategies, next_cursor = keyset_paginate(
+                query, [(Strategy.fund_code, False)], cursor, actual_page_size
+            )
+        else:
+            # 应用排序（简单处理，只支持默认排序）
+            query = query.order_by(Strategy.fund_code)
+            
+            # 应用分页
+            strategies = query.offset((page - 1) * actual_page_size)\
+                              .limit(actual_page_size)\
+                              .all()
+            next_cursor = None
         
         # 构建响应数据
         strategy_data = []
@@ -635,9 +657,15 @@ async def get_strategy_list(
             total=total,
             page=page,
             page_size=actual_page_size,
-            data=strategy_data
+            data=strategy_data,
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"获取策略列表失败: {str(e)}")
         raise HTTPException(
@@ -9,12 +9,12 @@ from sqlalchemy import func, desc, and_, extract
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 import pandas as pd
-import numpy as np
 import logging
 
 from ..database import get_db
 from ..schemas.common import APIResponse, ErrorResponse
-from ..models import Position, Client, Fund, Nav
+from ..models import Position, Client, Fund
+from ..services.performance_service import PerformanceService
 
 logger = logging.getLogger(__name__)
 
@@ -281,87 +281,44 @@ async def analyze_fund_performance(
     """
     try:
         # 获取分析的基金列表
+        fund_query = db.query(Fund.fund_code, Fund.fund_name)
         if fund_code:
-            funds = [fund_code]
-        else:
-            fund_list = db.query(Fund.fund_code).all()
-            funds = [f.fund_code for f in fund_list]
+            fund_query = fund_query.filter(Fund.fund_code == fund_code)
+        fund_names = {f.fund_code: f.fund_name for f in fund_query.all()}
+        
+        end_date = date.today()
+        start_date = end_date - timedelta(days=period_days)
+        
+        # 所有基金的指标一次向量化计算
+        performance_service = PerformanceService(db)
+        metrics = performance_service.calculate_performance_metrics(
+            list(fund_names.keys()), start_date, end_date, period_days
+        )
+        position_stats = performance_service.get_position_stats([fund_code] if fund_code else None)
         
         performance_data = []
         
-        for code in funds:
-            # 获取基金信息
-            fund = db.query(Fund).filter(Fund.fund_code == code).first()
-            if not fund:
-                continue
-            
-            # 获取净值数据
-            end_date = date.today()
-            start_date = end_date - timedelta(days=period_days)
-            
-            nav_records = db.query(Nav).filter(
-                and_(
-                    Nav.fund_code == code,
-                    Nav.nav_date >= start_date,
-                    Nav.nav_date <= end_date
-                )
-            ).order_by(Nav.nav_date).all()
-            
-            if len(nav_records) < 2:
-                continue
-            
-            # 计算收益率
-            nav_df = pd.DataFrame([{
-                'nav_date': record.nav_date,
-                'unit_nav': float(record.unit_nav)
-            } for record in nav_records])
-            
-            nav_df = nav_df.sort_values('nav_date')
-            nav_df['return'] = nav_df['unit_nav'].pct_change()
-            
-            # 计算性能指标
-            latest_nav = nav_df['unit_nav'].iloc[-1]
-            first_nav = nav_df['unit_nav'].iloc[0]
-            total_return = (latest_nav / first_nav - 1) * 100
-            
-            daily_returns = nav_df['return'].dropna()
-            volatility = daily_returns.std() * np.sqrt(252) * 100  # 年化波动率
-            
-            # 夏普比率（假设无风险利率为3%）
-            risk_free_rate = 0.03
-            annualized_return = total_return * (365 / period_days) / 100
-            sharpe_ratio = (annualized_return - risk_free_rate) / (volatility / 100) if volatility > 0 else 0
-            
-            # 最大回撤
-            nav_df['cumulative'] = (1 + nav_df['return'].fillna(0)).cumprod()
-            nav_df['peak'] = nav_df['cumulative'].cummax()
-            nav_df['drawdown'] = (nav_df['cumulative'] / nav_df['peak'] - 1) * 100
-            max_drawdown = nav_df['drawdown'].min()
-            
-            # 获取持仓统计
-            position_stats = db.query(
-                func.count(func.distinct(Position.group_id)).label('client_count'),
-                func.sum(Position.cost_with_fee).label('total_aum'),
-                func.sum(Position.shares).label('total_shares')
-            ).filter(Position.fund_code == code).first()
+        for code, row in metrics.iterrows():
+            latest_nav = float(row['latest_nav'])
+            stats = position_stats.get(code, {})
             
             current_aum = None
-            if position_stats.total_shares and latest_nav:
-                current_aum = float(position_stats.total_shares) * latest_nav
+            if stats.get('total_shares') and latest_nav:
+                current_aum = float(stats['total_shares']) * latest_nav
             
             performance_data.append({
                 "fund_code": code,
-                "fund_name": fund.fund_name,
+                "fund_name": fund_names[code],
                 "latest_nav": latest_nav,
-                "total_return_pct": round(total_return, 2),
-                "annualized_return_pct": round(annualized_return * 100, 2),
-                "volatility_pct": round(volatility, 2),
-                "sharpe_ratio": round(sharpe_ratio, 3),
-                "max_drawdown_pct": round(max_drawdown, 2),
-                "client_count": position_stats.client_count or 0,
-                "total_aum": float(position_stats.total_aum or 0),
+                "total_return_pct": round(float(row['total_return_pct']), 2),
+                "annualized_return_pct": round(float(row['annualized_return']) * 100, 2),
+                "volatility_pct": round(float(row['volatility_pct']), 2),
+                "sharpe_ratio": round(float(row['sharpe_ratio']), 3),
+                "max_drawdown_pct": round(float(row['max_drawdown_pct']), 2),
+                "client_count": stats.get('client_count') or 0,
+                "total_aum": float(stats.get('total_aum') or 0),
                 "current_market_value": round(current_aum, 2) if current_aum else None,
-                "nav_records_count": len(nav_records),
+                "nav_records_count": int(row['nav_records_count']),
                 "analysis_period_days": period_days
             })
         
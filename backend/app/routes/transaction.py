@@ -4,18 +4,30 @@ Transaction Analysis Module Routes
 """
 
 import os
+import numpy as np
 import pandas as pd
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text, and_, or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, text, and_, case, extract
 from datetime import date, datetime, timedelta
-import io
 import traceback
 from decimal import Decimal
 
 from app.database import get_db
-from app.models import Transaction, DateConverter, Fund, Strategy, Nav, Client
+from app.models import Transaction, DateConverter, Fund, Strategy, Nav, FundLatestNav, Client
+from app.services.nav_panel import build_nav_panel
+from app.services.monthly_profit import MonthlyProfitSweep, Redemption
+from app.services.excel_reader import ExcelChunkReader, spooled_upload
+from app.services.pagination import InvalidCursorError, count_cache, keyset_paginate
+from app.services.search_index import search_index
+from app.services.bulk_ops import upsert_rows
+from app.services.product_resolution import ProductResolutionService, product_fund_resolvers
+from app.services.transaction_fingerprint import TransactionFingerprintService, compute_fingerprints
+from app.services.transaction_direction import (
+    DIRECTIONS, DIVIDEND, OTHER, SHARE_DECREASE_DIRECTIONS, SHARE_IN, SHARE_INCREASE_DIRECTIONS, SHARE_OUT,
+    TransactionClassifier, TransactionDirectionService, transaction_classifiers
+)
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/transaction", tags=["交易分析"])
@@ -65,6 +77,7 @@ class TransactionListResponse(BaseModel):
     total: int = 0
     page: int = 1
     page_size: int = 20
+    next_cursor: Optional[str] = None
 
 
 class ProductHoldings(BaseModel):
@@ -145,49 +158,22 @@ COLUMN_MAPPING = {
 }
 
 
-def parse_excel_file(file_content: bytes, filename: str) -> pd.DataFrame:
+def map_transaction_columns(columns: List[str]) -> tuple[Dict[str, str], List[str]]:
     """
-    解析Excel文件为DataFrame
+    将Excel列名映射为Transaction字段名并检查必需列
+    返回: (列名映射, 错误信息列表)
     """
-    try:
-        # 尝试读取Excel文件
-        if filename.endswith('.xlsx'):
-            df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-        elif filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(file_content), engine='xlrd')
-        else:
-            raise ValueError(f"不支持的文件格式: {filename}")
-        
-        return df
-    except Exception as e:
-        raise ValueError(f"文件解析失败: {str(e)}")
-
-
-def validate_and_transform_data(df: pd.DataFrame) -> tuple[List[dict], List[str]]:
-    """
-    验证并转换DataFrame数据为Transaction模型数据
-    返回: (有效数据列表, 错误信息列表)
-    """
-    valid_data = []
     errors = []
     
-    if df.empty:
-        errors.append("Excel文件为空或无有效数据")
-        return valid_data, errors
-    
-    # 检查必需列是否存在
-    df_columns = df.columns.tolist()
-    required_chinese_columns = ['集团号', '交易类型名称', '交易确认日期']
-    
     # 映射列名
     mapped_columns = {}
-    for col in df_columns:
+    for col in columns:
         if col in COLUMN_MAPPING:
             mapped_columns[col] = COLUMN_MAPPING[col]
     
     if not mapped_columns:
         errors.append("Excel文件中未找到任何有效列")
-        return valid_data, errors
+        return mapped_columns, errors
     
     # 检查必需字段
     required_fields = ['group_id', 'transaction_type', 'confirmed_date']
@@ -200,6 +186,26 @@ def validate_and_transform_data(df: pd.DataFrame) -> tuple[List[dict], List[str]
         chinese_names = {'group_id': '集团号', 'transaction_type': '交易类型名称', 'confirmed_date': '交易确认日期'}
         missing_chinese = [chinese_names.get(field, field) for field in missing_required]
         errors.append(f"缺少必需列: {', '.join(missing_chinese)}")
+    
+    return mapped_columns, errors
+
+
+def validate_and_transform_data(df: pd.DataFrame, classifier: TransactionClassifier) -> tuple[List[dict], List[str]]:
+    """
+    验证并转换DataFrame数据为Transaction模型数据，同时按分类规则确定交易方向
+    返回: (有效数据列表, 错误信息列表)
+    """
+    valid_data = []
+    errors = []
+    
+    if df.empty:
+        errors.append("Excel文件为空或无有效数据")
+        return valid_data, errors
+    
+    # 检查必需列是否存在
+    mapped_columns, column_errors = map_transaction_columns(df.columns.tolist())
+    if column_errors:
+        errors.extend(column_errors)
         return valid_data, errors
     
     # 重命名列
@@ -225,6 +231,7 @@ def validate_and_transform_data(df: pd.DataFrame) -> tuple[List[dict], List[str]
                 row_errors.append(f"第{index+2}行: 交易类型名称不能为空")
             else:
                 row_data['transaction_type'] = str(transaction_type).strip()
+                row_data['direction'] = classifier.classify(row_data['transaction_type'])
             
             # 处理确认日期
             confirmed_date = row.get('confirmed_date')
@@ -273,6 +280,80 @@ def validate_and_transform_data(df: pd.DataFrame) -> tuple[List[dict], List[str]
     return valid_data, errors
 
 
+# 交易入库的数据列，上传数据缺失的列按空值写入（手续费默认为 0）
+TRANSACTION_ROW_DEFAULTS = {
+    'client_name': None,
+    'fund_name': None,
+    'confirmed_shares': None,
+    'confirmed_amount': None,
+    'transaction_fee': 0,
+    'product_code': None,
+    'product_name': None,
+    'direction': None,
+}
+
+# 覆盖已存在交易时更新的列（其余列参与指纹计算，内容相同）
+TRANSACTION_OVERRIDE_COLUMNS = ['client_name', 'fund_name', 'transaction_fee', 'product_name', 'direction']
+
+
+def save_transaction_batch(db: Session, data_list: List[dict], override_existing: bool) -> tuple[int, int, List[str]]:
+    """
+    按内容指纹判重并批量保存一批已校验的交易数据（不提交事务）
+    已存在的交易：override_existing 为 True 时更新，否则跳过；同一批内重复的交易只保存一次
+    返回: (成功数, 失败数, 错误信息列表)
+    """
+    if not data_list:
+        return 0, 0, []
+    
+    rows = {}
+    for data, fingerprint in zip(data_list, compute_fingerprints(data_list)):
+        row = dict(TRANSACTION_ROW_DEFAULTS, **data, fingerprint=fingerprint)
+        if override_existing:
+            rows[fingerprint] = row
+        else:
+            rows.setdefault(fingerprint, row)
+    
+    existing = TransactionFingerprintService(db).existing(list(rows))
+    if override_existing:
+        saved_rows = list(rows.values())
+        upsert_rows(db, Transaction, saved_rows, ['fingerprint'], TRANSACTION_OVERRIDE_COLUMNS)
+    else:
+        saved_rows = [row for fingerprint, row in rows.items() if fingerprint not in existing]
+        upsert_rows(db, Transaction, saved_rows, ['fingerprint'])
+    
+    # 新出现的产品补充到产品基金映射
+    ProductResolutionService(db).update(saved_rows)
+    
+    return len(saved_rows), 0, []
+
+
+def load_funds(db: Session, fund_codes: List[str]) -> Dict[str, Fund]:
+    """按基金代码批量加载基金，同时加载策略和最新净值"""
+    if not fund_codes:
+        return {}
+    return {
+        fund.fund_code: fund for fund in db.query(Fund).options(
+            selectinload(Fund.strategy), selectinload(Fund.latest_nav)
+        ).filter(Fund.fund_code.in_(set(fund_codes))).all()
+    }
+
+
+def product_key_column():
+    """交易按产品分组的键：产品代码，其次基金名称，均为空时归为未知产品"""
+    return func.coalesce(
+        func.nullif(Transaction.product_code, ''), func.nullif(Transaction.fund_name, ''), "未知产品"
+    )
+
+
+def signed_shares_column():
+    """按交易方向带符号的确认份额：份额增加为正，减少为负，其余为 0"""
+    return case(
+        (Transaction.direction.in_(SHARE_INCREASE_DIRECTIONS), Transaction.confirmed_shares),
+        (Transaction.direction.in_(SHARE_DECREASE_DIRECTIONS), -Transaction.confirmed_shares),
+        else_=0
+    )
+
+
 @router.post("/upload", response_model=TransactionUploadResponse)
 async def upload_transactions(
     files: List[UploadFile] = File(...),
@@ -281,7 +362,7 @@ async def upload_transactions(
 ):
     """
     上传交易数据Excel文件
-    支持批量上传多个文件
+    支持批量上传多个文件，文件分块读取、逐块校验入库并提交
     """
     response = TransactionUploadResponse()
     
@@ -289,8 +370,13 @@ async def upload_transactions(
         raise HTTPException(status_code=400, detail="请选择要上传的文件")
     
     try:
-        all_valid_data = []
         all_errors = []
+        save_errors = []
+        total_count = 0
+        success_count = 0
+        failed_count = 0
+        
+        classifier = transaction_classifiers.get(db)
         
         # 处理每个文件
         for file in files:
@@ -299,93 +385,42 @@ async def upload_transactions(
                 continue
             
             try:
-                # 读取文件内容
-                file_content = await file.read()
-                
-                # 解析Excel文件
-                df = parse_excel_file(file_content, file.filename)
-                
-                # 验证并转换数据
-                valid_data, file_errors = validate_and_transform_data(df)
-                
-                all_valid_data.extend(valid_data)
-                if file_errors:
-                    all_errors.extend([f"文件 {file.filename}: {error}" for error in file_errors])
+                async with spooled_upload(file) as file_path:
+                    with ExcelChunkReader(file_path) as reader:
+                        # 表头校验失败时整个文件跳过
+                        _, column_errors = map_transaction_columns(reader.columns)
+                        if column_errors:
+                            all_errors.extend([f"文件 {file.filename}: {error}" for error in column_errors])
+                            continue
+                        
+                        for df in reader:
+                            # 验证并转换数据
+                            valid_data, file_errors = validate_and_transform_data(df, classifier)
+                            if file_errors:
+                                all_errors.extend([f"文件 {file.filename}: {error}" for error in file_errors])
+                            
+                            # 保存到数据库，每块提交一次
+                            chunk_success, chunk_failed, chunk_errors = save_transaction_batch(
+                                db, valid_data, override_existing
+                            )
+                            db.commit()
+                            
+                            total_count += len(valid_data)
+                            success_count += chunk_success
+                            failed_count += chunk_failed
+                            save_errors.extend(chunk_errors)
                     
             except Exception as e:
+                db.rollback()
                 all_errors.append(f"文件 {file.filename}: 处理失败 - {str(e)}")
         
-        response.total_count = len(all_valid_data)
-        response.errors = all_errors
+        response.total_count = total_count
+        response.errors = all_errors + save_errors
         
-        if not all_valid_data:
+        if not total_count:
             response.message = "没有有效的交易数据可以导入"
             return response
         
-        # 保存到数据库
-        success_count = 0
-        failed_count = 0
-        
-        for data in all_valid_data:
-            try:
-                # 检查是否存在相同记录 - 修复重复检测逻辑，增加更多唯一标识字段
-                existing = None
-                if not override_existing:
-                    # 构建更完整的重复检测条件
-                    conditions = [
-                        Transaction.group_id == data['group_id'],
-                        Transaction.transaction_type == data['transaction_type'],
-                        Transaction.confirmed_date == data['confirmed_date']
-                    ]
-                    
-                    # 添加确认金额条件（处理None值）
-                    confirmed_amount = data.get('confirmed_amount')
-                    if confirmed_amount is not None:
-                        conditions.append(Transaction.confirmed_amount == confirmed_amount)
-                    else:
-                        conditions.append(Transaction.confirmed_amount.is_(None))
-                    
-                    # 添加确认份额条件（处理None值）
-                    confirmed_shares = data.get('confirmed_shares')
-                    if confirmed_shares is not None:
-                        conditions.append(Transaction.confirmed_shares == confirmed_shares)
-                    else:
-                        conditions.append(Transaction.confirmed_shares.is_(None))
-                    
-                    # 添加产品标识条件（优先使用product_code，其次fund_name）
-                    product_code = data.get('product_code')
-                    fund_name = data.get('fund_name')
-                    if product_code:
-                        conditions.append(Transaction.product_code == product_code)
-                    elif fund_name:
-                        conditions.append(Transaction.fund_name == fund_name)
-                    
-                    existing = db.query(Transaction).filter(and_(*conditions)).first()
-                
-                if existing and not override_existing:
-                    # 跳过已存在的记录
-                    continue
-                
-                if existing and override_existing:
-                    # 更新现有记录
-                    for key, value in data.items():
-                        setattr(existing, key, value)
-                    db.flush()
-                else:
-                    # 创建新记录
-                    transaction = Transaction(**data)
-                    db.add(transaction)
-                    db.flush()
-                
-                success_count += 1
-                
-            except Exception as e:
-                failed_count += 1
-                response.errors.append(f"保存交易记录失败: {str(e)}")
-        
-        # 提交事务
-        db.commit()
-        
         response.success_count = success_count
         response.failed_count = failed_count
         response.message = f"成功导入 {success_count} 条交易记录，失败 {failed_count} 条"
@@ -425,12 +460,7 @@ async def get_transaction_clients(
         
         # 添加搜索条件
         if search:
-            query = query.filter(
-                or_(
-                    Transaction.group_id.like(f"%{search}%"),
-                    Transaction.client_name.like(f"%{search}%")
-                )
-            )
+            query = query.filter(search_index.filter(Transaction.group_id, 'transaction_client', search))
         
         # 添加日期范围过滤
         if start_date:
@@ -483,10 +513,11 @@ async def get_client_transactions(
     fund_name: Optional[str] = Query(None, description="基金名称筛选"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页大小"),
+    cursor: Optional[str] = Query(None, description="游标分页：首页传空值，之后传上一页返回的next_cursor"),
     db: Session = Depends(get_db)
 ):
     """
-    获取指定客户的交易记录详情
+    获取指定客户的交易记录详情，传入 cursor 时使用游标分页
     """
     try:
         query = db.query(Transaction).filter(Transaction.group_id == group_id)
@@ -501,13 +532,23 @@ async def get_client_transactions(
         if fund_name:
             query = query.filter(Transaction.fund_name.like(f"%{fund_name}%"))
         
-        # 获取总数
-        total = query.count()
+        # 获取总数（按筛选条件和数据版本缓存）
+        total = count_cache.get_or_count(
+            ('client_transactions', group_id, start_date, end_date, transaction_type, fund_name),
+            (Transaction.__tablename__,),
+            query.count
+        )
         
         # 排序和分页
-        query = query.order_by(Transaction.confirmed_date.desc())
-        offset = (page - 1) * page_size
-        transactions = query.offset(offset).limit(page_size).all()
+        if cursor is not None:
+            transactions, next_cursor = keyset_paginate(
+                query, [(Transaction.confirmed_date, True), (Transaction.id, True)], cursor, page_size
+            )
+        else:
+            query = query.order_by(Transaction.confirmed_date.desc(), Transaction.id.desc())
+            offset = (page - 1) * page_size
+            transactions = query.offset(offset).limit(page_size).all()
+            next_cursor = None
         
         # 转换为响应格式
         transaction_details = []
@@ -531,9 +572,12 @@ async def get_client_transactions(
             data=transaction_details,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取客户交易记录失败: {str(e)}")
 
@@ -651,25 +695,58 @@ async def get_client_transaction_analysis(
                 product_transactions[key] = []
             product_transactions[key].append(t)
         
+        # 按 (产品, 交易方向) 汇总份额、金额和首次有份额变动的日期
+        product_totals: Dict[str, Dict[str, dict]] = {}
+        product_key = product_key_column().label('product_key')
+        for row in db.query(
+            product_key,
+            Transaction.direction,
+            func.sum(Transaction.confirmed_shares).label('shares'),
+            func.sum(Transaction.confirmed_amount).label('amount'),
+            func.min(case((Transaction.confirmed_shares != 0, Transaction.confirmed_date))).label('first_date')
+        ).filter(
+            Transaction.group_id == group_id,
+            Transaction.direction != OTHER
+        ).group_by(product_key, Transaction.direction).all():
+            product_totals.setdefault(row.product_key, {})[row.direction] = {
+                'shares': float(row.shares or 0),
+                'amount': float(row.amount or 0),
+                'first_date': row.first_date
+            }
+        
+        # 产品对应的基金按产品基金映射查找，基金策略、最新净值一次加载
+        resolver = product_fund_resolvers.get(db)
+        product_funds = {
+            product_code: resolver.resolve(product_code, (product_trans[0].fund_name, product_trans[0].product_name))
+            for product_code, product_trans in product_transactions.items()
+            if product_code != "未知产品"
+        }
+        funds = load_funds(db, [fund_code for fund_code in product_funds.values() if fund_code])
+        unresolved = [product_code for product_code, fund_code in product_funds.items() if not fund_code]
+        unresolved_navs = {
+            record.fund_code: record for record in
+            db.query(FundLatestNav).filter(FundLatestNav.fund_code.in_(unresolved)).all()
+        } if unresolved else {}
+        
         # 计算每个产品的持仓情况
         current_holdings = []
         cleared_products = []
         
         for product_code, product_trans in product_transactions.items():
-            # 计算买入和卖出份额以及金额
-            total_buy_shares = 0
-            total_sell_shares = 0
-            total_buy_amount = 0
-            total_sell_amount = 0
-            total_dividend_amount = 0
-            first_buy_date = None
-            last_transaction_date = None
-            
-            transaction_details = []
+            # 买入/卖出份额与金额、分红、首次买入日期取自按交易方向的汇总
+            totals = product_totals.get(product_code, {})
+            total_buy_shares = sum(totals[d]['shares'] for d in SHARE_INCREASE_DIRECTIONS if d in totals)
+            total_sell_shares = sum(totals[d]['shares'] for d in SHARE_DECREASE_DIRECTIONS if d in totals)
+            total_buy_amount = totals[SHARE_IN]['amount'] if SHARE_IN in totals else 0
+            total_sell_amount = totals[SHARE_OUT]['amount'] if SHARE_OUT in totals else 0
+            total_dividend_amount = totals[DIVIDEND]['amount'] if DIVIDEND in totals else 0
+            first_buy_dates = [totals[d]['first_date'] for d in SHARE_INCREASE_DIRECTIONS
+                               if d in totals and totals[d]['first_date']]
+            first_buy_date = min(first_buy_dates) if first_buy_dates else None
+            last_transaction_date = max(t.confirmed_date for t in product_trans)
             
-            for t in product_trans:
-                # 转换交易记录为详情格式
-                detail = TransactionDetail(
+            transaction_details = [
+                TransactionDetail(
                     id=t.id,
                     group_id=t.group_id,
                     client_name=t.client_name,
@@ -682,41 +759,8 @@ async def get_client_transaction_analysis(
                     product_code=t.product_code,
                     product_name=t.product_name
                 )
-                transaction_details.append(detail)
-                
-                # 计算份额和金额（根据交易类型判断买入还是卖出）
-                transaction_type = t.transaction_type.lower()
-                
-                if t.confirmed_shares:
-                    shares = float(t.confirmed_shares)
-                    
-                    # 份额增加的交易类型
-                    if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持', '强制调增', '强行调增']):
-                        total_buy_shares += shares
-                        if first_buy_date is None or t.confirmed_date < first_buy_date:
-                            first_buy_date = t.confirmed_date
-                    # 份额减少的交易类型  
-                    elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制调减', '强行调减', '强制赎回']):
-                        total_sell_shares += shares
-                
-                # 计算金额
-                if t.confirmed_amount:
-                    amount = float(t.confirmed_amount)
-                    
-                    # 资金流入（买入）
-                    if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持']):
-                        total_buy_amount += amount
-                    # 资金流出（赎回）  
-                    elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制赎回']):
-                        total_sell_amount += amount
-                    # 现金分红（收入）
-                    elif '分红' in transaction_type:
-                        total_dividend_amount += amount
-                    # 强制调增/调减和强行调增/调减不涉及资金流动，只调整份额
-                
-                # 更新最后交易日期
-                if last_transaction_date is None or t.confirmed_date > last_transaction_date:
-                    last_transaction_date = t.confirmed_date
+                for t in product_trans
+            ]
             
             # 计算当前持有份额
             current_shares = total_buy_shares - total_sell_shares
@@ -733,34 +777,15 @@ async def get_client_transaction_analysis(
             nav_date = None
             
             if product_code and product_code != "未知产品":
-                # 尝试多种方式查找基金策略信息
-                fund = None
-                nav_fund_code = product_code  # 用于查找净值的基金代码
-                
-                # 首先尝试直接使用产品代码查找
-                fund = db.query(Fund).filter(Fund.fund_code == product_code).first()
-                
-                # 如果没找到，尝试通过产品名称模糊匹配
-                if not fund:
-                    # 使用第一个交易记录的基金名称或产品名称进行匹配
-                    sample_transaction = transaction_details[0] if transaction_details else None
-                    if sample_transaction:
-                        search_name = sample_transaction.fund_name or sample_transaction.product_name
-                        if search_name:
-                            # 模糊匹配基金名称
-                            fund = db.query(Fund).filter(Fund.fund_name.contains(search_name.replace('龙舟-', '').strip())).first()
-                            if fund:
-                                nav_fund_code = fund.fund_code  # 使用匹配到的基金代码查找净值
+                fund = funds.get(product_funds.get(product_code))
                 
                 if fund and fund.strategy:
                     main_strategy = fund.strategy.main_strategy
                     sub_strategy = fund.strategy.sub_strategy
                     is_qd_product = fund.strategy.is_qd_product if hasattr(fund.strategy, 'is_qd_product') else False
                 
-                # 获取最新净值和净值日期（使用正确的基金代码）
-                latest_nav_record = db.query(Nav).filter(
-                    Nav.fund_code == nav_fund_code
-                ).order_by(Nav.nav_date.desc()).first()
+                # 获取最新净值和净值日期：匹配到基金时取该基金，否则按产品代码查找
+                latest_nav_record = fund.latest_nav if fund else unresolved_navs.get(product_code)
                 
                 if latest_nav_record:
                     latest_nav = float(latest_nav_record.unit_nav)
@@ -948,32 +973,23 @@ async def get_client_monthly_profit_trend(
     从首次交易至今的每月收益曲线
     """
     try:
-        # 获取客户的所有交易记录
-        transactions = db.query(Transaction).filter(
+        # 客户基本信息与交易时间范围
+        first_transaction = db.query(Transaction.client_name).filter(
             Transaction.group_id == group_id
-        ).order_by(Transaction.confirmed_date.asc()).all()
+        ).order_by(Transaction.confirmed_date.asc(), Transaction.id.asc()).first()
         
-        if not transactions:
+        if not first_transaction:
             raise HTTPException(status_code=404, detail="未找到该客户的交易记录")
         
-        # 获取客户基本信息
+        transaction_count, first_transaction_date = db.query(
+            func.count(Transaction.id), func.min(Transaction.confirmed_date)
+        ).filter(Transaction.group_id == group_id).one()
+        
         client_info = {
             "group_id": group_id,
-            "client_name": transactions[0].client_name,
-            "total_transactions": len(transactions)
+            "client_name": first_transaction.client_name,
+            "total_transactions": transaction_count
         }
-        
-        # 按产品分组交易记录
-        product_transactions = {}
-        for t in transactions:
-            key = t.product_code or t.fund_name or "未知产品"
-            if key not in product_transactions:
-                product_transactions[key] = []
-            product_transactions[key].append(t)
-        
-        # 获取时间范围（从第一笔交易到现在）
-        first_transaction_date = min(t.confirmed_date for t in transactions)
-        last_transaction_date = max(t.confirmed_date for t in transactions)
         current_date = datetime.now().date()
         
         # 生成月度时间序列
@@ -991,134 +1007,78 @@ async def get_client_monthly_profit_trend(
             else:
                 current_month = current_month.replace(month=current_month.month + 1)
         
-        # 计算每个月的收益数据
-        for month_key in monthly_data.keys():
-            year, month = map(int, month_key.split('-'))
-            month_start = date(year, month, 1)
-            
-            # 计算下个月第一天
-            if month == 12:
-                month_end = date(year + 1, 1, 1) - timedelta(days=1)
-            else:
-                month_end = date(year, month + 1, 1) - timedelta(days=1)
-            
-            month_start_value = 0
-            month_end_value = 0
-            net_cashflow = 0
-            dividend_amount = 0
-            
-            # 计算每个产品在这个月的绝对收益
-            monthly_return = 0
-            
-            for product_code, product_trans in product_transactions.items():
-                if product_code == "未知产品":
-                    continue
-                    
-                # 计算月初持有份额
-                start_shares = 0
-                for t in product_trans:
-                    if t.confirmed_date < month_start and t.confirmed_shares:
-                        shares = float(t.confirmed_shares)
-                        transaction_type = t.transaction_type.lower()
-                        
-                        if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持', '强制调增', '强行调增']):
-                            start_shares += shares
-                        elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制调减', '强行调减', '强制赎回']):
-                            start_shares -= shares
-                
-                start_shares = max(0, start_shares)
-                
-                # 获取月初净值
-                start_nav = None
-                if start_shares > 0:
-                    start_nav_record = db.query(Nav).filter(
-                        Nav.fund_code == product_code,
-                        Nav.nav_date <= month_start
-                    ).order_by(Nav.nav_date.desc()).first()
-                    if start_nav_record:
-                        start_nav = float(start_nav_record.unit_nav)
-                
-                # 月初市值
-                start_value = (start_shares * start_nav) if (start_nav and start_shares > 0) else 0
-                month_start_value += start_value
-                
-                # 处理月内交易
-                current_shares = start_shares
-                product_return = 0
-                
-                # 按时间排序处理月内交易
-                month_transactions = [t for t in product_trans if month_start <= t.confirmed_date <= month_end]
-                month_transactions.sort(key=lambda x: x.confirmed_date)
-                
-                for t in month_transactions:
-                    transaction_type = t.transaction_type.lower()
-                    
-                    if t.confirmed_shares:
-                        shares = float(t.confirmed_shares)
-                        
-                        # 获取交易日净值
-                        trade_nav_record = db.query(Nav).filter(
-                            Nav.fund_code == product_code,
-                            Nav.nav_date <= t.confirmed_date
-                        ).order_by(Nav.nav_date.desc()).first()
-                        
-                        trade_nav = float(trade_nav_record.unit_nav) if trade_nav_record else None
-                        
-                        if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持', '强制调增', '强行调增']):
-                            # 申购：新增持仓，从申购日开始计算收益
-                            current_shares += shares
-                            if t.confirmed_amount:
-                                net_cashflow += float(t.confirmed_amount)
-                                
-                        elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制调减', '强行调减', '强制赎回']):
-                            # 赎回：计算被赎回份额从月初到赎回日的收益
-                            if trade_nav and start_nav and shares > 0:
-                                redemption_return = shares * (trade_nav - start_nav)
-                                product_return += redemption_return
-                            
-                            current_shares -= shares
-                            if t.confirmed_amount:
-                                net_cashflow -= float(t.confirmed_amount)
-                    
-                    # 计算分红
-                    if '分红' in transaction_type and t.confirmed_amount:
-                        dividend_amount += float(t.confirmed_amount)
-                
-                # 计算剩余持仓的月度收益（月初持仓+月内新增持仓的月末收益）
-                current_shares = max(0, current_shares)
-                if current_shares > 0:
-                    end_nav_record = db.query(Nav).filter(
-                        Nav.fund_code == product_code,
-                        Nav.nav_date <= month_end
-                    ).order_by(Nav.nav_date.desc()).first()
-                    
-                    if end_nav_record:
-                        end_nav = float(end_nav_record.unit_nav)
-                        end_value = current_shares * end_nav
-                        month_end_value += end_value
-                        
-                        # 存量持仓收益：月初持仓的净值增长
-                        if start_nav and start_shares > 0:
-                            existing_shares_return = min(start_shares, current_shares) * (end_nav - start_nav)
-                            product_return += existing_shares_return
-                        
-                        # 新增持仓收益：需要分别计算每笔申购的收益
-                        new_shares = max(0, current_shares - start_shares)
-                        if new_shares > 0:
-                            # 简化处理：假设新增持仓在月中间申购，使用平均收益率
-                            avg_purchase_nav = (start_nav + end_nav) / 2 if start_nav else end_nav
-                            new_shares_return = new_shares * (end_nav - avg_purchase_nav)
-                            product_return += new_shares_return
-                
-                monthly_return += product_return
-            
+        month_keys = list(monthly_data.keys())
+        month_index = {month_key: i for i, month_key in enumerate(month_keys)}
+        month_starts = [date(int(key[:4]), int(key[5:]), 1) for key in month_keys]
+        month_ends = [next_start - timedelta(days=1) for next_start in month_starts[1:]]
+        last_start = month_starts[-1]
+        month_ends.append(
+            (date(last_start.year + 1, 1, 1) if last_start.month == 12
+             else date(last_start.year, last_start.month + 1, 1)) - timedelta(days=1)
+        )
+        
+        # 按 (产品, 年, 月, 交易方向) 汇总：净份额变动、伴随份额变动的资金流、分红
+        product_key = product_key_column().label('product_key')
+        year_column = extract('year', Transaction.confirmed_date).label('year')
+        month_column = extract('month', Transaction.confirmed_date).label('month')
+        monthly_rows = db.query(
+            product_key, year_column, month_column, Transaction.direction,
+            func.sum(signed_shares_column()).label('shares'),
+            func.sum(case((Transaction.confirmed_shares != 0, Transaction.confirmed_amount))).label('share_amount'),
+            func.sum(Transaction.confirmed_amount).label('amount')
+        ).filter(
+            Transaction.group_id == group_id,
+            Transaction.direction != OTHER,
+            product_key_column() != "未知产品"
+        ).group_by(product_key, year_column, month_column, Transaction.direction).all()
+        
+        product_codes = sorted({row.product_key for row in monthly_rows})
+        product_index = {code: i for i, code in enumerate(product_codes)}
+        share_deltas = np.zeros((len(month_keys), len(product_codes)))  # 当月净份额变动
+        monthly_cashflows = np.zeros(len(month_keys))  # 当月净现金流
+        monthly_dividends = np.zeros(len(month_keys))  # 当月分红
+        
+        for row in monthly_rows:
+            m = month_index.get(f"{int(row.year):04d}-{int(row.month):02d}")
+            if m is None:
+                continue
+            share_deltas[m, product_index[row.product_key]] += float(row.shares or 0)
+            if row.direction in SHARE_INCREASE_DIRECTIONS:
+                monthly_cashflows[m] += float(row.share_amount or 0)
+            elif row.direction in SHARE_DECREASE_DIRECTIONS:
+                monthly_cashflows[m] -= float(row.share_amount or 0)
+            elif row.direction == DIVIDEND:
+                monthly_dividends[m] += float(row.amount or 0)
+        
+        # 份额减少的交易逐笔计算被减少份额从月初到交易日的收益
+        redemptions = []
+        for row in db.query(
+            product_key, Transaction.confirmed_date, Transaction.confirmed_shares
+        ).filter(
+            Transaction.group_id == group_id,
+            Transaction.direction.in_(SHARE_DECREASE_DIRECTIONS),
+            Transaction.confirmed_shares > 0,
+            product_key_column() != "未知产品"
+        ).all():
+            m = month_index.get(row.confirmed_date.strftime("%Y-%m"))
+            if m is not None:
+                redemptions.append(Redemption(
+                    product_index[row.product_key], m, row.confirmed_date, float(row.confirmed_shares)
+                ))
+        
+        # 在涉及产品的净值面板上按月扫描
+        result = MonthlyProfitSweep(build_nav_panel(db, fund_codes=product_codes)).calculate(
+            product_codes, month_starts, month_ends, share_deltas, redemptions
+        )
+        
+        for m, month_key in enumerate(month_keys):
             monthly_data[month_key] = MonthlyProfitData(
                 year_month=month_key,
-                month_start_value=round(month_start_value, 2),
-                month_end_value=round(month_end_value, 2),
-                net_cashflow=round(net_cashflow, 2),
-                monthly_return=round(monthly_return, 2),
-                dividend_amount=round(dividend_amount, 2)
+                month_start_value=round(float(result.start_values[m]), 2),
+                month_end_value=round(float(result.end_values[m]), 2),
+                net_cashflow=round(float(monthly_cashflows[m]), 2),
+                monthly_return=round(float(result.returns[m]), 2),
+                dividend_amount=round(float(monthly_dividends[m]), 2)
             )
         
         # 转换为列表并按时间排序
@@ -1159,28 +1119,58 @@ async def get_client_period_profit_analysis(
         if start_date >= end_date:
             raise HTTPException(status_code=400, detail="开始日期必须小于结束日期")
         
-        # 获取客户的所有交易记录
-        transactions = db.query(Transaction).filter(
+        # 获取客户基本信息
+        first_transaction = db.query(Transaction.client_name).filter(
             Transaction.group_id == group_id
-        ).order_by(Transaction.confirmed_date.asc()).all()
+        ).order_by(Transaction.confirmed_date.asc(), Transaction.id.asc()).first()
         
-        if not transactions:
+        if not first_transaction:
             raise HTTPException(status_code=404, detail="未找到该客户的交易记录")
         
-        # 获取客户基本信息
         client_info = {
             "group_id": group_id,
-            "client_name": transactions[0].client_name,
+            "client_name": first_transaction.client_name,
             "analysis_period": f"{start_date} 至 {end_date}"
         }
         
-        # 按产品分组交易记录
-        product_transactions = {}
-        for t in transactions:
-            key = t.product_code or t.fund_name or "未知产品"
-            if key not in product_transactions:
-                product_transactions[key] = []
-            product_transactions[key].append(t)
+        # 产品名称、基金名称取该产品最早一笔交易
+        product_key = product_key_column().label('product_key')
+        product_names = {}
+        for row in db.query(product_key, Transaction.product_name, Transaction.fund_name).filter(
+            Transaction.group_id == group_id
+        ).order_by(Transaction.confirmed_date.asc(), Transaction.id.asc()):
+            product_names.setdefault(row.product_key, (row.product_name, row.fund_name))
+        
+        # 按产品汇总期初、期末持有份额和期间净现金流（期间内有份额变动的交易金额）
+        signed_shares = signed_shares_column()
+        in_period = and_(
+            Transaction.confirmed_date >= start_date,
+            Transaction.confirmed_date <= end_date,
+            Transaction.confirmed_shares != 0
+        )
+        product_shares = {
+            row.product_key: row for row in db.query(
+                product_key,
+                func.sum(case((Transaction.confirmed_date < start_date, signed_shares))).label('start_shares'),
+                func.sum(case((Transaction.confirmed_date <= end_date, signed_shares))).label('end_shares'),
+                func.sum(case(
+                    (and_(in_period, Transaction.direction.in_(SHARE_INCREASE_DIRECTIONS)), Transaction.confirmed_amount),
+                    (and_(in_period, Transaction.direction.in_(SHARE_DECREASE_DIRECTIONS)), -Transaction.confirmed_amount)
+                )).label('cashflow')
+            ).filter(
+                Transaction.group_id == group_id,
+                Transaction.direction.in_(SHARE_INCREASE_DIRECTIONS + SHARE_DECREASE_DIRECTIONS)
+            ).group_by(product_key).all()
+        }
+        
+        # 产品对应的基金按产品基金映射查找，基金策略一次加载
+        resolver = product_fund_resolvers.get(db)
+        product_funds = {
+            product_code: resolver.resolve(product_code, names)
+            for product_code, names in product_names.items()
+            if product_code != "未知产品" and product_code in product_shares
+        }
+        funds = load_funds(db, [fund_code for fund_code in product_funds.values() if fund_code])
         
         # 分析每个产品在指定时间段的收益
         product_details = []
@@ -1188,50 +1178,26 @@ async def get_client_period_profit_analysis(
         total_end_value = 0
         total_return = 0
         
-        for product_code, product_trans in product_transactions.items():
-            # 获取产品基本信息
-            product_name = product_trans[0].product_name
-            fund_name = product_trans[0].fund_name
+        for product_code, (product_name, fund_name) in product_names.items():
+            shares_row = product_shares.get(product_code)
+            if shares_row is None:
+                continue
+            
+            # 获取产品策略信息
             main_strategy = None
             sub_strategy = None
             
-            if product_code != "未知产品":
-                fund = db.query(Fund).filter(Fund.fund_code == product_code).first()
-                if fund and fund.strategy:
-                    main_strategy = fund.strategy.main_strategy
-                    sub_strategy = fund.strategy.sub_strategy
-            
-            # 计算期初持有份额（start_date之前的交易）
-            start_shares = 0
-            for t in product_trans:
-                if t.confirmed_date < start_date and t.confirmed_shares:
-                    shares = float(t.confirmed_shares)
-                    transaction_type = t.transaction_type.lower()
-                    
-                    if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持', '强制调增', '强行调增']):
-                        start_shares += shares
-                    elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制调减', '强行调减', '强制赎回']):
-                        start_shares -= shares
+            fund = funds.get(product_funds.get(product_code))
+            if fund and fund.strategy:
+                main_strategy = fund.strategy.main_strategy
+                sub_strategy = fund.strategy.sub_strategy
             
-            # 计算期末持有份额（end_date之前的所有交易）
-            end_shares = 0
-            period_cashflow = 0
+            # 期初持有份额（start_date之前的交易）、期末持有份额（end_date之前的所有交易）
+            start_shares = float(shares_row.start_shares or 0)
+            end_shares = float(shares_row.end_shares or 0)
             
-            for t in product_trans:
-                if t.confirmed_date <= end_date and t.confirmed_shares:
-                    shares = float(t.confirmed_shares)
-                    transaction_type = t.transaction_type.lower()
-                    
-                    if any(keyword in transaction_type for keyword in ['申购', '买入', '认购', '认购结果', '增持', '强制调增', '强行调增']):
-                        end_shares += shares
-                        # 期间内的申购记为现金流出
-                        if start_date <= t.confirmed_date <= end_date and t.confirmed_amount:
-                            period_cashflow += float(t.confirmed_amount)
-                    elif any(keyword in transaction_type for keyword in ['赎回', '卖出', '减持', '强制调减', '强行调减', '强制赎回']):
-                        end_shares -= shares
-                        # 期间内的赎回记为现金流入
-                        if start_date <= t.confirmed_date <= end_date and t.confirmed_amount:
-                            period_cashflow -= float(t.confirmed_amount)
+            # 期间内的申购记为现金流出，赎回记为现金流入
+            period_cashflow = float(shares_row.cashflow or 0)
             
             # 获取期初和期末净值
             start_nav = None
@@ -1314,4 +1280,108 @@ async def get_client_period_profit_analysis(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取时间段收益分析失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取时间段收益分析失败: {str(e)}")
+
+class TransactionTypeRuleItem(BaseModel):
+    """交易类型分类规则"""
+    keyword: str
+    direction: str
+    priority: int = 100
+
+
+@router.get("/direction-rules", response_model=List[TransactionTypeRuleItem])
+async def get_direction_rules(db: Session = Depends(get_db)):
+    """
+    获取交易类型分类规则，按匹配顺序排列
+    """
+    try:
+        classifier = TransactionClassifier.load(db)
+        return [
+            TransactionTypeRuleItem(keyword=keyword, direction=direction, priority=priority)
+            for keyword, direction, priority in classifier.rules
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取交易分类规则失败: {str(e)}")
+
+
+@router.put("/direction-rules")
+async def replace_direction_rules(
+    rules: List[TransactionTypeRuleItem],
+    db: Session = Depends(get_db)
+):
+    """
+    替换交易类型分类规则，并按新规则重新分类已有交易
+    规则按优先级升序匹配，交易类型名称包含关键词即命中，均未命中时归入 other
+    """
+    try:
+        keywords = [rule.keyword.strip() for rule in rules]
+        if not all(keywords):
+            raise HTTPException(status_code=400, detail="规则关键词不能为空")
+        if len(set(keywords)) != len(keywords):
+            raise HTTPException(status_code=400, detail="规则关键词不能重复")
+        invalid = sorted({rule.direction for rule in rules if rule.direction not in DIRECTIONS})
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"无效的交易方向: {', '.join(invalid)}，可选值: {', '.join(DIRECTIONS)}"
+            )
+        
+        service = TransactionDirectionService(db)
+        service.replace_rules(
+            (keyword, rule.direction, rule.priority) for keyword, rule in zip(keywords, rules)
+        )
+        updated = service.reclassify()
+        db.commit()
+        
+        return {
+            "success": True,
+            "message": f"已更新 {len(rules)} 条分类规则，重新分类交易 {updated} 条",
+            "rule_count": len(rules),
+            "updated_count": updated
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"更新交易分类规则失败: {str(e)}")
+
+
+@router.post("/direction-rules/reclassify")
+async def reclassify_transactions(db: Session = Depends(get_db)):
+    """
+    按当前分类规则重新分类全部交易，用于直接修改规则表后刷新已有交易
+    """
+    try:
+        updated = TransactionDirectionService(db).reclassify()
+        db.commit()
+        
+        return {
+            "success": True,
+            "message": f"重新分类交易 {updated} 条",
+            "updated_count": updated
+        }
+        
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"重新分类交易失败: {str(e)}")
+
+
+@router.post("/product-mapping/rebuild")
+async def rebuild_product_mapping(db: Session = Depends(get_db)):
+    """
+    按当前基金表重新匹配全部产品的基金，用于导入或修改基金后刷新产品基金映射
+    """
+    try:
+        written = ProductResolutionService(db).rebuild()
+        db.commit()
+        
+        return {
+            "success": True,
+            "message": f"重新匹配产品基金映射 {written} 条",
+            "updated_count": written
+        }
+        
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"重新匹配产品基金映射失败: {str(e)}")
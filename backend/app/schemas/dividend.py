@@ -52,6 +52,7 @@ class DividendListResponse(BaseModel):
     page: int = Field(..., description="当前页码")
     page_size: int = Field(..., description="每页记录数")
     data: List[DividendResponse] = Field(..., description="分红数据列表")
+    next_cursor: Optional[str] = Field(None, description="游标分页的下一页游标，没有下一页时为空")
 
 
 class DividendUploadResponse(BaseModel):
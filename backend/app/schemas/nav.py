@@ -65,6 +65,7 @@ class NavListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
 
 
 class NavUploadResponse(BaseModel):
@@ -35,6 +35,7 @@ class PositionListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
 
 
 class PositionAnalysis(BaseModel):
@@ -160,6 +161,19 @@ class PositionConcentrationAnalysis(BaseModel):
     small_holder_count: int = Field(..., description="小额持有人数量(<10万)")
 
 
+class FundConcentrationSummary(PositionConcentrationAnalysis):
+    """全量基金持仓集中度报告中的单只基金"""
+    total_shares: float = Field(..., description="总持仓份额")
+    total_market_value: Optional[float] = Field(None, description="按最新净值计算的总市值")
+    top_holders: List[dict] = Field(default_factory=list, description="前N大持有人列表")
+
+
+class FundConcentrationListResponse(BaseModel):
+    """全量基金持仓集中度报告响应模型"""
+    total: int = Field(..., description="基金数量")
+    data: List[FundConcentrationSummary] = Field(..., description="各基金集中度，按赫芬达尔指数降序")
+
+
 class PositionRiskMetrics(BaseModel):
     """持仓风险指标模型"""
     fund_code: str
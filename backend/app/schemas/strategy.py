@@ -77,6 +77,7 @@ class StrategyListResponse(BaseModel):
     page: int = Field(..., description="当前页码")
     page_size: int = Field(..., description="每页记录数")
     data: List[StrategyResponse] = Field(..., description="策略数据列表")
+    next_cursor: Optional[str] = Field(None, description="游标分页的下一页游标，没有下一页时为空")
     
     class Config:
         json_schema_extra = {
@@ -0,0 +1,91 @@
+"""
+批量写入工具
+Bulk Write Helpers
+
+按数据库方言生成批量 upsert 语句：
+- SQLite: INSERT ... ON CONFLICT DO UPDATE / DO NOTHING
+- MySQL:  INSERT ... ON DUPLICATE KEY UPDATE
+其他方言退化为逐行查询后插入或更新。
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import Table, and_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 单条语句默认写入行数，SQLite 绑定参数上限为 32766
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _table_of(model) -> Table:
+    return model.__table__ if hasattr(model, '__table__') else model
+
+
+def upsert_rows(db: Session,
+                model,
+                rows: List[Dict[str, Any]],
+                key_columns: Sequence[str],
+                update_columns: Optional[Sequence[str]] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    批量插入或更新记录（不提交事务）
+
+    Args:
+        db: 数据库会话
+        model: ORM 模型或 Table
+        rows: 待写入的字典列表，键为列名
+        key_columns: 冲突判断使用的唯一键列
+        update_columns: 冲突时更新的列，为空时冲突行保持不变
+
+    Returns:
+        int: 提交给数据库的行数
+    """
+    if not rows:
+        return 0
+
+    table = _table_of(model)
+    dialect = db.get_bind().dialect.name
+    update_columns = list(update_columns or [])
+
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+
+        if dialect == 'sqlite':
+            stmt = sqlite_insert(table).values(chunk)
+            if update_columns:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(key_columns),
+                    set_={col: stmt.excluded[col] for col in update_columns}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+            db.execute(stmt)
+
+        elif dialect == 'mysql':
+            stmt = mysql_insert(table).values(chunk)
+            if update_columns:
+                stmt = stmt.on_duplicate_key_update(
+                    **{col: stmt.inserted[col] for col in update_columns}
+                )
+            else:
+                # 冲突时将主键列赋值为自身，等价于忽略
+                first_key = list(key_columns)[0]
+                stmt = stmt.on_duplicate_key_update(**{first_key: table.c[first_key]})
+            db.execute(stmt)
+
+        else:
+            logger.warning(f"数据库方言 {dialect} 不支持批量upsert，退化为逐行写入")
+            for row in chunk:
+                key_filter = and_(*[table.c[col] == row[col] for col in key_columns])
+                exists = db.execute(select(table.c[key_columns[0]]).where(key_filter)).first()
+                if exists is None:
+                    db.execute(table.insert().values(row))
+                elif update_columns:
+                    db.execute(table.update().where(key_filter).values({col: row[col] for col in update_columns}))
+
+    return len(rows)
@@ -0,0 +1,105 @@
+"""
+当前持仓投影
+Current Holdings Projection
+
+持仓表按 (客户, 基金, 存量时间) 保存每期存量快照，历史期数持续增长。
+当前持仓表保存每个客户最新一期存量快照中的全部持仓（每个 (客户, 基金) 一行），
+由持仓写入路径按客户重算；已在最新快照之前赎回清仓的基金不再出现。
+指定截止日期时按同一口径从持仓表即时取各客户该日及之前最近一期快照，供时点类汇总使用。
+"""
+
+import logging
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import FromClause
+
+from ..models import CurrentHolding, Position
+
+logger = logging.getLogger(__name__)
+
+# 当前持仓表按客户分批重算的批大小
+HOLDING_BATCH_SIZE = 500
+
+# 当前持仓表的数据列，与持仓表同名
+HOLDING_COLUMNS = (
+    'group_id', 'fund_code', 'stock_date', 'first_buy_date', 'cost_with_fee', 'cost_without_fee', 'shares'
+)
+
+
+def _latest_positions(as_of_date: Optional[date] = None, group_ids: Optional[Iterable[str]] = None):
+    """每个客户截止 as_of_date 最近一期存量快照中的全部持仓行"""
+    latest = select(
+        Position.group_id, func.max(Position.stock_date).label('stock_date')
+    ).group_by(Position.group_id)
+    if as_of_date is not None:
+        latest = latest.where(Position.stock_date <= as_of_date)
+    if group_ids is not None:
+        latest = latest.where(Position.group_id.in_(list(group_ids)))
+    latest = latest.subquery()
+
+    return select(*[getattr(Position, column) for column in HOLDING_COLUMNS]).join(
+        latest,
+        and_(
+            Position.group_id == latest.c.group_id,
+            Position.stock_date == latest.c.stock_date
+        )
+    )
+
+
+def holdings_source(as_of_date: Optional[date] = None) -> FromClause:
+    """
+    时点持仓来源，列与持仓表同名（group_id, fund_code, stock_date, first_buy_date, cost_with_fee,
+    cost_without_fee, shares），每个 (客户, 基金) 一行
+    as_of_date 为空时读取当前持仓表，否则从持仓表取各客户该日及之前最近一期存量快照
+    """
+    if as_of_date is None:
+        return CurrentHolding.__table__
+    return _latest_positions(as_of_date).subquery('holdings')
+
+
+class CurrentHoldingService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh(self, group_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        按持仓表重算客户的当前持仓（集合操作，不提交事务）
+        group_ids 为 None 时全量重建
+        """
+        self.db.flush()
+
+        if group_ids is None:
+            batches = [None]
+        else:
+            ids = sorted(set(group_ids))
+            batches = [ids[i:i + HOLDING_BATCH_SIZE] for i in range(0, len(ids), HOLDING_BATCH_SIZE)]
+
+        for batch in batches:
+            delete_stmt = delete(CurrentHolding)
+            if batch is not None:
+                delete_stmt = delete_stmt.where(CurrentHolding.group_id.in_(batch))
+            self.db.execute(delete_stmt)
+            self.db.execute(
+                insert(CurrentHolding).from_select(list(HOLDING_COLUMNS), _latest_positions(group_ids=batch))
+            )
+
+    def sync(self) -> int:
+        """
+        校验当前持仓表与各客户最新一期存量快照的持仓键是否一致，不一致的客户重算（不提交事务）
+        返回: 重算的客户数量
+        """
+        latest_rows = _latest_positions().subquery()
+        latest = set(self.db.execute(
+            select(latest_rows.c.group_id, latest_rows.c.fund_code, latest_rows.c.stock_date)
+        ).all())
+        current = set(self.db.execute(
+            select(CurrentHolding.group_id, CurrentHolding.fund_code, CurrentHolding.stock_date)
+        ).all())
+
+        stale = {key[0] for key in latest ^ current}
+        if stale:
+            self.refresh(stale)
+        return len(stale)
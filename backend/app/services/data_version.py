@@ -0,0 +1,66 @@
+"""
+数据版本登记
+Table Data Version Registry
+
+监听数据库引擎上的写语句，在事务提交时递增被写入表的版本号。
+派生缓存（如列表总数缓存）以相关表的版本号作为缓存键的一部分，写入后自动失效。
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# 连接 info 中记录本事务内写入过的表
+PENDING_TABLES_KEY = 'data_version_pending_tables'
+
+
+class DataVersionRegistry:
+    """按表名维护数据版本号"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._installed = set()
+
+    def get(self, *tables: str) -> Tuple[int, ...]:
+        """获取若干表的当前版本号"""
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, tables: Iterable[str]) -> None:
+        """递增表版本号"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def install(self, engine: Engine) -> None:
+        """在引擎上注册监听：记录写语句涉及的表，提交时递增版本，回滚时丢弃"""
+        if id(engine) in self._installed:
+            return
+        self._installed.add(id(engine))
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _record_write(conn, cursor, statement, parameters, context, executemany):
+            if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+                return
+            table = getattr(getattr(context.compiled, 'statement', None), 'table', None)
+            if table is not None:
+                conn.info.setdefault(PENDING_TABLES_KEY, set()).add(table.name)
+
+        @event.listens_for(engine, 'commit')
+        def _commit(conn):
+            pending = conn.info.pop(PENDING_TABLES_KEY, None)
+            if pending:
+                self.bump(pending)
+
+        @event.listens_for(engine, 'rollback')
+        def _rollback(conn):
+            conn.info.pop(PENDING_TABLES_KEY, None)
+
+
+# 全局数据版本登记实例
+data_versions = DataVersionRegistry()
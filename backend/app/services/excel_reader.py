@@ -0,0 +1,155 @@
+"""
+流式Excel读取
+Streaming Excel Reader
+
+上传文件先落盘到临时文件，再用 openpyxl 只读模式逐行读取，
+按固定行数切分为 DataFrame 交给各上传处理函数，避免整个文件和完整 DataFrame 同时驻留内存。
+"""
+
+import os
+import shutil
+import tempfile
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import UploadFile
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+# 每批读取的数据行数，可通过环境变量调整
+DEFAULT_CHUNK_SIZE = int(os.getenv("EXCEL_CHUNK_SIZE", "5000"))
+
+# 上传文件落盘时的复制缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+@asynccontextmanager
+async def spooled_upload(file: UploadFile) -> AsyncIterator[str]:
+    """
+    将上传文件写入临时文件并返回路径，退出时删除临时文件
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        await file.seek(0)
+        with tmp:
+            shutil.copyfileobj(file.file, tmp, COPY_BUFFER_SIZE)
+        yield tmp.name
+    finally:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            logger.warning(f"临时文件删除失败: {tmp.name}")
+
+
+def _normalize_columns(header: tuple) -> List[str]:
+    """与 pandas.read_excel 保持一致：空表头命名为 Unnamed: i，重复表头追加 .n 后缀"""
+    columns = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or (isinstance(value, str) and not value.strip()) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+class ExcelChunkReader:
+    """
+    分块读取Excel首个工作表
+
+    - .xlsx 使用 openpyxl 只读模式流式读取
+    - .xls 不支持只读模式，退化为 xlrd 整表读取后分块
+    每个分块的 DataFrame 索引为数据行在表中的偏移量，index + 2 即 Excel 行号；
+    单元格保留 Excel 中的原始类型，不做 pandas 的文本转数值推断
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self._workbook = None
+        self._rows = None
+        self._frame: Optional[pd.DataFrame] = None
+        self._columns: Optional[List[str]] = None
+
+    def __enter__(self) -> 'ExcelChunkReader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self):
+        if self._columns is not None:
+            return
+        if self.file_path.lower().endswith('.xls'):
+            self._frame = pd.read_excel(self.file_path, engine='xlrd')
+            self._columns = list(self._frame.columns)
+            return
+
+        self._workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        sheet = self._workbook.worksheets[0]
+        self._rows = sheet.iter_rows(values_only=True)
+        header = next(self._rows, None)
+        self._columns = _normalize_columns(header or ())
+
+    @property
+    def columns(self) -> List[str]:
+        """表头列名"""
+        self._open()
+        return list(self._columns)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        self._open()
+
+        if self._frame is not None:
+            for start in range(0, max(len(self._frame), 1), self.chunk_size):
+                yield self._frame.iloc[start:start + self.chunk_size]
+            return
+
+        width = len(self._columns)
+        buffer = []
+        buffer_offsets = []
+        blank_offsets = []
+        yielded = False
+        for offset, row in enumerate(self._rows):
+            # 与 pandas 一致：表中间的空行保留，末尾的空行丢弃
+            if all(value is None or (isinstance(value, str) and not value.strip()) for value in row):
+                blank_offsets.append(offset)
+                continue
+            for blank_offset in blank_offsets:
+                buffer.append((None,) * width)
+                buffer_offsets.append(blank_offset)
+            blank_offsets = []
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buffer.append(row)
+            buffer_offsets.append(offset)
+            if len(buffer) >= self.chunk_size:
+                yield self._make_frame(buffer, buffer_offsets)
+                yielded = True
+                buffer, buffer_offsets = [], []
+
+        if buffer or not yielded:
+            yield self._make_frame(buffer, buffer_offsets)
+
+    def _make_frame(self, rows: List[tuple], offsets: List[int]) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=self._columns, index=offsets, dtype=object)
+        # 空单元格统一为 NaN，与 pandas.read_excel 一致
+        return frame.where(frame.notna(), np.nan).infer_objects()
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+
+def iter_excel_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """逐块读取Excel文件，便捷生成器"""
+    with ExcelChunkReader(file_path, chunk_size) as reader:
+        yield from reader
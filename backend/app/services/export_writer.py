@@ -0,0 +1,78 @@
+"""
+流式导出工具
+Streaming Export Writers
+
+按批把行数据编码为 CSV 字节块，或用 openpyxl 只写模式写入临时 xlsx 文件后分块读出，
+配合 StreamingResponse 使用，导出过程中不在内存中保留完整数据或完整文件。
+"""
+
+import csv
+import io
+import os
+import tempfile
+import logging
+from typing import Iterable, Iterator, Sequence
+
+from openpyxl import Workbook
+
+logger = logging.getLogger(__name__)
+
+# CSV 每累计多少行输出一次
+CSV_FLUSH_ROWS = 2000
+
+# 文件分块读取大小
+FILE_CHUNK_SIZE = 1024 * 1024
+
+CSV_MEDIA_TYPE = 'text/csv'
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """逐批生成 CSV 字节块，带 BOM 以便 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode('utf-8-sig')
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence], sheet_title: str = 'Sheet1') -> Iterator[bytes]:
+    """
+    以只写模式写入临时 xlsx 文件，完成后分块读出并删除临时文件
+    只写模式下工作表行直接落盘，内存占用与行数无关
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+    tmp.close()
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=sheet_title)
+        sheet.append(list(header))
+        for row in rows:
+            sheet.append(list(row))
+        workbook.save(tmp.name)
+
+        with open(tmp.name, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            logger.warning(f"临时文件删除失败: {tmp.name}")
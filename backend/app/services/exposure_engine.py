@@ -0,0 +1,273 @@
+"""
+底层穿透敞口引擎
+Look-through Exposure Engine
+
+将各项目最新的资产类别配置和行业配置整理为 项目 × 敞口 的比例矩阵，
+与 客户 × 项目 的持仓市值矩阵相乘，一次得到所有客户的底层资产、行业敞口，
+再按理财师和全公司汇总。口径与单客户底层持仓分析一致：
+- 只统计细分策略为主观多头、股债混合，且策略表配置了项目、项目存在资产配置的持仓
+- 市值 = 当前持仓份额 × 最新单位净值，只计入当前持仓表中各客户最新一期存量快照的持仓
+- 行业比例基于股票仓位时，乘以项目最新资产配置中的股票总仓位比例
+计算结果按相关表的数据版本缓存，任一表写入提交后在下次访问时重算。
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..models import (
+    Client, CurrentHolding, FundLatestNav, ProjectHoldingAsset, ProjectHoldingIndustry, Strategy
+)
+from .data_version import data_versions
+
+logger = logging.getLogger(__name__)
+
+# 计入底层穿透的细分策略
+TARGET_SUB_STRATEGIES = ("主观多头", "股债混合")
+
+# 资产类别字段与展示名称
+ASSET_LABELS = {
+    "a_share": "A股",
+    "h_share": "H股",
+    "us_share": "美股",
+    "other_market": "其他市场",
+    "global_bond": "全球债券",
+    "convertible_bond": "可转债",
+    "other": "其他",
+}
+
+# 计入股票总仓位的资产类别
+STOCK_ASSET_TYPES = ("a_share", "h_share", "us_share", "other_market")
+
+# 理财师为空时的归类名称
+UNASSIGNED_PLANNER = "未分配"
+
+# 影响计算结果的表，任一表数据版本变化即重算
+EXPOSURE_TABLES = (
+    'current_holding', 'client', 'strategy', 'fund_latest_nav', 'project_holding_asset', 'project_holding_industry'
+)
+
+
+class ExposureResult:
+    """
+    穿透敞口计算结果（只读）
+
+    - group_ids / planners: 行对应的客户及其理财师
+    - industries: 行业敞口列名，资产敞口列与 ASSET_LABELS 顺序一致
+    - client_values: 各客户计入穿透的持仓市值
+    - client_exposures: 客户 × 敞口 的穿透市值矩阵，前 len(ASSET_LABELS) 列为资产，其余为行业
+    """
+
+    def __init__(self,
+                 group_ids: List[str],
+                 planners: List[str],
+                 industries: List[str],
+                 client_values: np.ndarray,
+                 client_exposures: np.ndarray):
+        self.group_ids = group_ids
+        self.planners = planners
+        self.industries = industries
+        self.client_values = client_values
+        self.client_exposures = client_exposures
+        self.client_index: Dict[str, int] = {group_id: i for i, group_id in enumerate(group_ids)}
+
+        # 按理财师汇总：理财师 × 客户 的归属矩阵左乘
+        self.planner_names = sorted(set(planners))
+        planner_index = {name: i for i, name in enumerate(self.planner_names)}
+        membership = np.zeros((len(self.planner_names), len(group_ids)))
+        membership[[planner_index[name] for name in planners], np.arange(len(group_ids))] = 1.0
+        self.planner_values = membership @ client_values
+        self.planner_exposures = membership @ client_exposures
+        self.planner_client_counts = membership.sum(axis=1).astype(int)
+        self.planner_index = planner_index
+
+    def client(self, group_id: str) -> Optional[dict]:
+        """单个客户的穿透分布，客户没有计入穿透的持仓时返回 None"""
+        i = self.client_index.get(group_id)
+        if i is None:
+            return None
+        return self._distribution(self.client_values[i], self.client_exposures[i])
+
+    def planner(self, planner_name: str) -> Optional[dict]:
+        """单个理财师名下客户的穿透分布"""
+        i = self.planner_index.get(planner_name)
+        if i is None:
+            return None
+        result = self._distribution(self.planner_values[i], self.planner_exposures[i])
+        result["client_count"] = int(self.planner_client_counts[i])
+        return result
+
+    def planners_summary(self) -> List[dict]:
+        """所有理财师的穿透分布，按穿透市值降序"""
+        results = []
+        for name in self.planner_names:
+            result = self.planner(name)
+            result["planner_name"] = name
+            results.append(result)
+        results.sort(key=lambda item: -item["asset_distribution"]["total_value"])
+        return results
+
+    def firm(self) -> dict:
+        """全公司穿透分布"""
+        result = self._distribution(self.client_values.sum(), self.client_exposures.sum(axis=0))
+        result["client_count"] = len(self.group_ids)
+        return result
+
+    def _distribution(self, total_value: float, exposures: np.ndarray) -> dict:
+        total_value = float(total_value)
+        n_assets = len(ASSET_LABELS)
+
+        def item(name: str, value: float) -> dict:
+            return {
+                "name": name,
+                "value": float(value),
+                "percentage": float(value / total_value * 100) if total_value > 0 else 0
+            }
+
+        asset_data = [
+            item(label, exposures[i]) for i, label in enumerate(ASSET_LABELS.values()) if exposures[i] > 0
+        ]
+        industry_values = exposures[n_assets:]
+        industry_data = [
+            item(self.industries[i], industry_values[i])
+            for i in np.argsort(-industry_values, kind='stable') if industry_values[i] > 0
+        ]
+        return {
+            "asset_distribution": {"data": asset_data, "total_value": total_value},
+            "industry_distribution": {"data": industry_data, "total_value": total_value},
+        }
+
+
+class ExposureEngine:
+    """进程级穿透敞口引擎，按数据版本缓存计算结果"""
+
+    def __init__(self):
+        self._cached: Optional[Tuple[tuple, ExposureResult]] = None
+        self._lock = threading.RLock()
+
+    def get(self, db: Session) -> ExposureResult:
+        with self._lock:
+            versions = data_versions.get(*EXPOSURE_TABLES)
+            if self._cached is not None and self._cached[0] == versions:
+                return self._cached[1]
+
+            result = self.compute(db)
+            if versions == data_versions.get(*EXPOSURE_TABLES):
+                self._cached = (versions, result)
+            logger.debug(f"穿透敞口计算完成: 客户 {len(result.group_ids)}，行业 {len(result.industries)}")
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cached = None
+
+    def compute(self, db: Session) -> ExposureResult:
+        projects, industries, project_matrix = self._project_matrix(db)
+        project_index = {name: i for i, name in enumerate(projects)}
+
+        # 客户 × 项目 市值矩阵
+        holdings = db.query(
+            CurrentHolding.group_id,
+            CurrentHolding.shares,
+            FundLatestNav.unit_nav,
+            Strategy.project_name
+        ).join(Strategy, CurrentHolding.fund_code == Strategy.fund_code)\
+         .join(FundLatestNav, CurrentHolding.fund_code == FundLatestNav.fund_code)\
+         .filter(Strategy.sub_strategy.in_(TARGET_SUB_STRATEGIES),
+                 Strategy.project_name.in_(projects),
+                 CurrentHolding.shares != 0).all() if projects else []
+
+        group_ids = sorted({row.group_id for row in holdings})
+        client_index = {group_id: i for i, group_id in enumerate(group_ids)}
+        client_projects = np.zeros((len(group_ids), len(projects)))
+        if holdings:
+            np.add.at(
+                client_projects,
+                ([client_index[row.group_id] for row in holdings],
+                 [project_index[row.project_name] for row in holdings]),
+                [float(row.shares) * float(row.unit_nav) for row in holdings]
+            )
+
+        planner_of = dict(
+            db.query(Client.group_id, Client.domestic_planner).filter(Client.group_id.in_(group_ids)).all()
+        ) if group_ids else {}
+        planners = [planner_of.get(group_id) or UNASSIGNED_PLANNER for group_id in group_ids]
+
+        return ExposureResult(
+            group_ids=group_ids,
+            planners=planners,
+            industries=industries,
+            client_values=client_projects.sum(axis=1),
+            client_exposures=client_projects @ project_matrix
+        )
+
+    @staticmethod
+    def _project_matrix(db: Session) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        项目 × 敞口 比例矩阵（小数），前 len(ASSET_LABELS) 列为资产类别，其余为行业
+        只包含存在资产配置的项目；比例为空或非正的项不计入
+        """
+        latest_asset_month = db.query(
+            ProjectHoldingAsset.project_name, func.max(ProjectHoldingAsset.month).label('month')
+        ).group_by(ProjectHoldingAsset.project_name).subquery()
+        assets = db.query(ProjectHoldingAsset).join(
+            latest_asset_month,
+            and_(ProjectHoldingAsset.project_name == latest_asset_month.c.project_name,
+                 ProjectHoldingAsset.month == latest_asset_month.c.month)
+        ).all()
+
+        latest_industry_month = db.query(
+            ProjectHoldingIndustry.project_name, func.max(ProjectHoldingIndustry.month).label('month')
+        ).group_by(ProjectHoldingIndustry.project_name).subquery()
+        industry_rows = {
+            row.project_name: row for row in db.query(ProjectHoldingIndustry).join(
+                latest_industry_month,
+                and_(ProjectHoldingIndustry.project_name == latest_industry_month.c.project_name,
+                     ProjectHoldingIndustry.month == latest_industry_month.c.month)
+            )
+        }
+
+        projects = sorted(asset.project_name for asset in assets)
+        project_index = {name: i for i, name in enumerate(projects)}
+        asset_ratios = np.zeros((len(projects), len(ASSET_LABELS)))
+        stock_total = np.zeros(len(projects))
+
+        # 行业比例以 (项目, 行业, 比例) 三元组收集，再散布到矩阵
+        industry_index: Dict[str, int] = {}
+        entries: List[Tuple[int, int, float]] = []
+
+        for asset in assets:
+            i = project_index[asset.project_name]
+            for j, asset_type in enumerate(ASSET_LABELS):
+                ratio = float(getattr(asset, f"{asset_type}_ratio") or 0)
+                if ratio > 0:
+                    asset_ratios[i, j] = ratio / 100
+            stock_total[i] = sum(float(getattr(asset, f"{asset_type}_ratio") or 0) for asset_type in STOCK_ASSET_TYPES)
+
+            industry = industry_rows.get(asset.project_name)
+            if industry is None:
+                continue
+            for k in range(1, 6):
+                name = getattr(industry, f"industry{k}")
+                ratio = float(getattr(industry, f"industry{k}_ratio") or 0)
+                if not name or ratio <= 0:
+                    continue
+                if industry.ratio_type == "based_on_stock":
+                    ratio = ratio * stock_total[i] / 100 if stock_total[i] > 0 else 0.0
+                entries.append((i, industry_index.setdefault(name, len(industry_index)), ratio / 100))
+
+        industry_ratios = np.zeros((len(projects), len(industry_index)))
+        if entries:
+            rows, cols, values = zip(*entries)
+            np.add.at(industry_ratios, (list(rows), list(cols)), list(values))
+
+        industries = sorted(industry_index, key=industry_index.get)
+        return projects, industries, np.hstack([asset_ratios, industry_ratios])
+
+
+# 全局穿透敞口引擎实例
+exposure_engine = ExposureEngine()
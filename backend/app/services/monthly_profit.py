@@ -0,0 +1,121 @@
+"""
+月度收益扫描
+Monthly Profit Sweep
+
+按月顺序扫描客户各产品的份额变动，在净值面板上一次取出所有月初、月末和交易日净值，
+计算月度绝对收益曲线，计算量为 O(交易数 + 月数 × 产品数)：
+- 月初份额：此前各月净份额变动的累计值，负数视为 0；月末份额 = 月初份额 + 当月净变动，负数视为 0
+- 月初、月末、交易日净值：该日及之前的最近单位净值
+- 份额减少的交易：被减少份额从月初到交易日的净值增长计入当月收益
+- 月末仍持有的份额：月初持仓按月初到月末的净值增长计收益，新增份额按月初、月末平均净值买入计收益
+"""
+
+import logging
+from datetime import date
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .nav_panel import NavPanel
+
+logger = logging.getLogger(__name__)
+
+
+class Redemption(NamedTuple):
+    """份额减少的交易"""
+    product_index: int
+    month_index: int
+    confirmed_date: date
+    shares: float
+
+
+class MonthlyProfitResult(NamedTuple):
+    """各月汇总，数组长度均为月数"""
+    start_values: np.ndarray
+    end_values: np.ndarray
+    returns: np.ndarray
+
+
+class MonthlyProfitSweep:
+    """基于净值面板的月度收益扫描"""
+
+    def __init__(self, panel: NavPanel):
+        self.panel = panel
+
+    def _navs_as_of(self, targets: np.ndarray, cols: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        取 (日期, 产品) 上 ≤ 日期的最近净值
+        targets 与 cols 形状可广播，返回 (净值, 是否存在净值)，不存在处净值为 NaN
+        """
+        panel = self.panel
+        rows = np.searchsorted(panel.dates, targets, side='right') - 1
+        rows, cols = np.broadcast_arrays(rows, cols)
+        found = (rows >= 0) & (cols >= 0)
+        navs = np.full(rows.shape, np.nan)
+        if len(panel.dates) and found.any():
+            found[found] = panel.valid[rows[found], cols[found]]
+            navs[found] = panel.values[rows[found], cols[found]]
+        return navs, found & ~np.isnan(navs)
+
+    def calculate(self,
+                  product_codes: Sequence[str],
+                  month_starts: Sequence[date],
+                  month_ends: Sequence[date],
+                  share_deltas: np.ndarray,
+                  redemptions: List[Redemption]) -> MonthlyProfitResult:
+        """
+        Args:
+            product_codes: 产品代码，对应 share_deltas 的列
+            month_starts / month_ends: 各月第一天和最后一天，升序
+            share_deltas: 形状 (月数, 产品数) 的当月净份额变动
+            redemptions: 份额减少且份额为正的交易
+        """
+        n_months, n_products = share_deltas.shape
+        cols = self.panel.columns_of(product_codes)[None, :]
+        starts = np.array(month_starts, dtype='datetime64[D]')[:, None]
+        ends = np.array(month_ends, dtype='datetime64[D]')[:, None]
+
+        # 份额向前结转：月初份额为此前各月累计净变动
+        carried = np.cumsum(share_deltas, axis=0) - share_deltas
+        start_shares = np.maximum(carried, 0.0)
+        current_shares = np.maximum(start_shares + share_deltas, 0.0)
+
+        start_navs, start_found = self._navs_as_of(starts, cols)
+        has_start = start_found & (start_shares > 0) & (start_navs != 0)
+        start_navs = np.where(has_start, start_navs, 0.0)
+        start_values = np.where(has_start, start_shares * start_navs, 0.0)
+
+        returns = np.zeros((n_months, n_products))
+
+        # 份额减少：被减少份额从月初到交易日的收益
+        if redemptions:
+            product_index = np.array([r.product_index for r in redemptions], dtype=np.int64)
+            month_index = np.array([r.month_index for r in redemptions], dtype=np.int64)
+            trade_navs, trade_found = self._navs_as_of(
+                np.array([r.confirmed_date for r in redemptions], dtype='datetime64[D]'), cols[0, product_index]
+            )
+            ok = trade_found & (trade_navs != 0) & has_start[month_index, product_index]
+            shares = np.array([r.shares for r in redemptions])
+            np.add.at(
+                returns, (month_index[ok], product_index[ok]),
+                shares[ok] * (trade_navs[ok] - start_navs[month_index[ok], product_index[ok]])
+            )
+
+        # 月末仍持有的份额
+        end_navs, end_found = self._navs_as_of(ends, cols)
+        holding = (current_shares > 0) & end_found
+        end_navs = np.where(holding, end_navs, 0.0)
+        end_values = np.where(holding, current_shares * end_navs, 0.0)
+
+        existing = holding & has_start
+        returns += np.where(existing, np.minimum(start_shares, current_shares) * (end_navs - start_navs), 0.0)
+
+        new_shares = np.maximum(current_shares - start_shares, 0.0)
+        purchase_navs = np.where(has_start, (start_navs + end_navs) / 2, end_navs)
+        returns += np.where(holding & (new_shares > 0), new_shares * (end_navs - purchase_navs), 0.0)
+
+        return MonthlyProfitResult(
+            start_values=start_values.sum(axis=1),
+            end_values=end_values.sum(axis=1),
+            returns=returns.sum(axis=1)
+        )
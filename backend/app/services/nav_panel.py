@@ -0,0 +1,244 @@
+"""
+日历对齐净值面板
+Calendar-Aligned NAV Panel
+
+以全部净值日期的并集为交易日历，将所有基金的净值整理为 日期 × 基金 的稠密矩阵，
+按"某日及之前最近净值"语义向前填充，并附带有效掩码。
+面板按净值数据版本懒构建并在请求间共享，组合估值、区间涨跌等可直接用矩阵运算完成。
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from .nav_store import nav_store
+
+logger = logging.getLogger(__name__)
+
+# 重采样频率与 pandas 周期的对应关系：周末为周日，月末为自然月
+RESAMPLE_PERIODS = {
+    'W': 'W-SUN',
+    'M': 'M',
+}
+
+
+class NavPanel:
+    """
+    净值面板（只读，构建后不再修改）
+
+    - dates: 交易日历，datetime64[D] 升序
+    - fund_codes: 列对应的基金代码
+    - values: 向前填充后的净值矩阵，形状 (日期数, 基金数)，无效位置为 NaN
+    - nav_days: 向前填充值对应的实际净值日期（距 1970-01-01 的天数，int32）
+    - valid: 该日期及之前是否已有净值
+    - observed: 该日期当天是否有净值
+    """
+
+    __slots__ = ('field', 'dates', 'fund_codes', 'fund_index', 'values', 'nav_days', 'valid', 'observed')
+
+    def __init__(self,
+                 field: str,
+                 dates: np.ndarray,
+                 fund_codes: List[str],
+                 values: np.ndarray,
+                 nav_days: np.ndarray,
+                 valid: np.ndarray,
+                 observed: np.ndarray):
+        self.field = field
+        self.dates = dates
+        self.fund_codes = fund_codes
+        self.fund_index: Dict[str, int] = {code: i for i, code in enumerate(fund_codes)}
+        self.values = values
+        self.nav_days = nav_days
+        self.valid = valid
+        self.observed = observed
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.dates, self.values, self.nav_days, self.valid, self.observed)
+        return sum(array.nbytes for array in arrays)
+
+    def columns_of(self, fund_codes: Sequence[str]) -> np.ndarray:
+        """基金代码转换为列下标，面板中不存在的基金为 -1"""
+        return np.array([self.fund_index.get(code, -1) for code in fund_codes], dtype=np.int64)
+
+    def select(self,
+               fund_codes: Optional[Sequence[str]] = None,
+               start_date: Optional[date] = None,
+               end_date: Optional[date] = None) -> 'NavPanel':
+        """
+        按基金和日期区间截取子面板
+        面板中不存在的基金对应整列无效；截取后仍保留区间开始前的向前填充值
+        """
+        lo = int(np.searchsorted(self.dates, np.datetime64(start_date, 'D'), side='left')) if start_date else 0
+        hi = int(np.searchsorted(self.dates, np.datetime64(end_date, 'D'), side='right')) if end_date else len(self.dates)
+        rows = slice(lo, hi)
+
+        if fund_codes is None:
+            return NavPanel(self.field, self.dates[rows], self.fund_codes, self.values[rows],
+                            self.nav_days[rows], self.valid[rows], self.observed[rows])
+
+        fund_codes = list(fund_codes)
+        cols, present = self._columns(fund_codes)
+        if self.shape[1] == 0:
+            cols, present = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+            fund_codes = []
+        values = self.values[rows][:, cols]
+        values[:, ~present] = np.nan
+        return NavPanel(self.field, self.dates[rows], fund_codes, values,
+                        self.nav_days[rows][:, cols],
+                        self.valid[rows][:, cols] & present,
+                        self.observed[rows][:, cols] & present)
+
+    def _columns(self, fund_codes: Optional[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (列下标, 是否存在)，不存在的基金下标置 0，由是否存在掩码屏蔽"""
+        if fund_codes is None:
+            return np.arange(self.shape[1]), np.ones(self.shape[1], dtype=bool)
+        cols = self.columns_of(fund_codes)
+        present = cols >= 0
+        return np.where(present, cols, 0), present
+
+    def _empty_result(self, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (np.full(size, np.nan),
+                np.full(size, np.datetime64('NaT'), dtype='datetime64[D]'),
+                np.zeros(size, dtype=bool))
+
+    def _pick(self, rows, cols: np.ndarray, ok: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        values = np.where(ok, self.values[rows, cols], np.nan)
+        nav_dates = np.where(ok, self.nav_days[rows, cols], 0).astype('datetime64[D]')
+        nav_dates[~ok] = np.datetime64('NaT')
+        return values, nav_dates, ok
+
+    def as_of(self, target: date, fund_codes: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        取 ≤ target 的最近净值
+
+        Returns:
+            (净值, 实际净值日期, 是否有效) 三个按基金对齐的数组
+        """
+        cols, present = self._columns(fund_codes)
+        row = int(np.searchsorted(self.dates, np.datetime64(target, 'D'), side='right')) - 1
+        if row < 0 or self.shape[1] == 0:
+            return self._empty_result(len(cols))
+        return self._pick(row, cols, present & self.valid[row, cols])
+
+    def first_on_or_after(self, target: date, fund_codes: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        取 ≥ target 的第一条实际净值
+
+        Returns:
+            (净值, 实际净值日期, 是否有效) 三个按基金对齐的数组
+        """
+        cols, present = self._columns(fund_codes)
+        lo = int(np.searchsorted(self.dates, np.datetime64(target, 'D'), side='left'))
+        if lo >= len(self.dates) or self.shape[1] == 0:
+            return self._empty_result(len(cols))
+        tail = self.observed[lo:][:, cols]
+        rows = lo + tail.argmax(axis=0)
+        return self._pick(rows, cols, present & tail.any(axis=0))
+
+    def resample(self, freq: str) -> 'NavPanel':
+        """
+        重采样到周末（'W'）或月末（'M'），取每个周期内最后一个交易日的向前填充值
+        """
+        if freq not in RESAMPLE_PERIODS:
+            raise ValueError(f"不支持的重采样频率: {freq}")
+        if len(self.dates) == 0:
+            return self
+
+        periods = pd.DatetimeIndex(self.dates).to_period(RESAMPLE_PERIODS[freq])
+        codes = np.asarray(periods.asi8)
+        last_rows = np.flatnonzero(np.append(codes[1:] != codes[:-1], True))
+
+        observed = np.logical_or.reduceat(self.observed, np.append(0, last_rows[:-1] + 1), axis=0)
+        return NavPanel(self.field, self.dates[last_rows], self.fund_codes, self.values[last_rows],
+                        self.nav_days[last_rows], self.valid[last_rows], observed)
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为 DataFrame，索引为日期，列为基金代码，无效位置为 NaN"""
+        return pd.DataFrame(self.values, index=pd.DatetimeIndex(self.dates), columns=self.fund_codes)
+
+
+def build_nav_panel(db: Session,
+                    field: str = 'unit_nav',
+                    dtype=np.float64,
+                    fund_codes: Optional[Sequence[str]] = None) -> NavPanel:
+    """
+    由净值缓存构建面板
+    fund_codes 为 None 时构建全量面板；否则只含指定基金，日历为这些基金净值日期的并集
+    """
+    if fund_codes is None:
+        loaded = nav_store.preload(db)
+    else:
+        nav_store.preload(db, fund_codes)
+        loaded = {code: nav_store.get(db, code) for code in dict.fromkeys(fund_codes)}
+    series_list = [loaded[code] for code in sorted(loaded) if len(loaded[code])]
+
+    fund_codes = [series.fund_code for series in series_list]
+    if series_list:
+        dates = np.unique(np.concatenate([series.dates for series in series_list]))
+    else:
+        dates = np.array([], dtype='datetime64[D]')
+
+    n_dates, n_funds = len(dates), len(fund_codes)
+    raw = np.full((n_dates, n_funds), np.nan, dtype=dtype)
+    observed = np.zeros((n_dates, n_funds), dtype=bool)
+    for col, series in enumerate(series_list):
+        rows = np.searchsorted(dates, series.dates)
+        raw[rows, col] = series.unit_navs if field == 'unit_nav' else series.accum_navs
+        observed[rows, col] = True
+
+    # 向前填充：每个位置取向上最近一次实际净值所在的行
+    last_rows = np.where(observed, np.arange(n_dates)[:, None], 0)
+    np.maximum.accumulate(last_rows, axis=0, out=last_rows)
+    valid = np.logical_or.accumulate(observed, axis=0) if n_dates else observed
+    values = raw[last_rows, np.arange(n_funds)[None, :]]
+    values[~valid] = np.nan
+    nav_days = dates.astype(np.int64).astype(np.int32)[last_rows]
+
+    return NavPanel(field, dates, fund_codes, values, nav_days, valid, observed)
+
+
+class NavPanelCache:
+    """
+    进程级净值面板缓存
+
+    按 (字段, 数据类型) 缓存面板，记录构建时的净值缓存版本，
+    版本变化（净值写入后失效）时在下次访问时重建。
+    """
+
+    def __init__(self):
+        self._panels: Dict[Tuple[str, str], Tuple[int, NavPanel]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, db: Session, field: str = 'unit_nav', dtype=np.float64) -> NavPanel:
+        """获取面板，dtype 可选 np.float32 以减半内存"""
+        key = (field, np.dtype(dtype).name)
+        with self._lock:
+            version = nav_store.version
+            cached = self._panels.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            panel = build_nav_panel(db, field, dtype)
+            if version == nav_store.version:
+                self._panels[key] = (version, panel)
+            logger.debug(f"净值面板构建完成: {field} {panel.shape}, {panel.nbytes / 1024 / 1024:.1f}MB")
+            return panel
+
+    def clear(self) -> None:
+        with self._lock:
+            self._panels.clear()
+
+
+# 全局净值面板缓存实例
+nav_panel_cache = NavPanelCache()
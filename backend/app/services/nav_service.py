@@ -3,21 +3,40 @@
 Nav Management Service
 """
 
+import numpy as np
 import pandas as pd
 import logging
-from typing import List, Dict, Tuple, Optional, Union
+from typing import Iterator, List, Dict, Tuple, Optional, Union
 from decimal import Decimal
 from datetime import date
-from io import BytesIO
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import and_, desc, asc
+from sqlalchemy import and_, desc, asc, func, select, insert, delete
 
-from ..models import Nav, Fund, DateConverter
+from ..models import Nav, Fund, FundLatestNav, NavDerived, DateConverter
 from ..schemas.nav import NavManualCreate, NavUploadResponse
+from .nav_store import nav_store
+from .bulk_ops import upsert_rows
+from .excel_reader import ExcelChunkReader
+from .performance_service import PerformanceService
+from .pagination import count_cache, keyset_paginate
+from .search_index import search_index
+from .portfolio_summary import PortfolioSummaryService
 
 logger = logging.getLogger(__name__)
 
+# 最新净值表按基金代码分批刷新的批大小
+LATEST_NAV_BATCH_SIZE = 500
+
+# 净值上传每批写入并提交的行数
+UPLOAD_CHUNK_SIZE = 1000
+
+# 净值导出服务端游标每批拉取的行数
+EXPORT_BATCH_SIZE = 2000
+
+# 游标分页支持的排序字段（非空列，配合 id 保证顺序唯一）
+NAV_KEYSET_SORT_COLUMNS = ('nav_date', 'fund_code', 'unit_nav', 'accum_nav')
+
 
 class NavService:
     """净值管理服务类"""
@@ -62,7 +81,10 @@ class NavService:
                 # 更新现有记录
                 existing_nav.unit_nav = nav_data.unit_nav
                 existing_nav.accum_nav = nav_data.accum_nav
+                self.refresh_latest_nav([nav_data.fund_code])
+                self.refresh_nav_derived({nav_data.fund_code: nav_date})
                 self.db.commit()
+                nav_store.invalidate([nav_data.fund_code])
                 logger.info(f"更新净值记录: {nav_data.fund_code} - {nav_date}")
                 return existing_nav, False
             else:
@@ -74,7 +96,10 @@ class NavService:
                     accum_nav=nav_data.accum_nav
                 )
                 self.db.add(new_nav)
+                self.refresh_latest_nav([nav_data.fund_code])
+                self.refresh_nav_derived({nav_data.fund_code: nav_date})
                 self.db.commit()
+                nav_store.invalidate([nav_data.fund_code])
                 logger.info(f"创建净值记录: {nav_data.fund_code} - {nav_date}")
                 return new_nav, True
                 
@@ -83,6 +108,167 @@ class NavService:
             logger.error(f"创建/更新净值记录失败: {str(e)}")
             raise
     
+    def refresh_latest_nav(self, fund_codes: Optional[List[str]] = None) -> None:
+        """
+        按净值表重算基金最新净值（集合操作，不提交事务）
+        fund_codes 为 None 时全量重建，供启动时回填使用；
+        最新单位净值有变动的基金，同步重算持有客户的持仓汇总
+        """
+        self.db.flush()
+        
+        latest_before = dict(self._latest_unit_navs(fund_codes))
+        
+        if fund_codes is None:
+            batches = [None]
+        else:
+            codes = sorted(set(fund_codes))
+            batches = [codes[i:i + LATEST_NAV_BATCH_SIZE] for i in range(0, len(codes), LATEST_NAV_BATCH_SIZE)]
+        
+        for batch in batches:
+            latest_dates = select(
+                Nav.fund_code,
+                func.max(Nav.nav_date).label('nav_date')
+            ).group_by(Nav.fund_code)
+            delete_stmt = delete(FundLatestNav)
+            if batch is not None:
+                latest_dates = latest_dates.where(Nav.fund_code.in_(batch))
+                delete_stmt = delete_stmt.where(FundLatestNav.fund_code.in_(batch))
+            latest_dates = latest_dates.subquery()
+            
+            latest_rows = select(
+                Nav.fund_code, Nav.nav_date, Nav.unit_nav, Nav.accum_nav
+            ).join(
+                latest_dates,
+                and_(
+                    Nav.fund_code == latest_dates.c.fund_code,
+                    Nav.nav_date == latest_dates.c.nav_date
+                )
+            )
+            
+            self.db.execute(delete_stmt)
+            self.db.execute(
+                insert(FundLatestNav).from_select(
+                    ['fund_code', 'nav_date', 'unit_nav', 'accum_nav'], latest_rows
+                )
+            )
+        
+        latest_after = dict(self._latest_unit_navs(fund_codes))
+        changed_funds = [
+            code for code in set(latest_before) | set(latest_after)
+            if latest_before.get(code) != latest_after.get(code)
+        ]
+        if changed_funds:
+            PortfolioSummaryService(self.db).refresh_funds(changed_funds)
+    
+    def _latest_unit_navs(self, fund_codes: Optional[List[str]] = None) -> Iterator[Tuple[str, Decimal]]:
+        """读取基金最新单位净值，fund_codes 为 None 时读取全部"""
+        if fund_codes is None:
+            yield from self.db.query(FundLatestNav.fund_code, FundLatestNav.unit_nav)
+            return
+        codes = sorted(set(fund_codes))
+        for i in range(0, len(codes), LATEST_NAV_BATCH_SIZE):
+            yield from self.db.query(FundLatestNav.fund_code, FundLatestNav.unit_nav)\
+                              .filter(FundLatestNav.fund_code.in_(codes[i:i + LATEST_NAV_BATCH_SIZE]))
+    
+    def refresh_nav_derived(self, changes: Optional[Dict[str, Optional[date]]] = None) -> None:
+        """
+        重算净值衍生序列（不提交事务）
+        changes 为 {基金代码: 最早变动日期}：从该日期起重算，之前的行作为起点保持不变；
+        日期为 None 时整只基金重算，changes 为 None 时全量重建
+        """
+        self.db.flush()
+        
+        if changes is None:
+            self.db.execute(delete(NavDerived))
+            changes = {code: None for (code,) in self.db.query(Nav.fund_code).distinct().all()}
+        
+        for fund_code, from_date in changes.items():
+            self._rebuild_fund_nav_derived(fund_code, from_date)
+    
+    def _rebuild_fund_nav_derived(self, fund_code: str, from_date: Optional[date]) -> None:
+        """从 from_date 起重算单只基金的衍生序列"""
+        seed = None
+        if from_date is not None:
+            seed = self.db.query(NavDerived).filter(
+                NavDerived.fund_code == fund_code,
+                NavDerived.nav_date < from_date
+            ).order_by(desc(NavDerived.nav_date)).first()
+        
+        delete_stmt = delete(NavDerived).where(NavDerived.fund_code == fund_code)
+        nav_query = select(Nav.nav_date, Nav.accum_nav).where(Nav.fund_code == fund_code)
+        if seed is not None:
+            delete_stmt = delete_stmt.where(NavDerived.nav_date >= from_date)
+            nav_query = nav_query.where(Nav.nav_date >= from_date)
+        
+        self.db.execute(delete_stmt)
+        nav_rows = self.db.execute(nav_query.order_by(Nav.nav_date)).all()
+        if not nav_rows:
+            return
+        
+        accum = np.array([float(row.accum_nav) for row in nav_rows], dtype=np.float64)
+        if seed is not None:
+            prev_accum = float(seed.accum_nav)
+            base_index = float(seed.cum_index)
+            base_peak = float(seed.running_peak)
+        else:
+            prev_accum, base_index, base_peak = accum[0], 1.0, 1.0
+        
+        daily_return = accum / np.concatenate(([prev_accum], accum[:-1])) - 1
+        cum_index = base_index * np.cumprod(1 + daily_return)
+        running_peak = np.maximum.accumulate(np.concatenate(([base_peak], cum_index)))[1:]
+        drawdown = cum_index / running_peak - 1
+        
+        self.db.execute(insert(NavDerived), [
+            {
+                'fund_code': fund_code,
+                'nav_date': row.nav_date,
+                'accum_nav': row.accum_nav,
+                'daily_return': round(float(daily_return[i]), 10),
+                'cum_index': round(float(cum_index[i]), 10),
+                'running_peak': round(float(running_peak[i]), 10),
+                'drawdown': round(float(drawdown[i]), 10)
+            }
+            for i, row in enumerate(nav_rows)
+        ])
+    
+    def sync_nav_derived(self) -> int:
+        """
+        校验衍生序列与净值表是否一致（记录数和最新日期），不一致的基金整只重算（不提交事务）
+        返回: 重算的基金数量
+        """
+        nav_stats = {
+            row.fund_code: (row.count, row.last_date)
+            for row in self.db.query(
+                Nav.fund_code, func.count(Nav.id).label('count'), func.max(Nav.nav_date).label('last_date')
+            ).group_by(Nav.fund_code).all()
+        }
+        derived_stats = {
+            row.fund_code: (row.count, row.last_date)
+            for row in self.db.query(
+                NavDerived.fund_code, func.count().label('count'), func.max(NavDerived.nav_date).label('last_date')
+            ).group_by(NavDerived.fund_code).all()
+        }
+        
+        stale = {
+            code: None for code in set(nav_stats) | set(derived_stats)
+            if nav_stats.get(code) != derived_stats.get(code)
+        }
+        if stale:
+            self.refresh_nav_derived(stale)
+        return len(stale)
+    
+    def get_nav_derived(self,
+                        fund_code: str,
+                        start_date: Optional[date] = None,
+                        end_date: Optional[date] = None) -> List[NavDerived]:
+        """获取基金净值衍生序列（按日期升序）"""
+        query = self.db.query(NavDerived).filter(NavDerived.fund_code == fund_code)
+        if start_date:
+            query = query.filter(NavDerived.nav_date >= start_date)
+        if end_date:
+            query = query.filter(NavDerived.nav_date <= end_date)
+        return query.order_by(NavDerived.nav_date).all()
+    
     def get_nav_list(self, 
                      fund_code: Optional[str] = None,
                      fund_name: Optional[str] = None,
@@ -91,46 +277,95 @@ class NavService:
                      page: int = 1,
                      page_size: int = 50,
                      sort_by: Optional[str] = "nav_date",
-                     sort_order: Optional[str] = "desc") -> Tuple[List[Nav], int]:
+                     sort_order: Optional[str] = "desc",
+                     cursor: Optional[str] = None) -> Tuple[List[Nav], int, Optional[str]]:
         """
         获取净值列表（带分页和筛选）
-        返回: (净值记录列表, 总记录数)
+        cursor 不为 None 时使用游标分页（首页传空字符串），忽略 page
+        返回: (净值记录列表, 总记录数, 下一页游标)
         """
         try:
             # 构建查询
-            query = self.db.query(Nav).join(Fund)
+            query = self._filter_nav_query(
+                self.db.query(Nav).join(Fund), fund_code, fund_name, start_date, end_date
+            )
             
-            # 应用筛选条件
-            if fund_code:
-                query = query.filter(Nav.fund_code.like(f"%{fund_code}%"))
-            if fund_name:
-                query = query.filter(Fund.fund_name.like(f"%{fund_name}%"))
-            if start_date:
-                query = query.filter(Nav.nav_date >= start_date)
-            if end_date:
-                query = query.filter(Nav.nav_date <= end_date)
+            # 获取总数（按筛选条件和数据版本缓存）
+            total = count_cache.get_or_count(
+                ('nav_list', fund_code, fund_name, start_date, end_date),
+                (Nav.__tablename__, Fund.__tablename__),
+                query.count
+            )
             
-            # 获取总数
-            total = query.count()
+            if cursor is not None:
+                sort_column = getattr(Nav, sort_by) if sort_by in NAV_KEYSET_SORT_COLUMNS else Nav.nav_date
+                descending = (sort_order or "desc").lower() != "asc"
+                nav_records, next_cursor = keyset_paginate(
+                    query, [(sort_column, descending), (Nav.id, descending)], cursor, page_size
+                )
+                return nav_records, total, next_cursor
             
             # 应用排序
-            sort_column = getattr(Nav, sort_by) if hasattr(Nav, sort_by) else Nav.nav_date
-            if sort_order.lower() == "asc":
-                query = query.order_by(asc(sort_column))
-            else:
-                query = query.order_by(desc(sort_column))
+            query = query.order_by(*self._nav_sort_clause(sort_by, sort_order))
                 
             # 应用分页
             nav_records = query.offset((page - 1) * page_size)\
                               .limit(page_size)\
                               .all()
             
-            return nav_records, total
+            return nav_records, total, None
             
         except Exception as e:
             logger.error(f"获取净值列表失败: {str(e)}")
             raise
     
+    @staticmethod
+    def _filter_nav_query(query, fund_code, fund_name, start_date, end_date):
+        """净值列表与导出共用的筛选条件"""
+        if fund_code:
+            query = query.filter(search_index.filter(Nav.fund_code, 'fund', fund_code, ['fund_code']))
+        if fund_name:
+            query = query.filter(search_index.filter(Nav.fund_code, 'fund', fund_name, ['fund_name']))
+        if start_date:
+            query = query.filter(Nav.nav_date >= start_date)
+        if end_date:
+            query = query.filter(Nav.nav_date <= end_date)
+        return query
+    
+    @staticmethod
+    def _nav_sort_clause(sort_by: Optional[str], sort_order: Optional[str]) -> tuple:
+        """排序条件，以主键同向兜底，保证同值记录在分页间顺序稳定"""
+        sort_column = getattr(Nav, sort_by) if sort_by and hasattr(Nav, sort_by) else Nav.nav_date
+        direction = asc if (sort_order or "desc").lower() == "asc" else desc
+        return direction(sort_column), direction(Nav.id)
+    
+    def iter_nav_export_rows(self,
+                             fund_code: Optional[str] = None,
+                             fund_name: Optional[str] = None,
+                             start_date: Optional[date] = None,
+                             end_date: Optional[date] = None,
+                             sort_by: Optional[str] = "nav_date",
+                             sort_order: Optional[str] = "desc") -> Iterator[tuple]:
+        """
+        按净值列表的筛选和排序条件逐行产出导出数据
+        只查询所需列并使用服务端游标分批拉取，不构造 ORM 对象
+        返回: (基金代码, 产品名称, 净值日期, 单位净值, 累计净值) 元组迭代器
+        """
+        query = self._filter_nav_query(
+            self.db.query(Nav.fund_code, Fund.fund_name, Nav.nav_date, Nav.unit_nav, Nav.accum_nav)
+                .join(Fund, Nav.fund_code == Fund.fund_code),
+            fund_code, fund_name, start_date, end_date
+        ).order_by(*self._nav_sort_clause(sort_by, sort_order))
+        
+        result = self.db.execute(
+            query.statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        try:
+            for row in result:
+                yield tuple(row)
+        finally:
+            result.close()
+    
     def delete_nav_records(self, nav_ids: List[int]) -> Tuple[int, List[str]]:
         """
         删除净值记录
@@ -138,18 +373,27 @@ class NavService:
         """
         deleted_count = 0
         errors = []
+        affected_funds = set()
+        changed_from: Dict[str, date] = {}
         
         try:
             for nav_id in nav_ids:
                 nav_record = self.db.query(Nav).filter(Nav.id == nav_id).first()
                 if nav_record:
+                    affected_funds.add(nav_record.fund_code)
+                    previous = changed_from.get(nav_record.fund_code)
+                    if previous is None or nav_record.nav_date < previous:
+                        changed_from[nav_record.fund_code] = nav_record.nav_date
                     self.db.delete(nav_record)
                     deleted_count += 1
                     logger.info(f"删除净值记录: ID={nav_id}")
                 else:
                     errors.append(f"净值记录 ID={nav_id} 不存在")
             
+            self.refresh_latest_nav(affected_funds)
+            self.refresh_nav_derived(changed_from)
             self.db.commit()
+            nav_store.invalidate(affected_funds)
             return deleted_count, errors
             
         except Exception as e:
@@ -157,146 +401,96 @@ class NavService:
             logger.error(f"删除净值记录失败: {str(e)}")
             raise
     
-    def process_excel_upload(self, file_content: bytes, filename: str) -> NavUploadResponse:
+    def process_excel_upload(self, file_path: str, filename: str) -> NavUploadResponse:
         """
-        处理Excel文件上传
+        处理Excel文件上传（按块流式读取，逐块写入并提交）
         返回处理结果统计
         """
         logger.info(f"开始处理Excel文件: {filename}")
         
-        success_count = 0
-        failed_count = 0
-        updated_count = 0
-        created_count = 0
         errors = []
+        # 已提交块的累计结果与当前块行数，处理失败时保留已提交的结果
+        result = None
+        chunk_rows = 0
         
         try:
-            # 读取Excel文件
-            df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-            
-            # 定义中英文字段映射
-            column_mapping = {
-                # 中文字段名映射到英文字段名
-                '基金代码': 'fund_code',
-                '产品名称': 'fund_name',
-                '净值日期': 'nav_date', 
-                '单位净值': 'unit_nav',
-                '累计净值': 'accum_nav',
-                # 支持英文字段名（原有兼容性）
-                'fund_code': 'fund_code',
-                'fund_name': 'fund_name',
-                'nav_date': 'nav_date',
-                'unit_nav': 'unit_nav',
-                'accum_nav': 'accum_nav'
-            }
-            
-            # 转换列名为标准英文字段
-            df_columns_mapped = {}
-            for col in df.columns:
-                col_str = str(col).strip()
-                if col_str in column_mapping:
-                    df_columns_mapped[col] = column_mapping[col_str]
-                else:
-                    df_columns_mapped[col] = col_str
-            
-            # 重命名列
-            df = df.rename(columns=df_columns_mapped)
-            
-            logger.info(f"Excel文件列名: {list(df.columns)}")
-            
-            # 验证必要列是否存在
-            required_columns = ['fund_code', 'nav_date', 'unit_nav', 'accum_nav']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                # 提供更友好的错误信息
-                missing_chinese = []
-                for missing_col in missing_columns:
-                    for cn_name, en_name in column_mapping.items():
-                        if en_name == missing_col:
-                            missing_chinese.append(f"{cn_name}({missing_col})")
-                            break
-                    else:
-                        missing_chinese.append(missing_col)
+            with ExcelChunkReader(file_path) as reader:
+                # 定义中英文字段映射
+                column_mapping = {
+                    # 中文字段名映射到英文字段名
+                    '基金代码': 'fund_code',
+                    '产品名称': 'fund_name',
+                    '净值日期': 'nav_date', 
+                    '单位净值': 'unit_nav',
+                    '累计净值': 'accum_nav',
+                    # 支持英文字段名（原有兼容性）
+                    'fund_code': 'fund_code',
+                    'fund_name': 'fund_name',
+                    'nav_date': 'nav_date',
+                    'unit_nav': 'unit_nav',
+                    'accum_nav': 'accum_nav'
+                }
                 
-                error_msg = f"Excel文件缺少必要列: {', '.join(missing_chinese)}"
-                errors.append(error_msg)
-                return NavUploadResponse(
-                    success_count=0,
-                    failed_count=len(df) if len(df) > 0 else 1,
-                    updated_count=0,
-                    created_count=0,
-                    errors=errors
-                )
-            
-            # 逐行处理数据
-            for index, row in df.iterrows():
-                try:
-                    # 验证和清理数据
-                    fund_code = str(row['fund_code']).strip().upper() if pd.notna(row['fund_code']) else None
-                    fund_name = str(row['fund_name']).strip() if 'fund_name' in row and pd.notna(row['fund_name']) else None
-                    nav_date_str = str(row['nav_date']).strip() if pd.notna(row['nav_date']) else None
-                    unit_nav = float(row['unit_nav']) if pd.notna(row['unit_nav']) else None
-                    accum_nav = float(row['accum_nav']) if pd.notna(row['accum_nav']) else None
-                    
-                    # 数据验证
-                    if not fund_code:
-                        errors.append(f"第{index+2}行：基金代码不能为空")
-                        failed_count += 1
-                        continue
-                    
-                    if not nav_date_str:
-                        errors.append(f"第{index+2}行：净值日期不能为空")
-                        failed_count += 1
-                        continue
-                    
-                    if unit_nav is None or unit_nav <= 0:
-                        errors.append(f"第{index+2}行：单位净值必须大于0")
-                        failed_count += 1
-                        continue
-                    
-                    if accum_nav is None or accum_nav < unit_nav:
-                        errors.append(f"第{index+2}行：累计净值必须大于等于单位净值")
-                        failed_count += 1
-                        continue
-                    
-                    # 创建NavManualCreate对象
-                    nav_data = NavManualCreate(
-                        fund_code=fund_code,
-                        fund_name=fund_name,
-                        nav_date=nav_date_str,
-                        unit_nav=Decimal(str(unit_nav)),
-                        accum_nav=Decimal(str(accum_nav))
-                    )
-                    
-                    # 创建或更新净值记录
-                    _, is_created = self.create_or_update_nav(nav_data)
-                    
-                    success_count += 1
-                    if is_created:
-                        created_count += 1
+                # 转换列名为标准英文字段
+                df_columns_mapped = {}
+                for col in reader.columns:
+                    col_str = str(col).strip()
+                    if col_str in column_mapping:
+                        df_columns_mapped[col] = column_mapping[col_str]
                     else:
-                        updated_count += 1
-                        
-                except Exception as e:
-                    error_msg = f"第{index+2}行处理失败: {str(e)}"
+                        df_columns_mapped[col] = col_str
+                
+                logger.info(f"Excel文件列名: {list(df_columns_mapped.values())}")
+                
+                # 验证必要列是否存在
+                required_columns = ['fund_code', 'nav_date', 'unit_nav', 'accum_nav']
+                missing_columns = [col for col in required_columns if col not in df_columns_mapped.values()]
+                
+                if missing_columns:
+                    # 提供更友好的错误信息
+                    missing_chinese = []
+                    for missing_col in missing_columns:
+                        for cn_name, en_name in column_mapping.items():
+                            if en_name == missing_col:
+                                missing_chinese.append(f"{cn_name}({missing_col})")
+                                break
+                        else:
+                            missing_chinese.append(missing_col)
+                
+                    error_msg = f"Excel文件缺少必要列: {', '.join(missing_chinese)}"
                     errors.append(error_msg)
-                    failed_count += 1
-                    logger.warning(error_msg)
-            
-            logger.info(f"Excel文件处理完成: 成功{success_count}, 失败{failed_count}")
+                    row_count = sum(len(chunk) for chunk in reader)
+                    return NavUploadResponse(
+                        success_count=0,
+                        failed_count=row_count if row_count > 0 else 1,
+                        updated_count=0,
+                        created_count=0,
+                        errors=errors
+                    )
+                
+                # 逐块校验并写入，每块独立提交
+                result = NavUploadResponse(success_count=0, failed_count=0, updated_count=0, created_count=0, errors=[])
+                for chunk in reader:
+                    chunk_rows = len(chunk)
+                    chunk_result = self._bulk_upsert_frame(chunk.rename(columns=df_columns_mapped))
+                    chunk_rows = 0
+                    result.success_count += chunk_result.success_count
+                    result.failed_count += chunk_result.failed_count
+                    result.updated_count += chunk_result.updated_count
+                    result.created_count += chunk_result.created_count
+                    result.errors.extend(chunk_result.errors)
             
-            return NavUploadResponse(
-                success_count=success_count,
-                failed_count=failed_count,
-                updated_count=updated_count,
-                created_count=created_count,
-                errors=errors
-            )
+            logger.info(f"Excel文件处理完成: 成功{result.success_count}, 失败{result.failed_count}")
+            return result
             
         except Exception as e:
+            self.db.rollback()
             error_msg = f"Excel文件处理异常: {str(e)}"
             logger.error(error_msg)
+            if result is not None:
+                result.failed_count += chunk_rows or 1
+                result.errors.append(error_msg)
+                return result
             return NavUploadResponse(
                 success_count=0,
                 failed_count=0,
@@ -305,6 +499,187 @@ class NavService:
                 errors=[error_msg]
             )
     
+    def _validate_upload_frame(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Tuple[int, str]]]:
+        """
+        向量化校验上传数据
+        返回: (有效记录DataFrame, [(Excel行号, 错误信息)])
+        """
+        row_numbers = pd.Series(df.index + 2, index=df.index)
+        
+        def clean_text(column: str, upper: bool = False) -> pd.Series:
+            if column not in df.columns:
+                return pd.Series('', index=df.index)
+            raw = df[column]
+            text = raw.astype(str).str.strip()
+            if upper:
+                text = text.str.upper()
+            return text.where(raw.notna(), '')
+        
+        fund_code = clean_text('fund_code', upper=True)
+        fund_name = clean_text('fund_name')
+        nav_date_str = clean_text('nav_date')
+        unit_nav = pd.to_numeric(df['unit_nav'], errors='coerce')
+        accum_nav = pd.to_numeric(df['accum_nav'], errors='coerce')
+        
+        # 日期按唯一值解析，避免重复转换
+        parsed_dates = {}
+        date_errors = {}
+        for value in nav_date_str[nav_date_str != ''].unique():
+            try:
+                parsed_dates[value] = DateConverter.convert_date_string(value)
+            except ValueError as e:
+                date_errors[value] = str(e)
+        nav_date = nav_date_str.map(parsed_dates)
+        
+        # 按原逐行校验的顺序依次判断，每行只记录第一个错误
+        checks = [
+            ((df['unit_nav'].notna() & unit_nav.isna()) | (df['accum_nav'].notna() & accum_nav.isna()),
+             lambda n: f"第{n}行处理失败: 净值不是有效数字"),
+            (fund_code == '', lambda n: f"第{n}行：基金代码不能为空"),
+            (nav_date_str == '', lambda n: f"第{n}行：净值日期不能为空"),
+            (unit_nav.isna() | (unit_nav <= 0), lambda n: f"第{n}行：单位净值必须大于0"),
+            (accum_nav.isna() | (accum_nav < unit_nav), lambda n: f"第{n}行：累计净值必须大于等于单位净值"),
+            (~fund_code.str.fullmatch(r'[A-Z0-9]+') | (fund_code.str.len() > 20),
+             lambda n: f"第{n}行处理失败: 基金代码只能包含字母和数字且不超过20位"),
+            (fund_name.str.len() > 100, lambda n: f"第{n}行处理失败: 基金名称不能超过100个字符"),
+        ]
+        
+        failed = pd.Series(False, index=df.index)
+        errors = []
+        for mask, message in checks:
+            hit = mask.fillna(True) & ~failed
+            errors.extend((n, message(n)) for n in row_numbers[hit])
+            failed |= hit
+        
+        bad_date = nav_date.isna() & ~failed
+        errors.extend(
+            (n, f"第{n}行处理失败: {date_errors.get(value, '日期解析失败')}")
+            for n, value in zip(row_numbers[bad_date], nav_date_str[bad_date])
+        )
+        failed |= bad_date
+        
+        valid = pd.DataFrame({
+            'row_number': row_numbers,
+            'fund_code': fund_code,
+            'fund_name': fund_name,
+            'nav_date': nav_date,
+            'unit_nav': unit_nav,
+            'accum_nav': accum_nav
+        })[~failed]
+        
+        return valid, errors
+    
+    def _bulk_upsert_frame(self, df: pd.DataFrame) -> NavUploadResponse:
+        """
+        批量写入上传的净值数据
+        
+        1. 向量化校验整张表
+        2. 一条语句补建缺失的基金
+        3. 按批执行方言相关的 upsert，每批提交一次
+        新增/更新计数与逐行处理保持一致：文件内同一基金同一日期首次出现计为新增，之后计为更新
+        """
+        valid, errors = self._validate_upload_frame(df)
+        failed_count = len(errors)
+        created_count = 0
+        updated_count = 0
+        
+        if valid.empty:
+            errors.sort(key=lambda item: item[0])
+            return NavUploadResponse(
+                success_count=0,
+                failed_count=failed_count,
+                updated_count=0,
+                created_count=0,
+                errors=[message for _, message in errors]
+            )
+        
+        fund_codes = valid['fund_code'].unique().tolist()
+        
+        # 查询已存在的基金与净值键，用于补建基金和区分新增/更新
+        existing_funds = set()
+        existing_keys = set()
+        min_date, max_date = valid['nav_date'].min(), valid['nav_date'].max()
+        for i in range(0, len(fund_codes), LATEST_NAV_BATCH_SIZE):
+            batch = fund_codes[i:i + LATEST_NAV_BATCH_SIZE]
+            existing_funds.update(
+                code for (code,) in self.db.query(Fund.fund_code).filter(Fund.fund_code.in_(batch))
+            )
+            existing_keys.update(
+                self.db.query(Nav.fund_code, Nav.nav_date).filter(
+                    Nav.fund_code.in_(batch),
+                    Nav.nav_date.between(min_date, max_date)
+                )
+            )
+        
+        # 自动创建基金记录（取该基金首次出现行的产品名称）
+        first_rows = valid.drop_duplicates('fund_code', keep='first')
+        new_funds = [
+            {'fund_code': code, 'fund_name': name or f"基金{code}"}
+            for code, name in zip(first_rows['fund_code'], first_rows['fund_name'])
+            if code not in existing_funds
+        ]
+        if new_funds:
+            upsert_rows(self.db, Fund, new_funds, key_columns=['fund_code'])
+            self.db.commit()
+            logger.info(f"自动创建基金: {len(new_funds)}只")
+        
+        keys = list(zip(valid['fund_code'], valid['nav_date']))
+        repeated = valid.duplicated(['fund_code', 'nav_date'], keep='first').to_numpy()
+        is_created = [not dup and key not in existing_keys for key, dup in zip(keys, repeated)]
+        valid = valid.assign(is_created=is_created)
+        
+        for i in range(0, len(valid), UPLOAD_CHUNK_SIZE):
+            chunk = valid.iloc[i:i + UPLOAD_CHUNK_SIZE]
+            # 同一批内重复的键只保留最后一行，与逐行覆盖的结果一致
+            latest_rows = chunk.drop_duplicates(['fund_code', 'nav_date'], keep='last')
+            rows = [
+                {
+                    'fund_code': code,
+                    'nav_date': nav_date,
+                    'unit_nav': Decimal(str(unit)),
+                    'accum_nav': Decimal(str(accum))
+                }
+                for code, nav_date, unit, accum in zip(
+                    latest_rows['fund_code'], latest_rows['nav_date'],
+                    latest_rows['unit_nav'], latest_rows['accum_nav']
+                )
+            ]
+            chunk_funds = latest_rows['fund_code'].unique().tolist()
+            changed_from = latest_rows.groupby('fund_code')['nav_date'].min().to_dict()
+            
+            try:
+                upsert_rows(
+                    self.db, Nav, rows,
+                    key_columns=['fund_code', 'nav_date'],
+                    update_columns=['unit_nav', 'accum_nav'],
+                    chunk_size=UPLOAD_CHUNK_SIZE
+                )
+                self.refresh_latest_nav(chunk_funds)
+                self.refresh_nav_derived(changed_from)
+                self.db.commit()
+                nav_store.invalidate(chunk_funds)
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"净值批量写入失败: {str(e)}")
+                errors.extend((n, f"第{n}行处理失败: {str(e)}") for n in chunk['row_number'])
+                failed_count += len(chunk)
+                continue
+            
+            chunk_created = int(chunk['is_created'].sum())
+            created_count += chunk_created
+            updated_count += len(chunk) - chunk_created
+        
+        success_count = created_count + updated_count
+        
+        errors.sort(key=lambda item: item[0])
+        return NavUploadResponse(
+            success_count=success_count,
+            failed_count=failed_count,
+            updated_count=updated_count,
+            created_count=created_count,
+            errors=[message for _, message in errors]
+        )
+    
     def get_nav_by_fund(self, fund_code: str, limit: int = 10) -> List[Nav]:
         """获取指定基金的最新净值记录"""
         try:
@@ -320,37 +695,25 @@ class NavService:
     def calculate_nav_statistics(self, fund_code: str, days: int = 30) -> Dict:
         """计算净值统计信息"""
         try:
-            nav_records = self.db.query(Nav).filter(Nav.fund_code == fund_code)\
-                                           .order_by(desc(Nav.nav_date))\
-                                           .limit(days)\
-                                           .all()
+            stats_df = PerformanceService(self.db).calculate_nav_statistics([fund_code], days)
             
-            if not nav_records:
+            if stats_df.empty:
                 return {"error": "没有找到净值数据"}
             
-            # 转换为pandas DataFrame进行统计
-            df = pd.DataFrame([{
-                'nav_date': record.nav_date,
-                'unit_nav': float(record.unit_nav),
-                'accum_nav': float(record.accum_nav)
-            } for record in nav_records])
-            
-            df = df.sort_values('nav_date')
-            
-            # 计算统计指标
-            latest_nav = float(nav_records[0].unit_nav)
-            earliest_nav = float(nav_records[-1].unit_nav) if len(nav_records) > 1 else latest_nav
+            row = stats_df.loc[fund_code]
+            latest_nav = float(row['latest_nav'])
+            earliest_nav = float(row['earliest_nav'])
             
             statistics = {
                 "fund_code": fund_code,
                 "latest_nav": latest_nav,
-                "latest_date": nav_records[0].nav_date.isoformat(),
+                "latest_date": row['latest_date'].isoformat(),
                 "period_return": round((latest_nav / earliest_nav - 1) * 100, 2) if earliest_nav > 0 else 0,
-                "max_nav": float(df['unit_nav'].max()),
-                "min_nav": float(df['unit_nav'].min()),
-                "avg_nav": round(float(df['unit_nav'].mean()), 4),
-                "volatility": round(float(df['unit_nav'].std()), 4),
-                "records_count": len(nav_records)
+                "max_nav": float(row['max_nav']),
+                "min_nav": float(row['min_nav']),
+                "avg_nav": round(float(row['avg_nav']), 4),
+                "volatility": round(float(row['volatility']), 4),
+                "records_count": int(row['records_count'])
             }
             
             return statistics
@@ -0,0 +1,209 @@
+"""
+净值时间序列内存存储
+NAV Time-Series Store
+
+按基金缓存排序后的净值日期与单位/累计净值数组，
+通过二分查找回答"某日及之前最近净值"、"某日及之后首个净值"和区间查询，
+避免分析接口对 Nav 表的逐条往返查询。
+"""
+
+import logging
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import Nav
+
+logger = logging.getLogger(__name__)
+
+# 与 Nav 表 Numeric(16, 6) 精度保持一致
+NAV_QUANTUM = Decimal('0.000001')
+
+# IN 查询分批大小，避免超出数据库参数上限
+PRELOAD_BATCH_SIZE = 500
+
+
+class NavPoint(NamedTuple):
+    """单条净值记录，字段与 Nav 模型同名，可直接替代查询结果使用"""
+    nav_date: date
+    unit_nav: Decimal
+    accum_nav: Decimal
+
+
+def _to_day(value: date) -> np.datetime64:
+    return np.datetime64(value, 'D')
+
+
+def to_nav_decimal(value: float) -> Decimal:
+    """浮点净值还原为 6 位小数的 Decimal"""
+    return Decimal(repr(float(value))).quantize(NAV_QUANTUM)
+
+
+class NavSeries:
+    """单只基金的净值序列（按日期升序）"""
+
+    __slots__ = ('fund_code', 'dates', 'unit_navs', 'accum_navs')
+
+    def __init__(self, fund_code: str, dates: np.ndarray, unit_navs: np.ndarray, accum_navs: np.ndarray):
+        self.fund_code = fund_code
+        self.dates = dates
+        self.unit_navs = unit_navs
+        self.accum_navs = accum_navs
+
+    @classmethod
+    def from_rows(cls, fund_code: str, rows: List[tuple]) -> 'NavSeries':
+        """由 (nav_date, unit_nav, accum_nav) 元组列表构建序列"""
+        rows = sorted(rows, key=lambda r: r[0])
+        dates = np.array([r[0] for r in rows], dtype='datetime64[D]')
+        unit_navs = np.array([float(r[1]) for r in rows], dtype=np.float64)
+        accum_navs = np.array([float(r[2]) for r in rows], dtype=np.float64)
+        return cls(fund_code, dates, unit_navs, accum_navs)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def _point(self, idx: int) -> NavPoint:
+        return NavPoint(
+            nav_date=self.dates[idx].astype(object),
+            unit_nav=to_nav_decimal(self.unit_navs[idx]),
+            accum_nav=to_nav_decimal(self.accum_navs[idx])
+        )
+
+    def first(self) -> Optional[NavPoint]:
+        """成立以来第一条净值"""
+        return self._point(0) if len(self) else None
+
+    def latest(self) -> Optional[NavPoint]:
+        """最新一条净值"""
+        return self._point(len(self) - 1) if len(self) else None
+
+    def as_of(self, target: date) -> Optional[NavPoint]:
+        """取 ≤ target 的最近净值"""
+        idx = int(np.searchsorted(self.dates, _to_day(target), side='right')) - 1
+        return self._point(idx) if idx >= 0 else None
+
+    def before(self, target: date) -> Optional[NavPoint]:
+        """取 < target 的最近净值"""
+        idx = int(np.searchsorted(self.dates, _to_day(target), side='left')) - 1
+        return self._point(idx) if idx >= 0 else None
+
+    def first_on_or_after(self, target: date) -> Optional[NavPoint]:
+        """取 ≥ target 的第一条净值"""
+        idx = int(np.searchsorted(self.dates, _to_day(target), side='left'))
+        return self._point(idx) if idx < len(self) else None
+
+    def range(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> 'NavSeries':
+        """截取 [start_date, end_date] 区间的子序列（共享底层数组，不复制）"""
+        lo = int(np.searchsorted(self.dates, _to_day(start_date), side='left')) if start_date else 0
+        hi = int(np.searchsorted(self.dates, _to_day(end_date), side='right')) if end_date else len(self)
+        return NavSeries(self.fund_code, self.dates[lo:hi], self.unit_navs[lo:hi], self.accum_navs[lo:hi])
+
+    def points(self) -> List[NavPoint]:
+        """展开为 NavPoint 列表"""
+        return [self._point(i) for i in range(len(self))]
+
+
+EMPTY_DATES = np.array([], dtype='datetime64[D]')
+EMPTY_VALUES = np.array([], dtype=np.float64)
+
+
+class NavStore:
+    """
+    进程级净值缓存
+
+    按基金懒加载，写入净值后由 NavService 调用 invalidate 失效对应基金，
+    下次访问时重新从数据库加载。
+    """
+
+    def __init__(self):
+        self._series: Dict[str, NavSeries] = {}
+        self._lock = threading.RLock()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """数据版本号，每次失效递增，供派生缓存判断是否过期"""
+        return self._version
+
+    def get(self, db: Session, fund_code: str) -> NavSeries:
+        """获取基金净值序列，未缓存时从数据库加载"""
+        series = self._series.get(fund_code)
+        if series is None:
+            loaded = self.preload(db, [fund_code])
+            series = loaded[fund_code] if fund_code in loaded else self._series.get(fund_code)
+        if series is None:
+            series = NavSeries(fund_code, EMPTY_DATES, EMPTY_VALUES, EMPTY_VALUES)
+        return series
+
+    def preload(self, db: Session, fund_codes: Optional[Iterable[str]] = None) -> Dict[str, NavSeries]:
+        """
+        批量加载基金净值，一次查询填充多只基金
+        fund_codes 为 None 时加载全部基金；返回本次新加载的序列
+        """
+        # 查询在锁外进行，加载期间其他请求不被阻塞
+        with self._lock:
+            version = self._version
+            if fund_codes is None:
+                codes = None
+            else:
+                codes = [code for code in dict.fromkeys(fund_codes) if code and code not in self._series]
+                if not codes:
+                    return {}
+
+        query = db.query(Nav.fund_code, Nav.nav_date, Nav.unit_nav, Nav.accum_nav)
+        if codes is None:
+            rows = query.all()
+        else:
+            rows = []
+            for i in range(0, len(codes), PRELOAD_BATCH_SIZE):
+                rows.extend(query.filter(Nav.fund_code.in_(codes[i:i + PRELOAD_BATCH_SIZE])).all())
+
+        grouped: Dict[str, List[tuple]] = {}
+        for fund_code, nav_date, unit_nav, accum_nav in rows:
+            grouped.setdefault(fund_code, []).append((nav_date, unit_nav, accum_nav))
+
+        loaded: Dict[str, NavSeries] = {}
+        for code in (grouped.keys() if codes is None else codes):
+            fund_rows = grouped.get(code)
+            if fund_rows:
+                loaded[code] = NavSeries.from_rows(code, fund_rows)
+            else:
+                loaded[code] = NavSeries(code, EMPTY_DATES, EMPTY_VALUES, EMPTY_VALUES)
+
+        # 加载期间发生失效则不写入缓存，避免缓存旧数据
+        with self._lock:
+            if version == self._version:
+                self._series.update(loaded)
+
+        logger.debug(f"净值缓存加载完成: {len(loaded)}只基金, {len(rows)}条记录")
+        return loaded
+
+    def as_of(self, db: Session, fund_code: str, target: date) -> Optional[NavPoint]:
+        """取基金 ≤ target 的最近净值"""
+        return self.get(db, fund_code).as_of(target)
+
+    def first_on_or_after(self, db: Session, fund_code: str, target: date) -> Optional[NavPoint]:
+        """取基金 ≥ target 的第一条净值"""
+        return self.get(db, fund_code).first_on_or_after(target)
+
+    def latest(self, db: Session, fund_code: str) -> Optional[NavPoint]:
+        """取基金最新净值"""
+        return self.get(db, fund_code).latest()
+
+    def invalidate(self, fund_codes: Optional[Iterable[str]] = None) -> None:
+        """失效指定基金的缓存，fund_codes 为 None 时清空全部"""
+        with self._lock:
+            if fund_codes is None:
+                self._series.clear()
+            else:
+                for code in fund_codes:
+                    self._series.pop(code, None)
+            self._version += 1
+
+
+# 全局净值缓存实例
+nav_store = NavStore()
@@ -0,0 +1,155 @@
+"""
+列表分页工具
+List Pagination Helpers
+
+- 游标（keyset）分页：按排序键记录上一页最后一行，下一页以 WHERE 条件定位，
+  避免深分页时 OFFSET 线性扫描
+- 总数缓存：按 列表名 + 筛选条件 + 相关表数据版本 缓存 count 结果，短时有效
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, asc, desc, or_
+
+from .data_version import data_versions
+
+logger = logging.getLogger(__name__)
+
+# 总数缓存有效期（秒）
+COUNT_CACHE_TTL = float(os.getenv("LIST_COUNT_CACHE_TTL", "30"))
+
+# 总数缓存最大条目数
+COUNT_CACHE_MAX_ENTRIES = 512
+
+
+class CountCache:
+    """列表总数缓存，条目在有效期到期或相关表数据版本变化后失效"""
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, max_entries: int = COUNT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[tuple, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_count(self, key: Hashable, tables: Sequence[str], compute: Callable[[], int]) -> int:
+        """
+        获取缓存的总数，未命中时调用 compute 计算并缓存
+
+        Args:
+            key: 列表名与筛选条件组成的可哈希键
+            tables: 查询涉及的表名，任一表数据版本变化即失效
+            compute: 实际计数函数
+        """
+        versions = data_versions.get(*tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        total = compute()
+        with self._lock:
+            self._entries[key] = (versions, now + self.ttl, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局总数缓存实例
+count_cache = CountCache()
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无法解析"""
+
+
+def _encode_value(value: Any) -> list:
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['n', str(value)]
+    return ['v', value]
+
+
+def _decode_value(item: list) -> Any:
+    kind, value = item
+    if kind == 'dt':
+        return datetime.fromisoformat(value)
+    if kind == 'd':
+        return date.fromisoformat(value)
+    if kind == 'n':
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """排序键取值编码为游标字符串"""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析游标字符串，格式错误时抛出 InvalidCursorError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        items = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values = [_decode_value(item) for item in items]
+    except Exception:
+        raise InvalidCursorError("无效的分页游标")
+    if len(values) != size:
+        raise InvalidCursorError("无效的分页游标")
+    return values
+
+
+def keyset_paginate(query,
+                    order: Sequence[Tuple[Any, bool]],
+                    cursor: Optional[str],
+                    page_size: int) -> Tuple[list, Optional[str]]:
+    """
+    游标分页
+
+    Args:
+        query: 未排序的 ORM 查询，结果为排序列所属的实体
+        order: [(排序列, 是否降序)]，最后一列须唯一（如主键）以保证顺序确定
+        cursor: 上一页返回的游标，空字符串或 None 表示第一页
+        page_size: 每页记录数
+
+    Returns:
+        (当前页记录, 下一页游标)，没有下一页时游标为 None
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(order))
+        conditions = []
+        for i, (column, descending) in enumerate(order):
+            equal_prefix = [order[j][0] == values[j] for j in range(i)]
+            beyond = column < values[i] if descending else column > values[i]
+            conditions.append(and_(*equal_prefix, beyond))
+        query = query.filter(or_(*conditions))
+
+    rows = query.order_by(
+        *[desc(column) if descending else asc(column) for column, descending in order]
+    ).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column, _ in order])
+    return rows, next_cursor
@@ -0,0 +1,170 @@
+"""
+基金业绩指标计算服务
+Fund Performance Metrics Service
+
+将多只基金的净值整理为 日期 × 基金 的面板，
+一次性按列向量化计算收益率、波动率、夏普比率、最大回撤等指标，
+替代逐只基金查询净值再单独计算的方式。
+"""
+
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import Position
+from .nav_store import nav_store
+
+logger = logging.getLogger(__name__)
+
+# 无风险利率（年化）
+RISK_FREE_RATE = 0.03
+
+# 年化波动率使用的年交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+
+class PerformanceService:
+    """基金业绩指标计算服务类"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_nav_panel(self,
+                       fund_codes: List[str],
+                       start_date: Optional[date] = None,
+                       end_date: Optional[date] = None,
+                       field: str = 'unit_nav') -> pd.DataFrame:
+        """
+        加载净值面板
+
+        Returns:
+            DataFrame: 索引为净值日期，列为基金代码，缺失日期为 NaN；无净值的基金不出现在列中
+        """
+        nav_store.preload(self.db, fund_codes)
+
+        dates, values, codes = [], [], []
+        for code in dict.fromkeys(fund_codes):
+            series = nav_store.get(self.db, code).range(start_date, end_date)
+            if not len(series):
+                continue
+            dates.append(series.dates)
+            values.append(series.unit_navs if field == 'unit_nav' else series.accum_navs)
+            codes.append(np.full(len(series), code, dtype=object))
+
+        if not dates:
+            return pd.DataFrame(dtype=np.float64)
+
+        long_df = pd.DataFrame({
+            'nav_date': np.concatenate(dates),
+            'fund_code': np.concatenate(codes),
+            'value': np.concatenate(values)
+        })
+        return long_df.pivot(index='nav_date', columns='fund_code', values='value').sort_index()
+
+    def calculate_performance_metrics(self,
+                                      fund_codes: List[str],
+                                      start_date: date,
+                                      end_date: date,
+                                      period_days: int) -> pd.DataFrame:
+        """
+        计算区间业绩指标
+
+        每只基金仅使用自身的净值记录计算日收益率，少于2条净值的基金不参与计算。
+
+        Returns:
+            DataFrame: 以基金代码为索引，包含 latest_nav、total_return_pct、annualized_return、
+                       volatility_pct、sharpe_ratio、max_drawdown_pct、nav_records_count 列
+        """
+        panel = self.load_nav_panel(fund_codes, start_date, end_date)
+        if panel.empty:
+            return pd.DataFrame()
+
+        counts = panel.count()
+        panel = panel.loc[:, counts >= 2]
+        if panel.empty:
+            return pd.DataFrame()
+
+        filled = panel.ffill()
+        first_nav = panel.bfill().iloc[0]
+        latest_nav = filled.iloc[-1]
+
+        # 日收益率：相对该基金上一条净值，基金无净值的日期为 NaN
+        returns = panel / filled.shift(1) - 1
+
+        total_return = (latest_nav / first_nav - 1) * 100
+        volatility = returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+        annualized_return = total_return * (365 / period_days) / 100
+        sharpe_ratio = ((annualized_return - RISK_FREE_RATE) / (volatility / 100)).where(volatility > 0, 0.0)
+
+        cumulative = (1 + returns.fillna(0)).cumprod()
+        drawdown = (cumulative / cumulative.cummax() - 1) * 100
+
+        return pd.DataFrame({
+            'latest_nav': latest_nav,
+            'total_return_pct': total_return,
+            'annualized_return': annualized_return,
+            'volatility_pct': volatility,
+            'sharpe_ratio': sharpe_ratio,
+            'max_drawdown_pct': drawdown.min(),
+            'nav_records_count': counts[panel.columns]
+        })
+
+    def calculate_nav_statistics(self, fund_codes: List[str], last_n: int) -> pd.DataFrame:
+        """
+        计算最近 last_n 条净值的统计信息
+
+        Returns:
+            DataFrame: 以基金代码为索引，包含 latest_nav、latest_date、earliest_nav、
+                       max_nav、min_nav、avg_nav、volatility、records_count 列
+        """
+        nav_store.preload(self.db, fund_codes)
+
+        tails: Dict[str, pd.Series] = {}
+        latest_dates: Dict[str, date] = {}
+        for code in dict.fromkeys(fund_codes):
+            series = nav_store.get(self.db, code)
+            if not len(series):
+                continue
+            tails[code] = pd.Series(series.unit_navs[-last_n:])
+            latest_dates[code] = series.dates[-1].astype(object)
+
+        if not tails:
+            return pd.DataFrame()
+
+        # 按位置对齐的面板：每列为一只基金最近的 last_n 条净值
+        panel = pd.DataFrame(tails)
+        return pd.DataFrame({
+            'latest_nav': panel.ffill().iloc[-1],
+            'latest_date': pd.Series(latest_dates, dtype=object),
+            'earliest_nav': panel.iloc[0],
+            'max_nav': panel.max(),
+            'min_nav': panel.min(),
+            'avg_nav': panel.mean(),
+            'volatility': panel.std(),
+            'records_count': panel.count()
+        })
+
+    def get_position_stats(self, fund_codes: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """按基金汇总持仓客户数、成本和份额，一次分组查询"""
+        query = self.db.query(
+            Position.fund_code,
+            func.count(func.distinct(Position.group_id)).label('client_count'),
+            func.sum(Position.cost_with_fee).label('total_aum'),
+            func.sum(Position.shares).label('total_shares')
+        )
+        if fund_codes is not None:
+            query = query.filter(Position.fund_code.in_(fund_codes))
+
+        return {
+            row.fund_code: {
+                'client_count': row.client_count,
+                'total_aum': row.total_aum,
+                'total_shares': row.total_shares
+            }
+            for row in query.group_by(Position.fund_code).all()
+        }
@@ -0,0 +1,178 @@
+"""
+客户持仓汇总服务
+Client Portfolio Summary Service
+
+按 (客户, 存量时间) 物化客户持仓汇总，供客户列表、统计概览、理财师汇总直接读取：
+- 持仓写入：从最早变动的存量时间起重算该客户的汇总行
+- 最新净值变动：重算持有该基金的客户的全部汇总行
+- 客户分红写入：重算该客户的全部汇总行
+汇总口径与逐笔计算一致，份额或最新净值为空/零的持仓不计市值，成本为空/零的持仓不计盈亏。
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import ClientDividend, FundLatestNav, PortfolioSummary, Position
+
+logger = logging.getLogger(__name__)
+
+# 汇总表按客户分批重算的批大小
+SUMMARY_BATCH_SIZE = 500
+
+# 计入持仓汇总的分红交易类型
+CASH_DIVIDEND_TYPE = '现金红利'
+
+
+class PortfolioSummaryService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh(self, changes: Optional[Dict[str, Optional[date]]] = None) -> int:
+        """
+        重算客户持仓汇总（不提交事务）
+        changes 为 {集团号: 最早变动存量时间}：从该存量时间起重算，之前的汇总行保持不变；
+        日期为 None 时重算该客户全部汇总行，changes 为 None 时全量重建
+        返回: 写入的汇总行数
+        """
+        self.db.flush()
+
+        if changes is None:
+            self.db.execute(delete(PortfolioSummary))
+            changes = {group_id: None for (group_id,) in self.db.query(Position.group_id).distinct().all()}
+
+        group_ids = sorted(changes)
+        written = 0
+        for i in range(0, len(group_ids), SUMMARY_BATCH_SIZE):
+            written += self._refresh_batch({group_id: changes[group_id]
+                                            for group_id in group_ids[i:i + SUMMARY_BATCH_SIZE]})
+        return written
+
+    def refresh_clients(self, group_ids: Iterable[str]) -> int:
+        """重算指定客户的全部汇总行（不提交事务）"""
+        return self.refresh({group_id: None for group_id in group_ids})
+
+    def refresh_funds(self, fund_codes: Iterable[str]) -> int:
+        """重算持有指定基金的客户的全部汇总行，用于最新净值变动（不提交事务）"""
+        codes = sorted(set(fund_codes))
+        group_ids = set()
+        for i in range(0, len(codes), SUMMARY_BATCH_SIZE):
+            group_ids.update(
+                group_id for (group_id,) in self.db.query(Position.group_id)
+                .filter(Position.fund_code.in_(codes[i:i + SUMMARY_BATCH_SIZE])).distinct()
+            )
+        if not group_ids:
+            return 0
+        return self.refresh_clients(group_ids)
+
+    def sync(self) -> int:
+        """
+        校验汇总表与持仓表是否一致（每个存量时间的持仓记录数），不一致的客户全部重算（不提交事务）
+        返回: 重算的客户数量
+        """
+        position_stats = {
+            (row.group_id, row.stock_date): row.count
+            for row in self.db.query(
+                Position.group_id, Position.stock_date, func.count(Position.id).label('count')
+            ).group_by(Position.group_id, Position.stock_date).all()
+        }
+        summary_stats = {
+            (row.group_id, row.stock_date): row.position_count
+            for row in self.db.query(
+                PortfolioSummary.group_id, PortfolioSummary.stock_date, PortfolioSummary.position_count
+            ).all()
+        }
+
+        stale = {
+            key[0] for key in set(position_stats) | set(summary_stats)
+            if position_stats.get(key) != summary_stats.get(key)
+        }
+        if stale:
+            self.refresh_clients(stale)
+        return len(stale)
+
+    def _refresh_batch(self, changes: Dict[str, Optional[date]]) -> int:
+        """重算一批客户的汇总行，同一起始存量时间的客户合并处理"""
+        group_ids = list(changes)
+        by_from_date: Dict[Optional[date], List[str]] = defaultdict(list)
+        for group_id, from_date in changes.items():
+            by_from_date[from_date].append(group_id)
+
+        # 每只基金首次出现的存量时间，用于累计客户持有过的基金数
+        first_dates = {
+            (row.group_id, row.fund_code): row.first_date
+            for row in self.db.execute(
+                select(Position.group_id, Position.fund_code, func.min(Position.stock_date).label('first_date'))
+                .where(Position.group_id.in_(group_ids))
+                .group_by(Position.group_id, Position.fund_code)
+            )
+        }
+        dividends = {
+            (row.group_id, row.fund_code): row.amount
+            for row in self.db.execute(
+                select(ClientDividend.group_id, ClientDividend.fund_code,
+                       func.sum(ClientDividend.confirmed_amount).label('amount'))
+                .where(ClientDividend.group_id.in_(group_ids),
+                       ClientDividend.transaction_type == CASH_DIVIDEND_TYPE)
+                .group_by(ClientDividend.group_id, ClientDividend.fund_code)
+            )
+        }
+
+        summaries: Dict[tuple, dict] = {}
+        for from_date, batch in by_from_date.items():
+            delete_stmt = delete(PortfolioSummary).where(PortfolioSummary.group_id.in_(batch))
+            position_query = select(
+                Position.group_id, Position.fund_code, Position.stock_date,
+                Position.cost_with_fee, Position.cost_without_fee, Position.shares, FundLatestNav.unit_nav
+            ).outerjoin(FundLatestNav, Position.fund_code == FundLatestNav.fund_code)\
+             .where(Position.group_id.in_(batch))
+            if from_date is not None:
+                delete_stmt = delete_stmt.where(PortfolioSummary.stock_date >= from_date)
+                position_query = position_query.where(Position.stock_date >= from_date)
+
+            self.db.execute(delete_stmt)
+            for row in self.db.execute(position_query):
+                key = (row.group_id, row.stock_date)
+                summary = summaries.get(key)
+                if summary is None:
+                    summary = summaries[key] = {
+                        'group_id': row.group_id,
+                        'stock_date': row.stock_date,
+                        'position_count': 0,
+                        'fund_codes': set(),
+                        'new_fund_count': 0,
+                        'total_cost': Decimal('0'),
+                        'total_cost_without_fee': Decimal('0'),
+                        'total_shares': Decimal('0'),
+                        'market_value': Decimal('0'),
+                        'unrealized_pnl': Decimal('0'),
+                        'total_dividends': Decimal('0'),
+                    }
+
+                summary['position_count'] += 1
+                if row.fund_code not in summary['fund_codes']:
+                    summary['fund_codes'].add(row.fund_code)
+                    if first_dates.get((row.group_id, row.fund_code)) == row.stock_date:
+                        summary['new_fund_count'] += 1
+                summary['total_cost'] += row.cost_with_fee or 0
+                summary['total_cost_without_fee'] += row.cost_without_fee or 0
+                summary['total_shares'] += row.shares or 0
+                summary['total_dividends'] += dividends.get((row.group_id, row.fund_code)) or 0
+                if row.shares and row.unit_nav:
+                    position_value = row.shares * row.unit_nav
+                    summary['market_value'] += position_value
+                    if row.cost_with_fee:
+                        summary['unrealized_pnl'] += position_value - row.cost_with_fee
+
+        rows = []
+        for summary in summaries.values():
+            summary['fund_count'] = len(summary.pop('fund_codes'))
+            rows.append(summary)
+        if rows:
+            self.db.execute(insert(PortfolioSummary), rows)
+        return len(rows)
@@ -12,11 +12,14 @@ from datetime import date, datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
 
-from ..models import Position, Client, Fund, Nav
+from ..models import Position, Client, CurrentHolding, Fund, FundLatestNav
 from ..schemas.position import (
     PositionAnalysis, ClientPositionSummary, FundPositionSummary,
-    TopHoldersResponse, PositionConcentrationAnalysis, PositionRiskMetrics
+    TopHoldersResponse, PositionConcentrationAnalysis, PositionRiskMetrics, FundConcentrationSummary
 )
+from .pagination import count_cache, keyset_paginate
+from .search_index import search_index
+from .current_holdings import holdings_source
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +37,12 @@ class PositionAnalysisService:
                          end_date: Optional[date] = None,
                          domestic_planner: Optional[str] = None,
                          page: int = 1,
-                         page_size: int = 50) -> Tuple[List[Position], int]:
+                         page_size: int = 50,
+                         cursor: Optional[str] = None) -> Tuple[List[Position], int, Optional[str]]:
         """
         获取持仓列表（带分页和筛选）
+        cursor 不为 None 时使用游标分页（首页传空字符串），忽略 page
+        返回: (持仓列表, 总记录数, 下一页游标)
         """
         try:
             # 构建查询
@@ -52,26 +58,40 @@ class PositionAnalysisService:
             if end_date:
                 query = query.filter(Position.stock_date <= end_date)
             if domestic_planner:
-                query = query.filter(Client.domestic_planner.like(f"%{domestic_planner}%"))
+                query = query.filter(
+                    search_index.filter(Client.group_id, 'client', domestic_planner, ['domestic_planner'])
+                )
+            
+            # 获取总数（按筛选条件和数据版本缓存）
+            total = count_cache.get_or_count(
+                ('position_list', group_id, fund_code, start_date, end_date, domestic_planner),
+                (Position.__tablename__, Client.__tablename__, Fund.__tablename__),
+                query.count
+            )
             
-            # 获取总数
-            total = query.count()
+            if cursor is not None:
+                positions, next_cursor = keyset_paginate(
+                    query,
+                    [(Position.stock_date, True), (Position.group_id, False), (Position.id, False)],
+                    cursor, page_size
+                )
+                return positions, total, next_cursor
             
             # 应用分页和排序
-            positions = query.order_by(desc(Position.stock_date), Position.group_id)\
+            positions = query.order_by(desc(Position.stock_date), Position.group_id, Position.id)\
                             .offset((page - 1) * page_size)\
                             .limit(page_size)\
                             .all()
             
-            return positions, total
+            return positions, total, None
             
         except Exception as e:
             logger.error(f"获取持仓列表失败: {str(e)}")
             raise
     
-    def analyze_client_positions(self, group_id: str) -> ClientPositionSummary:
+    def analyze_client_positions(self, group_id: str, as_of_date: Optional[date] = None) -> ClientPositionSummary:
         """
-        分析客户的全部持仓情况
+        分析客户的当前持仓情况（取截止日期及之前最近一期存量快照，默认读取当前持仓表）
         """
         try:
             # 获取客户信息
@@ -79,8 +99,9 @@ class PositionAnalysisService:
             if not client:
                 raise ValueError(f"客户 {group_id} 不存在")
             
-            # 获取客户所有持仓
-            positions = self.db.query(Position).filter(Position.group_id == group_id).all()
+            # 获取客户当前持仓
+            holdings = holdings_source(as_of_date)
+            positions = self.db.query(holdings).filter(holdings.c.group_id == group_id).all()
             
             if not positions:
                 raise ValueError(f"客户 {group_id} 没有持仓记录")
@@ -99,8 +120,18 @@ class PositionAnalysisService:
                     fund_groups[pos.fund_code] = []
                 fund_groups[pos.fund_code].append(pos)
             
+            # 一次查询获取所有持仓基金的最新净值
+            latest_navs = {
+                record.fund_code: record
+                for record in self.db.query(FundLatestNav)
+                                     .filter(FundLatestNav.fund_code.in_(list(fund_groups.keys())))
+                                     .all()
+            }
+            
             for fund_code, fund_positions_list in fund_groups.items():
-                fund_analysis = self._analyze_fund_position(group_id, fund_code, fund_positions_list)
+                fund_analysis = self._analyze_fund_position(
+                    group_id, fund_code, fund_positions_list, latest_navs.get(fund_code)
+                )
                 fund_positions.append(fund_analysis)
                 
                 total_cost_with_fee += fund_analysis.total_cost_with_fee or Decimal('0')
@@ -133,9 +164,11 @@ class PositionAnalysisService:
             logger.error(f"分析客户持仓失败: {str(e)}")
             raise
     
-    def _analyze_fund_position(self, group_id: str, fund_code: str, positions: List[Position]) -> PositionAnalysis:
+    def _analyze_fund_position(self, group_id: str, fund_code: str, positions: list,
+                               latest_nav_record: Optional[FundLatestNav]) -> PositionAnalysis:
         """
         分析单个基金的持仓情况
+        positions 为持仓表或时点持仓来源的行，latest_nav_record 由调用方批量查询后传入
         """
         # 获取基金和客户信息
         fund = self.db.query(Fund).filter(Fund.fund_code == fund_code).first()
@@ -146,11 +179,6 @@ class PositionAnalysisService:
         total_cost_without_fee = sum([pos.cost_without_fee or Decimal('0') for pos in positions])
         total_shares = sum([pos.shares or Decimal('0') for pos in positions])
         
-        # 获取最新净值
-        latest_nav_record = self.db.query(Nav).filter(Nav.fund_code == fund_code)\
-                                           .order_by(desc(Nav.nav_date))\
-                                           .first()
-        
         # 计算市值和收益
         current_market_value = None
         unrealized_pnl = None
@@ -186,18 +214,22 @@ class PositionAnalysisService:
             fee_rate=round(fee_rate, 2) if fee_rate else None
         )
     
-    def analyze_fund_positions(self, fund_code: str) -> FundPositionSummary:
+    def analyze_fund_positions(self, fund_code: str, as_of_date: Optional[date] = None) -> FundPositionSummary:
         """
-        分析基金的所有持仓情况
+        分析基金的当前持仓情况（每个客户取截止日期及之前最近一期存量快照，默认读取当前持仓表）
         """
         try:
-            # 获取基金信息
-            fund = self.db.query(Fund).filter(Fund.fund_code == fund_code).first()
-            if not fund:
+            # 获取基金信息及最新净值
+            fund_row = self.db.query(Fund, FundLatestNav)\
+                             .outerjoin(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)\
+                             .filter(Fund.fund_code == fund_code).first()
+            if not fund_row:
                 raise ValueError(f"基金 {fund_code} 不存在")
+            fund, latest_nav_record = fund_row
             
-            # 获取基金所有持仓
-            positions = self.db.query(Position).filter(Position.fund_code == fund_code).all()
+            # 获取基金当前持仓
+            holdings = holdings_source(as_of_date)
+            positions = self.db.query(holdings).filter(holdings.c.fund_code == fund_code).all()
             
             if not positions:
                 raise ValueError(f"基金 {fund_code} 没有持仓记录")
@@ -216,18 +248,13 @@ class PositionAnalysisService:
             total_shares = Decimal('0')
             
             for group_id, client_positions_list in client_groups.items():
-                client_analysis = self._analyze_fund_position(group_id, fund_code, client_positions_list)
+                client_analysis = self._analyze_fund_position(group_id, fund_code, client_positions_list, latest_nav_record)
                 client_positions.append(client_analysis)
                 
                 total_cost_with_fee += client_analysis.total_cost_with_fee or Decimal('0')
                 total_cost_without_fee += client_analysis.total_cost_without_fee or Decimal('0')
                 total_shares += client_analysis.total_shares or Decimal('0')
             
-            # 获取最新净值
-            latest_nav_record = self.db.query(Nav).filter(Nav.fund_code == fund_code)\
-                                               .order_by(desc(Nav.nav_date))\
-                                               .first()
-            
             total_market_value = None
             if latest_nav_record and total_shares > 0:
                 total_market_value = total_shares * latest_nav_record.unit_nav
@@ -249,36 +276,38 @@ class PositionAnalysisService:
             logger.error(f"分析基金持仓失败: {str(e)}")
             raise
     
-    def get_fund_top_holders(self, fund_code: str, top_n: int = 10) -> TopHoldersResponse:
+    def get_fund_top_holders(self, fund_code: str, top_n: int = 10,
+                             as_of_date: Optional[date] = None) -> TopHoldersResponse:
         """
-        获取基金前N大持有人
+        获取基金前N大持有人（按当前持仓，指定截止日期时取各客户该日及之前最近一期存量快照）
         """
         try:
-            # 获取基金信息
-            fund = self.db.query(Fund).filter(Fund.fund_code == fund_code).first()
-            if not fund:
+            # 获取基金信息及最新净值
+            fund_row = self.db.query(Fund, FundLatestNav)\
+                             .outerjoin(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)\
+                             .filter(Fund.fund_code == fund_code).first()
+            if not fund_row:
                 raise ValueError(f"基金 {fund_code} 不存在")
+            fund, latest_nav = fund_row
             
             # 按客户汇总持仓
+            holdings = holdings_source(as_of_date)
             client_positions = self.db.query(
-                Position.group_id,
+                holdings.c.group_id,
                 Client.obscured_name,
-                func.sum(Position.shares).label('total_shares'),
-                func.sum(Position.cost_with_fee).label('total_cost')
-            ).join(Client).filter(Position.fund_code == fund_code)\
-             .group_by(Position.group_id, Client.obscured_name)\
+                func.sum(holdings.c.shares).label('total_shares'),
+                func.sum(holdings.c.cost_with_fee).label('total_cost')
+            ).join(Client, Client.group_id == holdings.c.group_id)\
+             .filter(holdings.c.fund_code == fund_code)\
+             .group_by(holdings.c.group_id, Client.obscured_name)\
              .order_by(desc('total_shares'))\
              .limit(top_n).all()
             
-            # 获取最新净值
-            latest_nav = self.db.query(Nav).filter(Nav.fund_code == fund_code)\
-                                          .order_by(desc(Nav.nav_date))\
-                                          .first()
-            
-            # 计算总市值
-            total_shares = self.db.query(func.sum(Position.shares))\
-                                 .filter(Position.fund_code == fund_code)\
-                                 .scalar() or Decimal('0')
+            # 计算总市值和持有人数
+            total_shares, total_holders = self.db.query(
+                func.sum(holdings.c.shares), func.count(func.distinct(holdings.c.group_id))
+            ).filter(holdings.c.fund_code == fund_code).one()
+            total_shares = total_shares or Decimal('0')
             
             total_market_value = None
             if latest_nav and total_shares > 0:
@@ -306,7 +335,7 @@ class PositionAnalysisService:
             return TopHoldersResponse(
                 fund_code=fund_code,
                 fund_name=fund.fund_name,
-                total_holders=self.db.query(Position.group_id).filter(Position.fund_code == fund_code).distinct().count(),
+                total_holders=total_holders,
                 total_market_value=total_market_value,
                 top_holders=top_holders
             )
@@ -315,22 +344,27 @@ class PositionAnalysisService:
             logger.error(f"获取基金前十大持有人失败: {str(e)}")
             raise
     
-    def analyze_position_concentration(self, fund_code: str) -> PositionConcentrationAnalysis:
+    def analyze_position_concentration(self, fund_code: str,
+                                       as_of_date: Optional[date] = None) -> PositionConcentrationAnalysis:
         """
-        分析基金持仓集中度
+        分析基金持仓集中度（按当前持仓，指定截止日期时取各客户该日及之前最近一期存量快照）
         """
         try:
-            # 获取基金信息
-            fund = self.db.query(Fund).filter(Fund.fund_code == fund_code).first()
-            if not fund:
+            # 获取基金信息及最新净值
+            fund_row = self.db.query(Fund, FundLatestNav)\
+                             .outerjoin(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)\
+                             .filter(Fund.fund_code == fund_code).first()
+            if not fund_row:
                 raise ValueError(f"基金 {fund_code} 不存在")
+            fund, latest_nav = fund_row
             
             # 按客户汇总持仓份额
+            holdings = holdings_source(as_of_date)
             client_shares = self.db.query(
-                Position.group_id,
-                func.sum(Position.shares).label('total_shares')
-            ).filter(Position.fund_code == fund_code)\
-             .group_by(Position.group_id)\
+                holdings.c.group_id,
+                func.sum(holdings.c.shares).label('total_shares')
+            ).filter(holdings.c.fund_code == fund_code)\
+             .group_by(holdings.c.group_id)\
              .all()
             
             if not client_shares:
@@ -352,11 +386,7 @@ class PositionAnalysisService:
             top5_concentration = df.head(5)['percentage'].sum() if len(df) >= 5 else df['percentage'].sum()
             top10_concentration = df.head(10)['percentage'].sum() if len(df) >= 10 else df['percentage'].sum()
             
-            # 获取最新净值计算市值分布
-            latest_nav = self.db.query(Nav).filter(Nav.fund_code == fund_code)\
-                                          .order_by(desc(Nav.nav_date))\
-                                          .first()
-            
+            # 使用最新净值计算市值分布
             if latest_nav:
                 df['market_value'] = df['shares'] * float(latest_nav.unit_nav)
                 
@@ -383,6 +413,113 @@ class PositionAnalysisService:
             logger.error(f"分析持仓集中度失败: {str(e)}")
             raise
     
+    def analyze_all_fund_concentration(self, top_n: int = 10,
+                                       as_of_date: Optional[date] = None) -> List[FundConcentrationSummary]:
+        """
+        全量基金持仓集中度与前N大持有人
+        一次按 (基金, 客户) 汇总份额，在分组内排序、累计占比、平方和，口径与单只基金分析一致
+        """
+        try:
+            source = holdings_source(as_of_date)
+            holdings = self.db.query(
+                source.c.fund_code,
+                source.c.group_id,
+                func.sum(source.c.shares).label('shares')
+            ).group_by(source.c.fund_code, source.c.group_id).all()
+            
+            if not holdings:
+                return []
+            
+            df = pd.DataFrame(
+                [(fund_code, group_id, float(shares or 0)) for fund_code, group_id, shares in holdings],
+                columns=['fund_code', 'group_id', 'shares']
+            )
+            
+            funds = {
+                fund.fund_code: (fund.fund_name, latest_nav.unit_nav if latest_nav else None)
+                for fund, latest_nav in self.db.query(Fund, FundLatestNav)
+                    .outerjoin(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)
+                    .filter(Fund.fund_code.in_(df['fund_code'].unique().tolist())).all()
+            }
+            unit_navs = df['fund_code'].map(
+                {code: float(nav) for code, (_, nav) in funds.items() if nav is not None}
+            )
+            
+            # 分组内按份额降序排名，计算占比
+            df = df.sort_values(['fund_code', 'shares'], ascending=[True, False], kind='mergesort')
+            grouped = df.groupby('fund_code', sort=False)
+            df['rank'] = grouped.cumcount() + 1
+            fund_total = grouped['shares'].transform('sum')
+            df['percentage'] = np.where(fund_total > 0, df['shares'] / fund_total.where(fund_total > 0, 1), 0.0)
+            df['squared'] = df['percentage'] ** 2
+            df['top5'] = np.where(df['rank'] <= 5, df['percentage'], 0.0)
+            df['top10'] = np.where(df['rank'] <= 10, df['percentage'], 0.0)
+            
+            # 按最新净值计算市值分档，无净值的基金不分档
+            market_value = df['shares'] * unit_navs.loc[df.index]
+            df['large'] = market_value > 1000000  # 大于100万
+            df['medium'] = (market_value >= 100000) & (market_value <= 1000000)  # 10-100万
+            df['small'] = market_value < 100000  # 小于10万
+            
+            stats = df.groupby('fund_code', sort=False).agg(
+                total_clients=('group_id', 'size'),
+                total_shares=('shares', 'sum'),
+                herfindahl_index=('squared', 'sum'),
+                top5=('top5', 'sum'),
+                top10=('top10', 'sum'),
+                large=('large', 'sum'),
+                medium=('medium', 'sum'),
+                small=('small', 'sum')
+            )
+            
+            # 前N大持有人
+            top_df = df[df['rank'] <= top_n]
+            client_names = dict(
+                self.db.query(Client.group_id, Client.obscured_name)
+                       .filter(Client.group_id.in_(top_df['group_id'].unique().tolist())).all()
+            ) if top_n > 0 else {}
+            top_holders: Dict[str, List[dict]] = {}
+            for row in top_df.itertuples(index=False):
+                unit_nav = funds.get(row.fund_code, (None, None))[1]
+                market_value = percentage = None
+                if unit_nav and row.shares:
+                    market_value = row.shares * float(unit_nav)
+                    percentage = row.percentage * 100
+                top_holders.setdefault(row.fund_code, []).append({
+                    "rank": int(row.rank),
+                    "group_id": row.group_id,
+                    "client_name": client_names.get(row.group_id),
+                    "shares": row.shares,
+                    "market_value": market_value,
+                    "percentage": round(percentage, 2) if percentage else None
+                })
+            
+            results = []
+            for fund_code, stat in stats.iterrows():
+                fund_name, unit_nav = funds.get(fund_code, (None, None))
+                results.append(FundConcentrationSummary(
+                    fund_code=fund_code,
+                    fund_name=fund_name,
+                    total_clients=int(stat['total_clients']),
+                    herfindahl_index=round(float(stat['herfindahl_index']), 4),
+                    top5_concentration=round(float(stat['top5']) * 100, 2),
+                    top10_concentration=round(float(stat['top10']) * 100, 2),
+                    large_holder_count=int(stat['large']),
+                    medium_holder_count=int(stat['medium']),
+                    small_holder_count=int(stat['small']),
+                    total_shares=float(stat['total_shares']),
+                    total_market_value=(float(stat['total_shares']) * float(unit_nav)
+                                        if unit_nav is not None and stat['total_shares'] > 0 else None),
+                    top_holders=top_holders.get(fund_code, [])
+                ))
+            
+            results.sort(key=lambda item: (-item.herfindahl_index, item.fund_code))
+            return results
+            
+        except Exception as e:
+            logger.error(f"全量基金持仓集中度分析失败: {str(e)}")
+            raise
+    
     def analyze_underlying_positions(self, group_id: str) -> dict:
         """
         分析客户持有产品的底层资产配置情况
@@ -396,27 +533,28 @@ class PositionAnalysisService:
         try:
             from ..models import Strategy, ProjectHoldingAsset, ProjectHoldingIndustry
             
-            logger.info(f"开始分析客户 {group_id} 的底层持仓")
+            logger.debug(f"开始分析客户 {group_id} 的底层持仓")
             
             # 验证客户是否存在
             client = self.db.query(Client).filter(Client.group_id == group_id).first()
             if not client:
                 raise ValueError(f"客户 {group_id} 不存在")
             
-            logger.info(f"找到客户: {client.obscured_name}")
+            logger.debug(f"找到客户: {client.obscured_name}")
             
             # 获取所有项目名称用于匹配
             asset_projects = self.db.query(ProjectHoldingAsset.project_name).distinct().all()
             project_names = set([p[0] for p in asset_projects])
-            logger.info(f"数据库中的项目名称: {sorted(project_names)}")
+            logger.debug(f"数据库中的项目名称: {sorted(project_names)}")
             
-            # 获取客户所有持仓
-            positions = self.db.query(Position, Fund, Strategy)\
-                            .join(Fund, Position.fund_code == Fund.fund_code)\
+            # 获取客户当前持仓（最近一期存量快照的持仓）
+            positions = self.db.query(CurrentHolding, Fund, Strategy, FundLatestNav)\
+                            .join(Fund, CurrentHolding.fund_code == Fund.fund_code)\
                             .outerjoin(Strategy, Fund.fund_code == Strategy.fund_code)\
-                            .filter(Position.group_id == group_id).all()
+                            .outerjoin(FundLatestNav, Fund.fund_code == FundLatestNav.fund_code)\
+                            .filter(CurrentHolding.group_id == group_id).all()
             
-            logger.info(f"客户 {group_id} 总持仓数量: {len(positions)}")
+            logger.debug(f"客户 {group_id} 总持仓数量: {len(positions)}")
             
             if not positions:
                 raise ValueError(f"客户 {group_id} 没有持仓记录")
@@ -425,31 +563,27 @@ class PositionAnalysisService:
             target_strategies = ["主观多头", "股债混合"]
             filtered_positions = []
             
-            for position, fund, strategy in positions:
-                logger.info(f"检查持仓: {fund.fund_code} {fund.fund_name}")
+            for position, fund, strategy, latest_nav in positions:
+                logger.debug(f"检查持仓: {fund.fund_code} {fund.fund_name}")
                 if strategy:
-                    logger.info(f"  策略信息: 大类={strategy.main_strategy}, 细分={strategy.sub_strategy}")
+                    logger.debug(f"  策略信息: 大类={strategy.main_strategy}, 细分={strategy.sub_strategy}")
                     if strategy.sub_strategy in target_strategies:
-                        logger.info(f"  匹配目标策略: {strategy.sub_strategy}")
-                        
-                        # 获取最新净值计算市值
-                        latest_nav = self.db.query(Nav)\
-                                          .filter(Nav.fund_code == position.fund_code)\
-                                          .order_by(desc(Nav.nav_date)).first()
+                        logger.debug(f"  匹配目标策略: {strategy.sub_strategy}")
                         
+                        # 使用最新净值计算市值
                         if latest_nav and position.shares:
                             market_value = position.shares * latest_nav.unit_nav
-                            logger.info(f"  市值计算: 份额={position.shares}, 净值={latest_nav.unit_nav}, 市值={market_value}")
+                            logger.debug(f"  市值计算: 份额={position.shares}, 净值={latest_nav.unit_nav}, 市值={market_value}")
                             
                             # 通过产品代码从策略表查询项目名称
                             project_name = strategy.project_name if strategy and strategy.project_name else None
                             
                             if project_name:
-                                logger.info(f"  策略表中的项目名称: {fund.fund_code} -> {project_name}")
+                                logger.debug(f"  策略表中的项目名称: {fund.fund_code} -> {project_name}")
                                 
                                 # 验证项目名称是否在项目配置中存在
                                 if project_name in project_names:
-                                    logger.info(f"  项目配置验证通过: {project_name}")
+                                    logger.debug(f"  项目配置验证通过: {project_name}")
                                     filtered_positions.append({
                                         'position': position,
                                         'fund': fund,
@@ -458,17 +592,17 @@ class PositionAnalysisService:
                                         'project_name': project_name
                                     })
                                 else:
-                                    logger.info(f"  跳过: 项目配置中未找到项目 {project_name}")
+                                    logger.debug(f"  跳过: 项目配置中未找到项目 {project_name}")
                             else:
-                                logger.info(f"  跳过: 策略表中未配置项目名称")
+                                logger.debug(f"  跳过: 策略表中未配置项目名称")
                         else:
-                            logger.info(f"  跳过: 无净值或份额数据 (nav={latest_nav}, shares={position.shares})")
+                            logger.debug(f"  跳过: 无净值或份额数据 (nav={latest_nav}, shares={position.shares})")
                     else:
-                        logger.info(f"  跳过: 策略不匹配 {strategy.sub_strategy}")
+                        logger.debug(f"  跳过: 策略不匹配 {strategy.sub_strategy}")
                 else:
-                    logger.info(f"  跳过: 无策略信息")
+                    logger.debug(f"  跳过: 无策略信息")
             
-            logger.info(f"筛选后的目标持仓数量: {len(filtered_positions)}")
+            logger.debug(f"筛选后的目标持仓数量: {len(filtered_positions)}")
             
             if not filtered_positions:
                 return {
@@ -501,9 +635,9 @@ class PositionAnalysisService:
                                     .filter(ProjectHoldingAsset.project_name == project_name)\
                                     .order_by(desc(ProjectHoldingAsset.month)).first()
                 
-                logger.info(f"  查找项目资产配置: {project_name}")
+                logger.debug(f"  查找项目资产配置: {project_name}")
                 if latest_asset:
-                    logger.info(f"    找到资产配置: 月份={latest_asset.month}")
+                    logger.debug(f"    找到资产配置: 月份={latest_asset.month}")
                     
                     # 按市值加权计算各类资产
                     for asset_type in asset_totals.keys():
@@ -511,18 +645,18 @@ class PositionAnalysisService:
                         if ratio > 0:
                             weighted_value = market_value * (ratio / 100)
                             asset_totals[asset_type] += weighted_value
-                            logger.info(f"    {asset_type}: {ratio}% × {market_value} = {weighted_value}")
+                            logger.debug(f"    {asset_type}: {ratio}% × {market_value} = {weighted_value}")
                 else:
-                    logger.info(f"    未找到资产配置数据")
+                    logger.debug(f"    未找到资产配置数据")
                 
                 # 查询最新的行业配置
                 latest_industry = self.db.query(ProjectHoldingIndustry)\
                                         .filter(ProjectHoldingIndustry.project_name == project_name)\
                                         .order_by(desc(ProjectHoldingIndustry.month)).first()
                 
-                logger.info(f"  查找项目行业配置: {project_name}")
+                logger.debug(f"  查找项目行业配置: {project_name}")
                 if latest_industry:
-                    logger.info(f"    找到行业配置: 月份={latest_industry.month}, 比例类型={latest_industry.ratio_type}")
+                    logger.debug(f"    找到行业配置: 月份={latest_industry.month}, 比例类型={latest_industry.ratio_type}")
                     
                     # 计算股票总仓位比例（用于基于股票仓位的行业比例转换）
                     stock_total_ratio = Decimal('0')
@@ -531,7 +665,7 @@ class PositionAnalysisService:
                                           (latest_asset.h_share_ratio or Decimal('0')) + \
                                           (latest_asset.us_share_ratio or Decimal('0')) + \
                                           (latest_asset.other_market_ratio or Decimal('0'))
-                        logger.info(f"    股票总仓位比例: {stock_total_ratio}%")
+                        logger.debug(f"    股票总仓位比例: {stock_total_ratio}%")
                     
                     # 按市值加权计算各行业
                     for i in range(1, 6):  # industry1 到 industry5
@@ -543,11 +677,11 @@ class PositionAnalysisService:
                             if latest_industry.ratio_type == "based_on_stock":
                                 # 基于股票仓位：行业比例 × 股票总仓位比例
                                 actual_ratio = industry_ratio * (stock_total_ratio / 100) if stock_total_ratio > 0 else Decimal('0')
-                                logger.info(f"    行业{i} {industry_name}: {industry_ratio}% (基于股票) × {stock_total_ratio}% (股票总仓位) = {actual_ratio}% (实际)")
+                                logger.debug(f"    行业{i} {industry_name}: {industry_ratio}% (基于股票) × {stock_total_ratio}% (股票总仓位) = {actual_ratio}% (实际)")
                             else:
                                 # 基于总仓位：直接使用行业比例
                                 actual_ratio = industry_ratio
-                                logger.info(f"    行业{i} {industry_name}: {industry_ratio}% (基于总仓位) = {actual_ratio}% (实际)")
+                                logger.debug(f"    行业{i} {industry_name}: {industry_ratio}% (基于总仓位) = {actual_ratio}% (实际)")
                             
                             # 计算加权市值
                             weighted_value = market_value * (actual_ratio / 100)
@@ -557,7 +691,7 @@ class PositionAnalysisService:
                             else:
                                 industry_totals[industry_name] = weighted_value
                 else:
-                    logger.info(f"    未找到行业配置数据")
+                    logger.debug(f"    未找到行业配置数据")
             
             # 构建资产分布数据
             asset_distribution = []
@@ -0,0 +1,252 @@
+"""
+产品基金解析
+Product-to-Fund Resolution
+
+交易数据中的产品代码、基金名称来自各销售渠道，与基金表不完全一致。产品基金映射表保存
+产品代码、规范化产品名称到基金代码的匹配结果，分析接口在内存中按字典查找，不再逐个产品查库：
+- 产品代码：规范化后与基金代码完全一致即匹配
+- 产品名称：规范化后与基金名称完全一致优先，其次取名称包含该产品名称的第一只基金（按基金代码排序）
+- 规范化：全角转半角（NFKC）、去除空白、去除渠道前缀（如“龙舟-”）、英文转小写
+映射表首次启动时由全部交易批量匹配生成，上传交易时补充新产品；基金表更新后可重新匹配。
+"""
+
+import bisect
+import logging
+import threading
+import unicodedata
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Fund, ProductFundMapping, Transaction
+from .bulk_ops import upsert_rows
+from .data_version import data_versions
+
+logger = logging.getLogger(__name__)
+
+KEY_CODE = 'code'
+KEY_NAME = 'name'
+
+MATCH_CODE = 'code'
+MATCH_NAME = 'name'
+MATCH_CONTAINS = 'contains'
+
+# 规范化时去除的产品名称前缀（销售渠道标识）
+NAME_PREFIXES = ('龙舟-',)
+
+# 映射键最大长度，与映射表 match_key 列一致
+MAX_KEY_LENGTH = 200
+
+# 拼接基金名称做包含匹配时的分隔符，规范化后的名称中不会出现
+NAME_SEPARATOR = '\x1f'
+
+
+def normalize_code(code: Optional[str]) -> str:
+    """规范化产品代码：全角转半角、去除空白、转大写"""
+    if not code:
+        return ''
+    return ''.join(unicodedata.normalize('NFKC', str(code)).split()).upper()[:MAX_KEY_LENGTH]
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """规范化产品名称：全角转半角、去除空白、去除渠道前缀、转小写"""
+    if not name:
+        return ''
+    normalized = ''.join(unicodedata.normalize('NFKC', str(name)).split())
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in NAME_PREFIXES:
+            if normalized.startswith(prefix):
+                normalized = normalized[len(prefix):]
+                stripped = True
+    return normalized.lower()[:MAX_KEY_LENGTH]
+
+
+class FundMatcher:
+    """基金表的批量匹配器"""
+
+    def __init__(self, funds: Iterable[Tuple[str, str]]):
+        funds = sorted(funds)
+        self._codes = {normalize_code(code): code for code, _ in reversed(funds)}
+        self._names: Dict[str, str] = {}
+        normalized_names = []
+        for code, name in funds:
+            normalized = normalize_name(name)
+            self._names.setdefault(normalized, code)
+            normalized_names.append(normalized)
+
+        # 全部基金名称按基金代码顺序拼接，包含匹配在拼接串上一次查找
+        self._fund_codes = [code for code, _ in funds]
+        self._joined = NAME_SEPARATOR.join(normalized_names)
+        self._offsets = []
+        offset = 0
+        for normalized in normalized_names:
+            self._offsets.append(offset)
+            offset += len(normalized) + len(NAME_SEPARATOR)
+
+    @classmethod
+    def load(cls, db: Session) -> 'FundMatcher':
+        return cls(db.execute(select(Fund.fund_code, Fund.fund_name)).all())
+
+    def match_code(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """规范化产品代码 -> (基金代码, 匹配方式)"""
+        fund_code = self._codes.get(key) if key else None
+        return (fund_code, MATCH_CODE) if fund_code else (None, None)
+
+    def match_name(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """规范化产品名称 -> (基金代码, 匹配方式)"""
+        if not key:
+            return None, None
+        if key in self._names:
+            return self._names[key], MATCH_NAME
+        position = self._joined.find(key)
+        if position < 0:
+            return None, None
+        return self._fund_codes[bisect.bisect_right(self._offsets, position) - 1], MATCH_CONTAINS
+
+
+class ProductFundResolver:
+    """内存中的产品基金映射"""
+
+    def __init__(self, mappings: Iterable[Tuple[str, str, Optional[str]]]):
+        self._maps: Dict[str, Dict[str, Optional[str]]] = {KEY_CODE: {}, KEY_NAME: {}}
+        for key_type, match_key, fund_code in mappings:
+            self._maps.setdefault(key_type, {})[match_key] = fund_code
+
+    @classmethod
+    def load(cls, db: Session) -> 'ProductFundResolver':
+        return cls(db.execute(
+            select(ProductFundMapping.key_type, ProductFundMapping.match_key, ProductFundMapping.fund_code)
+        ).all())
+
+    def resolve(self, product_code: Optional[str], names: Sequence[Optional[str]] = ()) -> Optional[str]:
+        """
+        产品代码优先，其次按顺序尝试产品名称
+        返回: 基金代码，未匹配时返回 None
+        """
+        fund_code = self._maps[KEY_CODE].get(normalize_code(product_code))
+        if fund_code:
+            return fund_code
+        for name in names:
+            fund_code = self._maps[KEY_NAME].get(normalize_name(name))
+            if fund_code:
+                return fund_code
+        return None
+
+
+class ProductFundResolverCache:
+    """进程级映射缓存，映射表数据版本变化后在下次访问时重新加载"""
+
+    def __init__(self):
+        self._cached: Optional[Tuple[tuple, ProductFundResolver]] = None
+        self._lock = threading.RLock()
+
+    def get(self, db: Session) -> ProductFundResolver:
+        with self._lock:
+            versions = data_versions.get('product_fund_mapping')
+            if self._cached is not None and self._cached[0] == versions:
+                return self._cached[1]
+
+            resolver = ProductFundResolver.load(db)
+            if versions == data_versions.get('product_fund_mapping'):
+                self._cached = (versions, resolver)
+            return resolver
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cached = None
+
+
+class ProductResolutionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def update(self, rows: Iterable[dict]) -> int:
+        """
+        为上传的交易补充映射表中尚未出现的产品代码、产品名称（不提交事务）
+        返回: 新增的映射数
+        """
+        codes, names = set(), set()
+        for row in rows:
+            codes.add(normalize_code(row.get('product_code')))
+            names.add(normalize_name(row.get('fund_name')))
+            names.add(normalize_name(row.get('product_name')))
+        codes.discard('')
+        names.discard('')
+
+        existing = self._existing()
+        return self._write(codes - existing[KEY_CODE].keys(), names - existing[KEY_NAME].keys())
+
+    def sync(self) -> int:
+        """
+        补全交易中出现但映射表缺少的产品，并重新匹配未匹配或基金已不存在的映射（不提交事务）
+        返回: 写入的映射数
+        """
+        codes, names = self._transaction_keys()
+        existing = self._existing()
+        fund_codes = set(self.db.execute(select(Fund.fund_code)).scalars())
+
+        def stale(key_type: str) -> set:
+            return {key for key, fund_code in existing[key_type].items()
+                    if not fund_code or fund_code not in fund_codes}
+
+        return self._write(
+            (codes - existing[KEY_CODE].keys()) | stale(KEY_CODE),
+            (names - existing[KEY_NAME].keys()) | stale(KEY_NAME)
+        )
+
+    def rebuild(self) -> int:
+        """按当前基金表重新匹配全部产品（不提交事务），返回写入的映射数"""
+        codes, names = self._transaction_keys()
+        existing = self._existing()
+        return self._write(codes | existing[KEY_CODE].keys(), names | existing[KEY_NAME].keys())
+
+    def _transaction_keys(self) -> Tuple[set, set]:
+        """交易表中全部规范化产品代码、产品名称"""
+        codes = {normalize_code(code) for code in self.db.execute(
+            select(Transaction.product_code).distinct()
+        ).scalars()}
+        names = set()
+        for fund_name, product_name in self.db.execute(
+            select(Transaction.fund_name, Transaction.product_name).distinct()
+        ):
+            names.add(normalize_name(fund_name))
+            names.add(normalize_name(product_name))
+        codes.discard('')
+        names.discard('')
+        return codes, names
+
+    def _existing(self) -> Dict[str, Dict[str, Optional[str]]]:
+        existing: Dict[str, Dict[str, Optional[str]]] = {KEY_CODE: {}, KEY_NAME: {}}
+        for key_type, match_key, fund_code in self.db.execute(
+            select(ProductFundMapping.key_type, ProductFundMapping.match_key, ProductFundMapping.fund_code)
+        ):
+            existing.setdefault(key_type, {})[match_key] = fund_code
+        return existing
+
+    def _write(self, codes: Iterable[str], names: Iterable[str]) -> int:
+        """批量匹配并写入映射"""
+        codes, names = sorted(codes), sorted(names)
+        if not codes and not names:
+            return 0
+
+        matcher = FundMatcher.load(self.db)
+        today = date.today()
+        rows: List[dict] = []
+        for key_type, keys, match in ((KEY_CODE, codes, matcher.match_code), (KEY_NAME, names, matcher.match_name)):
+            for key in keys:
+                fund_code, method = match(key)
+                rows.append({'key_type': key_type, 'match_key': key, 'fund_code': fund_code,
+                             'match_method': method, 'updated_at': today})
+
+        upsert_rows(self.db, ProductFundMapping, rows, ['key_type', 'match_key'], ['fund_code', 'match_method', 'updated_at'])
+        matched = sum(1 for row in rows if row['fund_code'])
+        logger.debug(f"产品基金映射写入 {len(rows)} 条，匹配到基金 {matched} 条")
+        return len(rows)
+
+
+# 全局产品基金映射缓存实例
+product_fund_resolvers = ProductFundResolverCache()
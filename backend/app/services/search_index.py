@@ -0,0 +1,189 @@
+"""
+搜索索引
+Search Index
+
+为基金、客户、理财师等模糊查找建立子串索引，替代无法走索引的 LIKE '%x%'：
+- SQLite：FTS5 trigram 外部内容虚拟表，由源表触发器同步写入
+- MySQL：ngram 解析器的 FULLTEXT 索引，由数据库自动维护
+
+检索词短于分词长度（trigram 为 3 个字符，ngram 默认 2 个字符）时无法命中索引，
+退回原有的 LIKE 匹配，结果语义与 LIKE '%x%' 一致（不区分大小写的子串匹配）。
+"""
+
+import logging
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import Column, MetaData, Table, inspect, literal_column, or_, select, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.engine import Engine
+
+from ..models import Client, Fund, Transaction
+
+logger = logging.getLogger(__name__)
+
+# 各数据库下可走索引的最短检索词长度
+SQLITE_MIN_TERM_LENGTH = 3
+MYSQL_MIN_TERM_LENGTH = 2
+
+
+class SearchSpec:
+    """一个检索对象：源表、返回的键列、可检索的字段（键列本身也可检索）"""
+
+    def __init__(self, name: str, model, key: str, fields: Sequence[str]):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.fields = tuple(fields)
+        self.table_name = model.__tablename__
+        self.fts_name = f"search_{name}"
+        # FTS5 虚拟表的轻量表对象，仅用于拼装查询
+        self.fts_table = Table(self.fts_name, MetaData(), *[Column(field) for field in self.fields])
+
+    def source_column(self, field: str):
+        return getattr(self.model, field)
+
+
+SEARCH_SPECS: Dict[str, SearchSpec] = {
+    spec.name: spec for spec in (
+        SearchSpec('fund', Fund, 'fund_code', ('fund_code', 'fund_name')),
+        SearchSpec('client', Client, 'group_id', ('group_id', 'obscured_name', 'domestic_planner')),
+        SearchSpec('transaction_client', Transaction, 'group_id', ('group_id', 'client_name')),
+    )
+}
+
+
+class SearchIndex:
+    """搜索索引管理与查询条件构造"""
+
+    def __init__(self):
+        self.dialect: Optional[str] = None
+        self.enabled = False
+
+    @property
+    def min_term_length(self) -> int:
+        return MYSQL_MIN_TERM_LENGTH if self.dialect == 'mysql' else SQLITE_MIN_TERM_LENGTH
+
+    def install(self, engine: Engine) -> None:
+        """建立索引结构并与源表对齐；当前数据库不支持时保持 LIKE 查询"""
+        self.dialect = engine.dialect.name
+        try:
+            if self.dialect == 'sqlite':
+                self._install_sqlite(engine)
+            elif self.dialect == 'mysql':
+                self._install_mysql(engine)
+            else:
+                logger.warning(f"数据库 {self.dialect} 不支持搜索索引，使用 LIKE 查询")
+                return
+            self.enabled = True
+            logger.info("搜索索引已就绪")
+        except Exception as e:
+            self.enabled = False
+            logger.warning(f"搜索索引初始化失败，使用 LIKE 查询: {str(e)}")
+
+    def _install_sqlite(self, engine: Engine) -> None:
+        preparer = engine.dialect.identifier_preparer
+        with engine.begin() as conn:
+            for spec in SEARCH_SPECS.values():
+                # transaction 为保留字，触发器中的源表名需加引号
+                source = preparer.quote(spec.table_name)
+                column_list = ', '.join(spec.fields)
+                new_values = ', '.join(f"new.{c}" for c in spec.fields)
+                old_values = ', '.join(f"old.{c}" for c in spec.fields)
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": spec.fts_name}
+                ).first() is not None
+
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {spec.fts_name} USING fts5("
+                    f"{column_list}, content='{spec.table_name}', content_rowid='rowid', tokenize='trigram')"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {spec.fts_name}_ai AFTER INSERT ON {source} BEGIN "
+                    f"INSERT INTO {spec.fts_name}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {spec.fts_name}_ad AFTER DELETE ON {source} BEGIN "
+                    f"INSERT INTO {spec.fts_name}({spec.fts_name}, rowid, {column_list}) "
+                    f"VALUES ('delete', old.rowid, {old_values}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {spec.fts_name}_au AFTER UPDATE OF {column_list} "
+                    f"ON {source} BEGIN "
+                    f"INSERT INTO {spec.fts_name}({spec.fts_name}, rowid, {column_list}) "
+                    f"VALUES ('delete', old.rowid, {old_values}); "
+                    f"INSERT INTO {spec.fts_name}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+                ))
+
+                # 新建索引，或触发器缺失期间源表有写入导致索引与源表不一致时，全量重建
+                if exists and self._sqlite_index_consistent(conn, spec):
+                    continue
+                conn.execute(text(f"INSERT INTO {spec.fts_name}({spec.fts_name}) VALUES ('rebuild')"))
+                logger.info(f"搜索索引已重建: {spec.fts_name}")
+
+    @staticmethod
+    def _sqlite_index_consistent(conn, spec: SearchSpec) -> bool:
+        try:
+            conn.execute(text(
+                f"INSERT INTO {spec.fts_name}({spec.fts_name}, rank) VALUES ('integrity-check', 1)"
+            ))
+            return True
+        except Exception:
+            return False
+
+    def _install_mysql(self, engine: Engine) -> None:
+        inspector = inspect(engine)
+        preparer = engine.dialect.identifier_preparer
+        for spec in SEARCH_SPECS.values():
+            existing = {index['name'] for index in inspector.get_indexes(spec.table_name)}
+            for field in spec.fields:
+                index_name = f"ft_{spec.table_name}_{field}"
+                if index_name in existing:
+                    continue
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {preparer.quote(spec.table_name)} ADD FULLTEXT INDEX {index_name} "
+                        f"({preparer.quote(field)}) WITH PARSER ngram"
+                    ))
+                logger.info(f"表 {spec.table_name} 新增全文索引: {index_name}")
+
+    def _use_index(self, term: str) -> bool:
+        return self.enabled and len(term) >= self.min_term_length
+
+    def keys_matching(self, name: str, term: str, fields: Optional[Sequence[str]] = None):
+        """
+        返回匹配检索词的键的子查询，可用于 column.in_(...)
+
+        Args:
+            name: 检索对象名称（fund / client / transaction_client）
+            term: 检索词，按子串匹配
+            fields: 参与匹配的字段，默认全部可检索字段，任一字段命中即可
+        """
+        spec = SEARCH_SPECS[name]
+        fields = tuple(fields) if fields else spec.fields
+
+        if not self._use_index(term):
+            return select(spec.source_column(spec.key)).where(
+                or_(*[spec.source_column(field).like(f"%{term}%") for field in fields])
+            )
+
+        if self.dialect == 'mysql':
+            phrase = '"' + term.replace('"', ' ') + '"'
+            return select(spec.source_column(spec.key)).where(
+                or_(*[match(spec.source_column(field), against=phrase).in_boolean_mode() for field in fields])
+            )
+
+        # FTS5 查询语法：列过滤 + 短语，短语内双引号需转义为两个双引号
+        phrase = '"' + term.replace('"', '""') + '"'
+        query = '{' + ' '.join(fields) + '} : ' + phrase
+        return select(spec.fts_table.c[spec.key]).where(
+            literal_column(spec.fts_name).op('MATCH')(query)
+        )
+
+    def filter(self, column, name: str, term: str, fields: Optional[Sequence[str]] = None):
+        """构造 column IN (匹配的键) 筛选条件，column 为与检索对象键对应的列"""
+        return column.in_(self.keys_matching(name, term, fields))
+
+
+# 全局搜索索引实例
+search_index = SearchIndex()
@@ -0,0 +1,166 @@
+"""
+阶段收益计算
+Stage Return Calculator
+
+在日历对齐净值面板上，对一组持仓和任意多个日期区间一次性向量化计算阶段收益：
+- 期初净值：首次买入日期晚于区间开始日时取买入净值，否则取区间开始日及之后的第一条净值
+- 期末净值：区间结束日及之前的最近净值
+- 阶段收益 = (期末净值 - 期初净值) × 持仓份额，期初/期末净值缺失或为零、份额为零时不计
+"""
+
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .nav_panel import NavPanel
+from .nav_store import to_nav_decimal
+
+logger = logging.getLogger(__name__)
+
+
+class StageWindow(NamedTuple):
+    """计算区间"""
+    name: str
+    start_date: date
+    end_date: date
+
+
+def standard_windows(anchor: date) -> List[StageWindow]:
+    """以 anchor 为截止日的今年以来、本季度以来、本月以来区间"""
+    quarter_month = 3 * ((anchor.month - 1) // 3) + 1
+    return [
+        StageWindow('ytd', date(anchor.year, 1, 1), anchor),
+        StageWindow('qtd', date(anchor.year, quarter_month, 1), anchor),
+        StageWindow('mtd', date(anchor.year, anchor.month, 1), anchor),
+    ]
+
+
+class StageReturnResult:
+    """
+    阶段收益计算结果，数组形状均为 (区间数, 持仓数)
+
+    - start_navs / end_navs: 期初、期末净值
+    - uses_buy_nav: 期初净值是否取买入净值
+    - valid: 是否计入阶段收益
+    - returns: 阶段收益，不计入的位置为 0
+    """
+
+    def __init__(self,
+                 windows: List[StageWindow],
+                 start_navs: np.ndarray,
+                 end_navs: np.ndarray,
+                 uses_buy_nav: np.ndarray,
+                 valid: np.ndarray,
+                 returns: np.ndarray):
+        self.windows = windows
+        self.start_navs = start_navs
+        self.end_navs = end_navs
+        self.uses_buy_nav = uses_buy_nav
+        self.valid = valid
+        self.returns = returns
+
+    @property
+    def totals(self) -> np.ndarray:
+        """各区间的汇总阶段收益"""
+        return self.returns.sum(axis=1)
+
+    def window_index(self, name: str) -> int:
+        for i, window in enumerate(self.windows):
+            if window.name == name:
+                return i
+        raise KeyError(name)
+
+    def exact_returns(self,
+                      window: int,
+                      shares: Sequence[Optional[Decimal]],
+                      buy_navs: Sequence[Optional[Decimal]]) -> List[Optional[Decimal]]:
+        """
+        按 Decimal 精确重算某一区间的逐笔阶段收益，不计入的持仓为 None
+        净值按数据库精度还原，买入净值使用调用方传入的原值
+        """
+        results: List[Optional[Decimal]] = []
+        for i in range(self.valid.shape[1]):
+            if not self.valid[window, i]:
+                results.append(None)
+                continue
+            start_nav = buy_navs[i] if self.uses_buy_nav[window, i] else to_nav_decimal(self.start_navs[window, i])
+            end_nav = to_nav_decimal(self.end_navs[window, i])
+            results.append((end_nav - start_nav) * shares[i])
+        return results
+
+
+class StageReturnCalculator:
+    """基于净值面板的阶段收益计算器"""
+
+    def __init__(self, panel: NavPanel):
+        self.panel = panel
+
+    def calculate(self,
+                  fund_codes: Sequence[str],
+                  shares: Sequence[Optional[float]],
+                  first_buy_dates: Sequence[Optional[date]],
+                  buy_navs: Sequence[Optional[float]],
+                  windows: Sequence[StageWindow]) -> StageReturnResult:
+        """
+        计算所有持仓在所有区间的阶段收益
+
+        Args:
+            fund_codes: 持仓基金代码，可重复
+            shares: 持仓份额，缺失视为 0
+            first_buy_dates: 首次买入日期，缺失时期初净值始终取区间开始日净值
+            buy_navs: 买入净值，缺失时买入晚于区间开始的持仓不计入
+            windows: 计算区间
+        """
+        windows = list(windows)
+        n_windows, n_positions = len(windows), len(fund_codes)
+        shares_arr = np.array([float(s) if s is not None else 0.0 for s in shares], dtype=np.float64)
+        buy_nav_arr = np.array([float(v) if v is not None else np.nan for v in buy_navs], dtype=np.float64)
+        buy_dates = np.array([np.datetime64(d, 'D') if d else np.datetime64('NaT') for d in first_buy_dates],
+                             dtype='datetime64[D]')
+        starts = np.array([w.start_date for w in windows], dtype='datetime64[D]')
+        ends = np.array([w.end_date for w in windows], dtype='datetime64[D]')
+
+        panel = self.panel
+        cols = panel.columns_of(fund_codes)
+        present = cols >= 0
+        n_dates = len(panel.dates)
+
+        start_navs = np.full((n_windows, n_positions), np.nan)
+        end_navs = np.full((n_windows, n_positions), np.nan)
+        start_ok = np.zeros((n_windows, n_positions), dtype=bool)
+        end_ok = np.zeros((n_windows, n_positions), dtype=bool)
+
+        if n_dates and present.any():
+            # 只在涉及的基金列上计算"某行及之后第一条实际净值所在行"，无则为 n_dates
+            used_cols, position_cols = np.unique(np.where(present, cols, 0), return_inverse=True)
+            observed = panel.observed[:, used_cols]
+            next_rows = np.where(observed, np.arange(n_dates)[:, None], n_dates)
+            next_rows = np.minimum.accumulate(next_rows[::-1], axis=0)[::-1]
+            next_rows = np.vstack([next_rows, np.full((1, len(used_cols)), n_dates)])
+
+            # 期初：开始日及之后第一条净值
+            lo = np.searchsorted(panel.dates, starts, side='left')
+            start_rows = next_rows[lo[:, None], position_cols[None, :]]
+            start_ok = (start_rows < n_dates) & present[None, :]
+            start_navs = np.where(start_ok, panel.values[np.minimum(start_rows, n_dates - 1), cols[None, :]], np.nan)
+
+            # 期末：结束日及之前的最近净值
+            end_rows = np.searchsorted(panel.dates, ends, side='right') - 1
+            safe_end_rows = np.maximum(end_rows, 0)[:, None]
+            end_ok = (end_rows >= 0)[:, None] & panel.valid[safe_end_rows, cols[None, :]] & present[None, :]
+            end_navs = np.where(end_ok, panel.values[safe_end_rows, cols[None, :]], np.nan)
+
+        # 买入晚于区间开始日时，期初净值取买入净值
+        uses_buy_nav = buy_dates[None, :] > starts[:, None]
+        start_navs = np.where(uses_buy_nav, buy_nav_arr[None, :], start_navs)
+        start_ok = np.where(uses_buy_nav, ~np.isnan(buy_nav_arr)[None, :], start_ok)
+
+        valid = (start_ok & end_ok
+                 & (np.nan_to_num(start_navs) != 0) & (np.nan_to_num(end_navs) != 0)
+                 & (shares_arr != 0)[None, :])
+        returns = np.where(valid, (end_navs - start_navs) * shares_arr[None, :], 0.0)
+
+        return StageReturnResult(windows, start_navs, end_navs, uses_buy_nav, valid, returns)
@@ -0,0 +1,167 @@
+"""
+持仓时点回溯
+Point-in-Time Portfolio Time Machine
+
+持仓表按 (客户, 基金, 存量时间) 保存每期存量快照。回溯到任一截止日期时：
+- 每个客户取该日及之前最近一期存量快照（按 (客户, 存量时间) 索引定位），不混入更早的快照
+- 快照内的持仓按同一截止日期及之前的最近单位净值估值
+批量估值在净值面板上一次完成 客户 × 日期 网格的快照定位与估值，适合月末等定期回溯任务。
+估值口径与持仓汇总一致：份额或净值为空/零的持仓不计市值，成本为空/零的持仓不计盈亏。
+"""
+
+import calendar
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models import Position
+from .nav_panel import nav_panel_cache
+
+logger = logging.getLogger(__name__)
+
+# 批量回溯时按客户分批查询的批大小
+TIME_MACHINE_BATCH_SIZE = 500
+
+# 批量估值结果的列
+VALUATION_COLUMNS = [
+    'as_of_date', 'group_id', 'snapshot_date', 'position_count',
+    'total_cost', 'total_shares', 'market_value', 'unrealized_pnl'
+]
+
+
+def month_ends(end_date: date, months: int) -> List[date]:
+    """end_date 及之前最近 months 个自然月月末，升序"""
+    year, month = end_date.year, end_date.month
+    if end_date.day != calendar.monthrange(year, month)[1]:
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+
+    results = []
+    for _ in range(max(months, 0)):
+        results.append(date(year, month, calendar.monthrange(year, month)[1]))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return results[::-1]
+
+
+class TimeMachineService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def snapshot_date(self, group_id: str, as_of_date: date) -> Optional[date]:
+        """客户在 as_of_date 及之前最近一期存量时间，没有则返回 None"""
+        return self.db.execute(
+            select(func.max(Position.stock_date))
+            .where(Position.group_id == group_id, Position.stock_date <= as_of_date)
+        ).scalar()
+
+    def snapshot_dates(self, as_of_date: date, group_ids: Optional[Iterable[str]] = None) -> Dict[str, date]:
+        """各客户在 as_of_date 及之前最近一期存量时间，group_ids 为 None 时取全部客户"""
+        query = select(Position.group_id, func.max(Position.stock_date))\
+            .where(Position.stock_date <= as_of_date)\
+            .group_by(Position.group_id)
+        if group_ids is None:
+            return dict(self.db.execute(query).all())
+
+        ids = sorted(set(group_ids))
+        results: Dict[str, date] = {}
+        for i in range(0, len(ids), TIME_MACHINE_BATCH_SIZE):
+            results.update(self.db.execute(
+                query.where(Position.group_id.in_(ids[i:i + TIME_MACHINE_BATCH_SIZE]))
+            ).all())
+        return results
+
+    def valuations(self,
+                   as_of_dates: Sequence[date],
+                   group_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        批量回溯估值：每个截止日期、每个客户一行
+
+        Args:
+            as_of_dates: 截止日期，可重复、无序
+            group_ids: 客户范围，为 None 时取全部客户
+
+        Returns:
+            列为 VALUATION_COLUMNS 的 DataFrame，按 (截止日期, 集团号) 排序；
+            截止日期之前没有存量快照的客户不出现
+        """
+        targets = sorted(set(as_of_dates))
+        if not targets:
+            return pd.DataFrame(columns=VALUATION_COLUMNS)
+
+        positions = self._load_positions(targets[-1], group_ids)
+        if positions.empty:
+            return pd.DataFrame(columns=VALUATION_COLUMNS)
+
+        # 快照定位：客户 × 截止日期 网格上按客户取 ≤ 截止日期的最近存量时间
+        snapshots = positions[['group_id', 'stock_date']].drop_duplicates().sort_values('stock_date')
+        grid = pd.MultiIndex.from_product(
+            [pd.DatetimeIndex(targets), snapshots['group_id'].unique()], names=['as_of_date', 'group_id']
+        ).to_frame(index=False)
+        grid = pd.merge_asof(
+            grid, snapshots.rename(columns={'stock_date': 'snapshot_date'}),
+            left_on='as_of_date', right_on='snapshot_date', by='group_id', direction='backward'
+        ).dropna(subset=['snapshot_date'])
+
+        rows = grid.merge(
+            positions, left_on=['group_id', 'snapshot_date'], right_on=['group_id', 'stock_date'], how='inner'
+        )
+
+        # 估值：取截止日期及之前最近的单位净值
+        panel = nav_panel_cache.get(self.db)
+        nav_rows = np.searchsorted(panel.dates, rows['as_of_date'].values.astype('datetime64[D]'), side='right') - 1
+        cols = panel.columns_of(rows['fund_code'].tolist())
+        ok = (nav_rows >= 0) & (cols >= 0)
+        navs = np.full(len(rows), np.nan)
+        if ok.any():
+            navs[ok] = panel.values[nav_rows[ok], cols[ok]]
+
+        shares = rows['shares'].to_numpy(dtype=np.float64)
+        costs = rows['cost_with_fee'].to_numpy(dtype=np.float64)
+        valued = ~np.isnan(navs) & (navs != 0) & (np.nan_to_num(shares) != 0)
+        market_values = np.where(valued, np.nan_to_num(shares) * np.nan_to_num(navs), 0.0)
+        rows['market_value'] = market_values
+        rows['unrealized_pnl'] = np.where(valued & (np.nan_to_num(costs) != 0), market_values - np.nan_to_num(costs), 0.0)
+        rows['total_cost'] = np.nan_to_num(costs)
+        rows['total_shares'] = np.nan_to_num(shares)
+
+        result = rows.groupby(['as_of_date', 'group_id', 'snapshot_date'], sort=True).agg(
+            position_count=('fund_code', 'size'),
+            total_cost=('total_cost', 'sum'),
+            total_shares=('total_shares', 'sum'),
+            market_value=('market_value', 'sum'),
+            unrealized_pnl=('unrealized_pnl', 'sum'),
+        ).reset_index()
+        result['as_of_date'] = result['as_of_date'].dt.date
+        result['snapshot_date'] = result['snapshot_date'].dt.date
+        logger.debug(f"持仓回溯估值完成: 日期 {len(targets)}，结果 {len(result)} 行")
+        return result[VALUATION_COLUMNS]
+
+    def _load_positions(self, max_date: date, group_ids: Optional[Iterable[str]]) -> pd.DataFrame:
+        """读取 max_date 及之前的全部存量快照持仓"""
+        query = select(
+            Position.group_id, Position.fund_code, Position.stock_date, Position.cost_with_fee, Position.shares
+        ).where(Position.stock_date <= max_date)
+
+        if group_ids is None:
+            batches = [self.db.execute(query).all()]
+        else:
+            ids = sorted(set(group_ids))
+            batches = [
+                self.db.execute(query.where(Position.group_id.in_(ids[i:i + TIME_MACHINE_BATCH_SIZE]))).all()
+                for i in range(0, len(ids), TIME_MACHINE_BATCH_SIZE)
+            ]
+
+        frame = pd.DataFrame(
+            [tuple(row) for batch in batches for row in batch],
+            columns=['group_id', 'fund_code', 'stock_date', 'cost_with_fee', 'shares']
+        )
+        if frame.empty:
+            return frame
+        frame['stock_date'] = pd.to_datetime(frame['stock_date'])
+        frame['cost_with_fee'] = pd.to_numeric(frame['cost_with_fee'], errors='coerce').astype(np.float64)
+        frame['shares'] = pd.to_numeric(frame['shares'], errors='coerce').astype(np.float64)
+        return frame
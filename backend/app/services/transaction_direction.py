@@ -0,0 +1,168 @@
+"""
+交易方向分类
+Transaction Direction Classification
+
+交易类型名称由各销售渠道导出，写法不统一。入库时按交易类型分类规则表归为固定的交易方向，
+分析接口直接按方向列在数据库中过滤和汇总，不再逐笔匹配关键词：
+- share_in: 份额转入并投入资金（申购、认购、买入、增持）
+- share_out: 份额转出并回收资金（赎回、卖出、减持、强制赎回）
+- adjust_in / adjust_out: 份额调增 / 调减，不计入买入、赎回金额
+- dividend: 现金分红
+- other: 未命中任何规则
+规则按优先级升序匹配，交易类型名称包含关键词即命中；规则变更后需重新分类已有交易。
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Transaction, TransactionTypeRule
+from .data_version import data_versions
+
+logger = logging.getLogger(__name__)
+
+SHARE_IN = 'share_in'
+SHARE_OUT = 'share_out'
+ADJUST_IN = 'adjust_in'
+ADJUST_OUT = 'adjust_out'
+DIVIDEND = 'dividend'
+OTHER = 'other'
+
+# 交易方向与说明
+DIRECTIONS = {
+    SHARE_IN: '份额转入（申购、认购、买入、增持）',
+    SHARE_OUT: '份额转出（赎回、卖出、减持）',
+    ADJUST_IN: '份额调增',
+    ADJUST_OUT: '份额调减',
+    DIVIDEND: '现金分红',
+    OTHER: '其他',
+}
+
+# 增加、减少持有份额的交易方向
+SHARE_INCREASE_DIRECTIONS = (SHARE_IN, ADJUST_IN)
+SHARE_DECREASE_DIRECTIONS = (SHARE_OUT, ADJUST_OUT)
+
+# 默认分类规则 (关键词, 交易方向, 优先级)，规则表为空时写入
+DEFAULT_RULES = [
+    ('申购', SHARE_IN, 10),
+    ('买入', SHARE_IN, 10),
+    ('认购', SHARE_IN, 10),
+    ('增持', SHARE_IN, 10),
+    ('强制调增', ADJUST_IN, 20),
+    ('强行调增', ADJUST_IN, 20),
+    ('赎回', SHARE_OUT, 30),
+    ('卖出', SHARE_OUT, 30),
+    ('减持', SHARE_OUT, 30),
+    ('强制调减', ADJUST_OUT, 40),
+    ('强行调减', ADJUST_OUT, 40),
+    ('分红', DIVIDEND, 50),
+]
+
+# 重新分类时按交易类型分批更新的批大小
+RECLASSIFY_BATCH_SIZE = 500
+
+
+class TransactionClassifier:
+    """按规则列表对交易类型名称分类，同一交易类型的结果缓存复用"""
+
+    def __init__(self, rules: Iterable[Tuple[str, str, int]]):
+        # 优先级相同时保持规则原有顺序
+        self.rules: List[Tuple[str, str, int]] = sorted(rules, key=lambda rule: rule[2])
+        self._keywords = [(keyword.lower(), direction) for keyword, direction, _ in self.rules]
+        self._cache: Dict[str, str] = {}
+
+    def classify(self, transaction_type: Optional[str]) -> str:
+        if not transaction_type:
+            return OTHER
+        direction = self._cache.get(transaction_type)
+        if direction is None:
+            name = transaction_type.lower()
+            direction = next((d for keyword, d in self._keywords if keyword in name), OTHER)
+            self._cache[transaction_type] = direction
+        return direction
+
+    @classmethod
+    def load(cls, db: Session) -> 'TransactionClassifier':
+        """从规则表加载（含当前会话未提交的修改）"""
+        rows = db.query(TransactionTypeRule.keyword, TransactionTypeRule.direction, TransactionTypeRule.priority)\
+                 .order_by(TransactionTypeRule.priority, TransactionTypeRule.id).all()
+        return cls((row.keyword, row.direction, row.priority) for row in rows)
+
+
+class TransactionClassifierCache:
+    """进程级分类器缓存，规则表数据版本变化后在下次访问时重新加载"""
+
+    def __init__(self):
+        self._cached: Optional[Tuple[tuple, TransactionClassifier]] = None
+        self._lock = threading.RLock()
+
+    def get(self, db: Session) -> TransactionClassifier:
+        with self._lock:
+            versions = data_versions.get('transaction_type_rule')
+            if self._cached is not None and self._cached[0] == versions:
+                return self._cached[1]
+
+            classifier = TransactionClassifier.load(db)
+            if versions == data_versions.get('transaction_type_rule'):
+                self._cached = (versions, classifier)
+            return classifier
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cached = None
+
+
+class TransactionDirectionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def ensure_default_rules(self) -> int:
+        """规则表为空时写入默认规则（不提交事务），返回写入的规则数"""
+        if self.db.query(TransactionTypeRule.id).first():
+            return 0
+        for keyword, direction, priority in DEFAULT_RULES:
+            self.db.add(TransactionTypeRule(keyword=keyword, direction=direction, priority=priority))
+        self.db.flush()
+        return len(DEFAULT_RULES)
+
+    def replace_rules(self, rules: Iterable[Tuple[str, str, int]]) -> None:
+        """以给定规则替换规则表（不提交事务）"""
+        self.db.query(TransactionTypeRule).delete(synchronize_session=False)
+        for keyword, direction, priority in rules:
+            self.db.add(TransactionTypeRule(keyword=keyword, direction=direction, priority=priority))
+        self.db.flush()
+
+    def reclassify(self, only_missing: bool = False) -> int:
+        """
+        按规则表重新分类已有交易（不提交事务）
+        only_missing 为 True 时只回填交易方向为空的交易
+        返回: 交易方向发生变化的交易数
+        """
+        self.db.flush()
+        classifier = TransactionClassifier.load(self.db)
+
+        type_query = select(Transaction.transaction_type).distinct()
+        if only_missing:
+            type_query = type_query.where(Transaction.direction.is_(None))
+        by_direction: Dict[str, List[str]] = defaultdict(list)
+        for (transaction_type,) in self.db.execute(type_query):
+            by_direction[classifier.classify(transaction_type)].append(transaction_type)
+
+        updated = 0
+        for direction, types in by_direction.items():
+            stale = Transaction.direction.is_(None) if only_missing else \
+                or_(Transaction.direction.is_(None), Transaction.direction != direction)
+            for i in range(0, len(types), RECLASSIFY_BATCH_SIZE):
+                stmt = update(Transaction).where(
+                    Transaction.transaction_type.in_(types[i:i + RECLASSIFY_BATCH_SIZE]), stale
+                ).values(direction=direction).execution_options(synchronize_session=False)
+                updated += self.db.execute(stmt).rowcount
+        return updated
+
+
+# 全局分类器缓存实例
+transaction_classifiers = TransactionClassifierCache()
@@ -0,0 +1,108 @@
+"""
+交易内容指纹
+Transaction Content Fingerprint
+
+以 集团号、交易类型、确认日期、确认金额、确认份额、产品（产品代码，其次基金名称）计算 SHA-1 指纹，
+指纹列带唯一索引，上传时按指纹批量判重：
+- 金额按 2 位小数、份额按 6 位小数格式化，与数据库列精度一致，空值记为空串
+- 历史数据中内容相同的重复交易不删除：id 最小的一条回填内容指纹，其余以 (内容指纹, id) 派生唯一指纹
+"""
+
+import hashlib
+import logging
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from ..models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# 指纹计算使用的列
+FINGERPRINT_SOURCE_COLUMNS = [
+    'group_id', 'transaction_type', 'confirmed_date', 'confirmed_amount', 'confirmed_shares', 'product_code', 'fund_name'
+]
+
+# 按指纹查询、回填的批大小
+FINGERPRINT_BATCH_SIZE = 500
+
+# 指纹各字段的分隔符
+FIELD_SEPARATOR = '\x1f'
+
+
+def _format_numbers(values: pd.Series, digits: int) -> pd.Series:
+    numbers = pd.to_numeric(values, errors='coerce').astype(np.float64)
+    formatted = np.char.mod(f'%.{digits}f', numbers.fillna(0).to_numpy())
+    return pd.Series(formatted, index=values.index, dtype=object).where(numbers.notna(), '')
+
+
+def compute_fingerprints(rows: Sequence[dict]) -> List[str]:
+    """按行计算交易指纹，rows 为含 FINGERPRINT_SOURCE_COLUMNS 的字典（缺失视为空）"""
+    if not rows:
+        return []
+    frame = pd.DataFrame(list(rows), columns=FINGERPRINT_SOURCE_COLUMNS)
+
+    product_code = frame['product_code'].fillna('').astype(str)
+    product = product_code.where(product_code != '', frame['fund_name'].fillna('').astype(str))
+    dates = pd.to_datetime(frame['confirmed_date']).dt.strftime('%Y-%m-%d')
+    keys = frame['group_id'].astype(str).str.cat([
+        frame['transaction_type'].astype(str),
+        dates,
+        _format_numbers(frame['confirmed_amount'], 2),
+        _format_numbers(frame['confirmed_shares'], 6),
+        product,
+    ], sep=FIELD_SEPARATOR)
+    return [hashlib.sha1(key.encode('utf-8')).hexdigest() for key in keys]
+
+
+class TransactionFingerprintService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def existing(self, fingerprints: Sequence[str]) -> Dict[str, int]:
+        """已入库的指纹 -> 交易 id"""
+        fingerprints = list(dict.fromkeys(fingerprints))
+        found: Dict[str, int] = {}
+        for i in range(0, len(fingerprints), FINGERPRINT_BATCH_SIZE):
+            found.update(
+                (fingerprint, transaction_id) for transaction_id, fingerprint in self.db.execute(
+                    select(Transaction.id, Transaction.fingerprint)
+                    .where(Transaction.fingerprint.in_(fingerprints[i:i + FINGERPRINT_BATCH_SIZE]))
+                )
+            )
+        return found
+
+    def backfill(self) -> int:
+        """
+        为指纹为空的交易回填指纹（不提交事务）
+        与已有交易内容重复的交易以 (内容指纹, id) 派生指纹，不参与上传判重
+        返回: 回填的交易数
+        """
+        rows = self.db.execute(
+            select(Transaction.id, *[getattr(Transaction, column) for column in FINGERPRINT_SOURCE_COLUMNS])
+            .where(Transaction.fingerprint.is_(None))
+            .order_by(Transaction.id)
+        ).mappings().all()
+        if not rows:
+            return 0
+
+        fingerprints = compute_fingerprints(rows)
+        taken = set(self.existing(fingerprints))
+        updates = []
+        duplicates = 0
+        for row, fingerprint in zip(rows, fingerprints):
+            if fingerprint in taken:
+                duplicates += 1
+                fingerprint = hashlib.sha1(f"{fingerprint}{FIELD_SEPARATOR}{row['id']}".encode('utf-8')).hexdigest()
+            taken.add(fingerprint)
+            updates.append({'id': row['id'], 'fingerprint': fingerprint})
+
+        for i in range(0, len(updates), FINGERPRINT_BATCH_SIZE):
+            self.db.execute(update(Transaction), updates[i:i + FINGERPRINT_BATCH_SIZE])
+
+        if duplicates:
+            logger.warning(f"交易指纹回填: {duplicates} 条交易与已有交易内容重复，已保留并以派生指纹标记")
+        return len(updates)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+按交易类型分类规则重新分类交易方向的脚本
+Reclassify Transaction Directions Script
+
+规则表为空时先写入默认规则；传入 --missing 时只回填交易方向为空的交易
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import db_manager
+from app.services.transaction_direction import TransactionClassifier, TransactionDirectionService
+
+
+def reclassify_transactions(only_missing: bool = False):
+    """按当前规则重新分类交易"""
+    with db_manager.get_session() as session:
+        service = TransactionDirectionService(session)
+        added = service.ensure_default_rules()
+        if added:
+            print(f"规则表为空，已写入 {added} 条默认规则")
+        
+        print("📋 当前分类规则：")
+        print("-" * 60)
+        for keyword, direction, priority in TransactionClassifier.load(session).rules:
+            print(f"{priority:<6} | {keyword:<12} | {direction}")
+        
+        updated = service.reclassify(only_missing=only_missing)
+        print(f"✅ 重新分类完成，交易方向变化 {updated} 条")
+
+
+if __name__ == "__main__":
+    reclassify_transactions(only_missing="--missing" in sys.argv[1:])
@@ -49,9 +49,9 @@ export const navAPI = {
     })
   },
 
-  // 获取有净值数据的基金列表
-  getFundsWithNav() {
-    return request.get('/api/nav/funds')
+  // 获取有净值数据的基金列表，params 可传 search / limit 由服务端检索
+  getFundsWithNav(params = {}) {
+    return request.get('/api/nav/funds', { params })
   },
 
   // 创建净值记录
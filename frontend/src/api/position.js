@@ -31,10 +31,17 @@ export const positionAPI = {
     return request.get(`/api/position/fund/${fundCode}/concentration`)
   },
 
-  // 按理财师汇总持仓
-  getPositionsByPlanner(planner = null) {
+  // 全量基金持仓集中度报告
+  getFundConcentrationReport(topN = 10) {
+    return request.get('/api/position/funds/concentration', {
+      params: { top_n: topN }
+    })
+  },
+
+  // 按理财师汇总持仓（params 可选 as_of_date、client_page、client_page_size）
+  getPositionsByPlanner(planner = null, params = {}) {
     return request.get('/api/position/summary/by-planner', {
-      params: planner ? { domestic_planner: planner } : {}
+      params: planner ? { ...params, domestic_planner: planner } : params
     })
   },
 
@@ -66,6 +73,11 @@ export const positionAPI = {
     return request.get(`/api/position/clients/${groupId}`, { params })
   },
 
+  // 获取客户多区间阶段收益（ytd/qtd/mtd 及可选自定义区间）
+  getClientStageReturns(groupId, params = {}) {
+    return request.get(`/api/position/clients/${groupId}/stage-returns`, { params })
+  },
+
   // 删除客户及其所有持仓
   deleteClient(groupId) {
     return request.delete(`/api/position/clients/${groupId}`)
@@ -102,5 +114,22 @@ export const positionAPI = {
   // 获取客户底层持仓分析
   getUnderlyingAnalysis(groupId) {
     return request.get(`/api/position/client/${groupId}/underlying-analysis`)
+  },
+
+  // 全公司底层穿透敞口
+  getFirmExposure() {
+    return request.get('/api/position/exposure/firm')
+  },
+
+  // 按理财师底层穿透敞口
+  getPlannerExposures(planner = null) {
+    return request.get('/api/position/exposure/planners', {
+      params: planner ? { domestic_planner: planner } : {}
+    })
+  },
+
+  // 客户底层穿透敞口
+  getClientExposure(groupId) {
+    return request.get(`/api/position/exposure/clients/${groupId}`)
   }
 }
\ No newline at end of file
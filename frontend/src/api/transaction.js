@@ -61,6 +61,35 @@ export const transactionAPI = {
    */
   getClientAnalysis(groupId) {
     return request.get(`/api/transaction/clients/${groupId}/analysis`)
+  },
+
+  /**
+   * 获取交易类型分类规则
+   */
+  getDirectionRules() {
+    return request.get('/api/transaction/direction-rules')
+  },
+
+  /**
+   * 替换交易类型分类规则并重新分类已有交易
+   * @param {Array} rules - 规则列表 [{ keyword, direction, priority }]
+   */
+  updateDirectionRules(rules) {
+    return request.put('/api/transaction/direction-rules', rules)
+  },
+
+  /**
+   * 按当前规则重新分类全部交易
+   */
+  reclassifyTransactions() {
+    return request.post('/api/transaction/direction-rules/reclassify')
+  },
+
+  /**
+   * 按当前基金表重新匹配产品基金映射
+   */
+  rebuildProductMapping() {
+    return request.post('/api/transaction/product-mapping/rebuild')
   }
 }
 